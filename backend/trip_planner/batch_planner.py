@@ -0,0 +1,332 @@
+"""
+Batch Trip Planner
+Plans many trips at once with NumPy, for fleet what-if analysis
+"""
+from datetime import datetime
+from typing import Dict, List, Sequence
+import numpy as np
+from .eld_service import ELDService, MINUTES_PER_DAY
+from .hos_rules import HOSRuleSet, RuleTable
+
+
+class BatchTripPlanner:
+    """
+    Vectorized version of ELDService.calculate_trip_plan
+    
+    Every trip is one row of a set of integer arrays (elapsed minutes, the
+    HOS clocks, the cycle ledger as per-day running totals) and the planner
+    steps all rows together, one shift at a time: drive to the next event,
+    then take the fuel stop, break, rest or restart that event calls for.
+    The HOS rules are the same compiled RuleTable the scalar planner runs,
+    applied to whole columns.
+    
+    The number of steps is the number of driving segments of the longest
+    trip, not the number of trips, and the results match the scalar
+    planner minute for minute.
+    
+    Only summary columns are produced; plan_details runs the scalar planner
+    for the few trips whose segments and daily logs are wanted.
+    """
+    
+    def __init__(self, eld_service_class=ELDService, rules: HOSRuleSet = None):
+        """
+        Initialize batch planner
+        
+        Args:
+            eld_service_class: Class providing the trip assumptions (ELDService)
+            rules: HOS rule set (defaults to the class's RULES)
+        """
+        self.service_class = eld_service_class
+        self.hos_rules = rules if rules is not None else eld_service_class.RULES
+        self.table = self.hos_rules.compile()
+        minutes = eld_service_class._minutes
+        self.max_on_duty = self.table.max_window
+        self.max_cycle = self.table.max_cycle
+        self.cycle_days = self.table.cycle_days
+        self.fuel_stop = minutes(eld_service_class.FUEL_STOP_DURATION)
+        self.pickup_dropoff = minutes(eld_service_class.PICKUP_DROPOFF_DURATION)
+        self.speed = eld_service_class.AVG_SPEED_MPH
+        self.fuel_interval = eld_service_class.FUEL_INTERVAL_MILES
+    
+    def plan_trips(self, distances_miles: Sequence[float], cycle_hours_used=0,
+                   start_times=None, cycle_history=None) -> Dict[str, np.ndarray]:
+        """
+        Plan a batch of trips
+        
+        Args:
+            distances_miles: Trip distances, one per trip
+            cycle_hours_used: Hours used in the current cycle, a scalar or one per trip
+            start_times: Start time (datetime or datetime64), a scalar or one
+                per trip (defaults to now)
+            cycle_history: On-duty hours of the previous days, oldest first,
+                one list for all trips or one row per trip; replaces
+                cycle_hours_used as in ELDService
+        
+        Returns:
+            Dictionary of arrays, one entry per trip: valid (False where the
+            distance cannot be planned; the other columns are then NaN or
+            NaT), estimated_duration_hours, total_driving_time,
+            total_on_duty_time, num_rest_breaks, num_restarts,
+            num_fuel_stops, num_days, cycle_hours_available and
+            estimated_arrival (datetime64)
+        """
+        distances = np.atleast_1d(np.asarray(distances_miles, dtype=float))
+        n = len(distances)
+        cycles = np.broadcast_to(np.asarray(cycle_hours_used, dtype=float), (n,))
+        if start_times is None:
+            start_times = datetime.now()
+        starts = np.broadcast_to(np.asarray(start_times, dtype='datetime64[us]'), (n,))
+        
+        if cycle_history is not None:
+            history = self._history_from_days(cycle_history, n)
+            valid = np.isfinite(distances) & (distances > 0) & np.isfinite(history).all(axis=1)
+        else:
+            history = self._history(cycles)
+            valid = np.isfinite(distances) & (distances > 0) & np.isfinite(cycles)
+        history = np.where(np.isfinite(history), history, 0).astype(np.int64)
+        # The scalar planner schedules whole minutes from the start minute
+        after_midnight = (starts.astype('datetime64[m]') - starts.astype('datetime64[D]')).astype(np.int64)
+        
+        total_driving = np.ones(n, dtype=np.int64)
+        total_driving[valid] = np.maximum(
+            np.round(distances[valid] / self.speed * 60).astype(np.int64), 1)
+        
+        # With and without sleeper berth splits when the rules allow them;
+        # the earliest arrival is kept, the first variant on ties
+        state = None
+        for table in self.table.variants:
+            variant = self._simulate(total_driving, history, after_midnight, valid, table)
+            if state is None:
+                state = variant
+            else:
+                earlier = variant['elapsed'] < state['elapsed']
+                state = {key: np.where(earlier, variant[key], state[key]) for key in state}
+        
+        elapsed = state['elapsed']
+        fuel_stops = state['fuel_stops']
+        num_days = (elapsed + after_midnight - 1) // MINUTES_PER_DAY + 1
+        on_duty = total_driving + 2 * self.pickup_dropoff + fuel_stops * self.fuel_stop
+        
+        def hours(minutes: np.ndarray) -> np.ndarray:
+            return np.where(valid, minutes / 60, np.nan)
+        
+        def counts(values: np.ndarray) -> np.ndarray:
+            return np.where(valid, values, -1)
+        
+        arrival = starts + elapsed.astype('timedelta64[m]')
+        return {
+            'valid': valid,
+            'estimated_duration_hours': hours(elapsed),
+            'total_driving_time': hours(total_driving),
+            'total_on_duty_time': hours(on_duty),
+            'num_rest_breaks': counts(state['rests']),
+            'num_restarts': counts(state['restarts']),
+            'num_fuel_stops': counts(fuel_stops),
+            'num_days': counts(num_days),
+            'cycle_hours_available': hours(state['available']),
+            'estimated_arrival': np.where(valid, arrival, np.datetime64('NaT'))
+        }
+    
+    def plan_details(self, distances_miles: Sequence[float], cycle_hours_used=0,
+                     start_times=None, indices: Sequence[int] = None,
+                     cycle_history=None) -> List[Dict]:
+        """
+        Full trip plans (segments and daily logs) for selected trips
+        
+        Args:
+            distances_miles, cycle_hours_used, start_times, cycle_history:
+                As for plan_trips
+            indices: Trips to plan in detail (defaults to all)
+        
+        Returns:
+            ELDService.calculate_trip_plan results in the order of indices
+        """
+        distances = np.atleast_1d(np.asarray(distances_miles, dtype=float))
+        n = len(distances)
+        cycles = np.broadcast_to(np.asarray(cycle_hours_used, dtype=float), (n,))
+        if start_times is None:
+            start_times = datetime.now()
+        starts = np.broadcast_to(np.asarray(start_times, dtype='datetime64[us]'), (n,))
+        if cycle_history is not None:
+            histories = np.broadcast_to(np.atleast_2d(np.asarray(cycle_history, dtype=float)),
+                                        (n, np.shape(cycle_history)[-1]))
+        if indices is None:
+            indices = range(n)
+        return [
+            self.service_class(float(cycles[i]),
+                               list(histories[i]) if cycle_history is not None else None,
+                               rules=self.hos_rules
+                               ).calculate_trip_plan(float(distances[i]), starts[i].astype(datetime))
+            for i in indices
+        ]
+    
+    def _simulate(self, total_driving: np.ndarray, history: np.ndarray,
+                  after_midnight: np.ndarray, valid: np.ndarray,
+                  table: RuleTable) -> Dict[str, np.ndarray]:
+        """
+        Step all trips through the scalar planner's loop together
+        
+        Mirrors ELDService._calculate_segments; each masked update below is
+        one branch of that loop applied to the trips that take it.
+        """
+        n = len(total_driving)
+        rows = np.arange(n)
+        days = self.cycle_days + 1
+        
+        # Cycle ledger: running on-duty totals per day in a ring buffer.
+        # Day 0 is an empty day, days 1..cycle_days-1 the history and day
+        # cycle_days is the start date, so no lookup falls before day 0.
+        totals = np.zeros((n, days), dtype=np.int64)
+        totals[:, 1:self.cycle_days] = np.cumsum(history, axis=1)
+        totals[:, self.cycle_days] = totals[:, self.cycle_days - 1]
+        today = np.full(n, self.cycle_days, dtype=np.int64)
+        floor = np.zeros(n, dtype=np.int64)
+        
+        elapsed = np.zeros(n, dtype=np.int64)
+        next_midnight = MINUTES_PER_DAY - after_midnight
+        driven = np.zeros(n, dtype=np.int64)
+        left = np.tile(np.array(table.limits, dtype=np.int64), (n, 1))  # Minutes left per HOS clock
+        split = np.zeros(n, dtype=np.int64)  # Sleeper berth split state
+        fuel_stops = np.zeros(n, dtype=np.int64)
+        next_fuel = np.full(n, self.service_class._minutes(self.fuel_interval / self.speed),
+                            dtype=np.int64)
+        rests = np.zeros(n, dtype=np.int64)
+        restarts = np.zeros(n, dtype=np.int64)
+        
+        def total(day: np.ndarray) -> np.ndarray:
+            return totals[rows, day % days]
+        
+        def available() -> np.ndarray:
+            used = total(today) - np.maximum(total(today - self.cycle_days), floor)
+            return np.maximum(self.max_cycle - used, 0)
+        
+        def gained_tomorrow() -> np.ndarray:
+            oldest = today - self.cycle_days + 1
+            return (np.maximum(total(oldest), floor)
+                    - np.maximum(total(oldest - 1), floor))
+        
+        def add(mask: np.ndarray, duration, on_duty: bool):
+            # Book the time in the ledger, day by day (ELDService add)
+            duration = np.broadcast_to(duration, (n,))
+            end = elapsed + duration
+            position = elapsed.copy()
+            while True:
+                crossing = mask & (next_midnight <= end)
+                if not crossing.any():
+                    break
+                idx = rows[crossing]
+                if on_duty:
+                    totals[idx, today[idx] % days] += next_midnight[idx] - position[idx]
+                totals[idx, (today[idx] + 1) % days] = totals[idx, today[idx] % days]
+                today[idx] += 1
+                position[idx] = next_midnight[idx]
+                next_midnight[idx] += MINUTES_PER_DAY
+            idx = rows[mask]
+            if on_duty:
+                totals[idx, today[idx] % days] += end[idx] - position[idx]
+            elapsed[idx] = end[idx]
+        
+        def take(mask: np.ndarray, action: tuple):
+            # One compiled break (ELDService take)
+            if not mask.any():
+                return
+            breaks, source, keep, refill, split[mask] = action
+            for segment_type, _, duration in breaks:
+                add(mask, duration, False)
+                rests[mask] += segment_type == 'rest'
+            left[mask] = left[mask][:, source] * keep + refill
+            if action is table.restart_action:
+                floor[mask] = total(today)[mask]
+                restarts[mask] += 1
+        
+        def cycle_break(mask: np.ndarray):
+            # A rest across midnight may give back enough cycle hours
+            rest = mask & (next_midnight - elapsed <= table.daily_rest_minutes) & (
+                gained_tomorrow() >= table.max_driving)
+            take(rest, table.daily_rest)
+            take(mask & ~rest, table.restart_action)
+        
+        def on_duty(mask: np.ndarray, duration: int):
+            cycle_break(mask & (available() < duration))
+            add(mask, duration, True)
+            source, keep, refill = table.transition('on_duty', duration)
+            left[mask] = left[mask][:, source] * keep + refill
+        
+        # Pickup
+        on_duty(valid, self.pickup_dropoff)
+        
+        active = valid.copy()
+        while active.any():
+            binding = left.argmin(axis=1)
+            limit = left[rows, binding]
+            cycle_limit = available()
+            
+            exhausted = active & (cycle_limit <= 0)
+            cycle_break(exhausted)
+            blocked = active & ~exhausted & (limit <= 0)
+            states = split.copy()
+            for state, on_limit in enumerate(table.on_limit):
+                in_state = blocked & (states == state)
+                for index, actions in enumerate(on_limit):
+                    pending = in_state & (binding == index)
+                    for candidate in actions[:-1]:
+                        _, source, keep, refill, _ = candidate
+                        finishes = pending & ((left[:, source] * keep + refill).min(axis=1)
+                                              >= total_driving - driven)
+                        take(finishes, candidate)
+                        pending &= ~finishes
+                    take(pending, actions[-1])
+            
+            driving = active & ~exhausted & ~blocked
+            minutes = np.minimum(np.minimum(limit, cycle_limit),
+                                 np.minimum(total_driving - driven, next_fuel - driven))
+            minutes = np.where(driving, minutes, 0)
+            driven += minutes
+            add(driving, minutes, True)
+            left -= minutes[:, None]
+            
+            arrived = driving & (driven == total_driving)
+            active &= ~arrived
+            driving &= ~arrived
+            
+            fuel = driving & (driven == next_fuel)
+            on_duty(fuel, self.fuel_stop)
+            fuel_stops[fuel] += 1
+            next_fuel[fuel] = np.round(
+                (fuel_stops[fuel] + 1) * self.fuel_interval / self.speed * 60).astype(np.int64)
+        
+        # Dropoff
+        on_duty(valid, self.pickup_dropoff)
+        
+        return {
+            'elapsed': elapsed,
+            'fuel_stops': fuel_stops,
+            'rests': rests,
+            'restarts': restarts,
+            'available': available()
+        }
+    
+    def _history(self, cycles: np.ndarray) -> np.ndarray:
+        """
+        On-duty minutes of the days before the start, oldest first, as
+        CycleLedger.from_cycle_used spreads them
+        """
+        used = np.where(np.isfinite(cycles), np.round(cycles * 60), 0).astype(np.int64)
+        used = np.maximum(used, 0)
+        back = np.arange(self.cycle_days - 1)  # 0 is yesterday
+        history = np.clip(used[:, None] - back * self.max_on_duty, 0, self.max_on_duty)
+        # Any excess beyond the preceding days is counted yesterday
+        history[:, 0] += np.maximum(used - (self.cycle_days - 1) * self.max_on_duty, 0)
+        return history[:, ::-1]
+    
+    def _history_from_days(self, cycle_history, n: int) -> np.ndarray:
+        """
+        On-duty minutes of the days before the start, oldest first, from
+        per-day hours (padded or cut to the last cycle_days - 1 days)
+        """
+        hours = np.atleast_2d(np.asarray(cycle_history, dtype=float))[:, -(self.cycle_days - 1):]
+        history = np.zeros((len(hours), self.cycle_days - 1))
+        if hours.shape[1]:
+            # The ledger ignores days without on-duty time
+            history[:, -hours.shape[1]:] = np.maximum(np.round(hours * 60), 0)
+        return np.broadcast_to(history, (n, self.cycle_days - 1))
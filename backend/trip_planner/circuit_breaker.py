@@ -0,0 +1,196 @@
+"""
+Circuit Breaker
+Per-provider failure tracking so a degraded provider is skipped instead of waited on
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the provider's circuit is open"""
+
+
+class NoResultError(ValueError):
+    """
+    Raised when a provider answered but has no result for the input
+    (an address that cannot be geocoded, two points with no route)
+    
+    Unlike other errors, including a ValueError from parsing a garbled
+    response, it says nothing bad about the provider.
+    """
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for one provider
+    
+    closed: calls flow normally and outcomes are recorded.
+    open: calls are refused until open_seconds have passed.
+    half_open: a limited number of probe calls are let through; a success
+    closes the circuit again, a failure re-opens it.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    DEFAULT_FAILURE_RATE = 0.5
+    DEFAULT_MIN_CALLS = 5
+    DEFAULT_WINDOW_SIZE = 20
+    DEFAULT_OPEN_SECONDS = 30.0
+    DEFAULT_SLOW_CALL_SECONDS = 10.0
+    DEFAULT_HALF_OPEN_CALLS = 1
+    
+    def __init__(self, name: str, failure_rate: float = None, min_calls: int = None,
+                 window_size: int = None, open_seconds: float = None,
+                 slow_call_seconds: float = None, half_open_calls: int = None):
+        """
+        Initialize circuit breaker
+        
+        Args:
+            name: Provider name
+            failure_rate: Share of failed (or slow) calls in the window that opens the circuit
+            min_calls: Calls needed in the window before the rate is evaluated
+            window_size: Number of most recent calls considered
+            open_seconds: How long the circuit stays open before probing
+            slow_call_seconds: Successful calls slower than this count as failures
+            half_open_calls: Probe calls allowed while half open
+        """
+        self.name = name
+        self.failure_rate = failure_rate if failure_rate is not None else float(
+            os.getenv('CIRCUIT_FAILURE_RATE', self.DEFAULT_FAILURE_RATE))
+        self.min_calls = min_calls if min_calls is not None else int(
+            os.getenv('CIRCUIT_MIN_CALLS', self.DEFAULT_MIN_CALLS))
+        self.window_size = window_size if window_size is not None else int(
+            os.getenv('CIRCUIT_WINDOW_SIZE', self.DEFAULT_WINDOW_SIZE))
+        self.open_seconds = open_seconds if open_seconds is not None else float(
+            os.getenv('CIRCUIT_OPEN_SECONDS', self.DEFAULT_OPEN_SECONDS))
+        self.slow_call_seconds = slow_call_seconds if slow_call_seconds is not None else float(
+            os.getenv('CIRCUIT_SLOW_CALL_SECONDS', self.DEFAULT_SLOW_CALL_SECONDS))
+        self.half_open_calls = half_open_calls if half_open_calls is not None else self.DEFAULT_HALF_OPEN_CALLS
+        
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        # (failed, latency_seconds) for the most recent calls
+        self._window = deque(maxlen=self.window_size)
+        self.total_calls = 0
+        self.total_failures = 0
+        self.rejected_calls = 0
+        self.times_opened = 0
+    
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half open once open_seconds have passed"""
+        with self._lock:
+            return self._current_state(time.monotonic())
+    
+    def _current_state(self, now: float) -> str:
+        """State as of now (caller holds the lock)"""
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+    
+    def allow_request(self) -> bool:
+        """
+        Ask whether a call may go to the provider
+        
+        Every allowed call must be followed by record_success or record_failure.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes_in_flight < self.half_open_calls:
+                self._probes_in_flight += 1
+                return True
+            self.rejected_calls += 1
+            return False
+    
+    def record_success(self, latency: float):
+        """Record a completed call; calls slower than slow_call_seconds count as failures"""
+        self._record(latency > self.slow_call_seconds, latency)
+    
+    def record_failure(self, latency: float):
+        """Record a failed call"""
+        self._record(True, latency)
+    
+    def _record(self, failed: bool, latency: float):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self.total_calls += 1
+            if failed:
+                self.total_failures += 1
+            
+            if state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed:
+                    self._open(now)
+                else:
+                    self._state = self.CLOSED
+                    self._window.clear()
+                self._window.append((failed, latency))
+                return
+            
+            self._window.append((failed, latency))
+            if state == self.CLOSED and len(self._window) >= self.min_calls:
+                failures = sum(1 for f, _ in self._window if f)
+                if failures / len(self._window) >= self.failure_rate:
+                    self._open(now)
+    
+    def _open(self, now: float):
+        """Open the circuit (caller holds the lock)"""
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self.times_opened += 1
+    
+    def snapshot(self) -> Dict:
+        """Return breaker state and counters for monitoring"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            latencies = sorted(latency for _, latency in self._window)
+            failures = sum(1 for f, _ in self._window if f)
+            return {
+                'state': state,
+                'window_calls': len(self._window),
+                'window_failure_rate': failures / len(self._window) if self._window else 0.0,
+                'latency_p50_seconds': latencies[len(latencies) // 2] if latencies else None,
+                'latency_p95_seconds': latencies[int(len(latencies) * 0.95)] if latencies else None,
+                'open_remaining_seconds': max(self.open_seconds - (now - self._opened_at), 0.0)
+                if state == self.OPEN else 0.0,
+                'total_calls': self.total_calls,
+                'total_failures': self.total_failures,
+                'rejected_calls': self.rejected_calls,
+                'times_opened': self.times_opened
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for a provider"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name)
+                _breakers[name] = breaker
+    return breaker
+
+
+def breaker_snapshots() -> Dict[str, Dict]:
+    """Return the snapshot of every provider breaker created so far"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,120 @@
+"""
+Cycle Ledger
+Rolling 70-hour/8-day on-duty totals with constant-time recap queries
+"""
+from typing import List
+
+
+class CycleLedger:
+    """
+    Per-day on-duty minutes for the rolling HOS cycle
+    
+    The ledger keeps running totals (prefix sums) of on-duty minutes in a
+    ring buffer with one entry per day of the cycle plus one, so the total
+    of any window of up to cycle_days days ending today is a single
+    subtraction. Advancing to the next day and every query are O(1).
+    
+    A 34-hour restart is recorded as a floor under the running total:
+    on-duty time before the restart no longer counts against the cycle.
+    """
+    
+    def __init__(self, max_minutes: int = 70 * 60, cycle_days: int = 8,
+                 history: List[int] = None):
+        """
+        Initialize cycle ledger
+        
+        Args:
+            max_minutes: On-duty minutes allowed in the cycle
+            cycle_days: Number of days in the rolling cycle
+            history: On-duty minutes of the days before today, oldest first;
+                only the last cycle_days - 1 days matter
+        """
+        self.max_minutes = max_minutes
+        self.cycle_days = cycle_days
+        self._totals = [0] * (cycle_days + 1)
+        self._today = 0
+        self._floor = 0
+        self._last_work_day = None
+        
+        for minutes in (history or [])[-(cycle_days - 1):]:
+            self.add(minutes)
+            self.advance_day()
+    
+    @classmethod
+    def from_cycle_used(cls, used_minutes: int, max_minutes: int = 70 * 60,
+                        cycle_days: int = 8, max_day_minutes: int = 14 * 60) -> 'CycleLedger':
+        """
+        Build a ledger when only the cycle total is known
+        
+        The hours are assumed to have been worked as recently as possible
+        (at most max_day_minutes a day, ending yesterday), so they roll
+        off as late as they could and the plan errs on the safe side.
+        """
+        history = []
+        remaining = max(used_minutes, 0)
+        while remaining > 0 and len(history) < cycle_days - 1:
+            day = min(remaining, max_day_minutes)
+            history.append(day)
+            remaining -= day
+        # Any excess beyond the preceding days is counted yesterday
+        if history:
+            history[0] += remaining
+        history.reverse()
+        return cls(max_minutes, cycle_days, history)
+    
+    def _total(self, day: int) -> int:
+        """Running total at the end of an absolute day (cycle_days + 1 days are kept)"""
+        if day < 0:
+            return 0
+        return self._totals[day % (self.cycle_days + 1)]
+    
+    def _counted(self, day: int) -> int:
+        """Running total at the end of day, ignoring time before the last restart"""
+        return max(self._total(day), self._floor)
+    
+    def add(self, minutes: int):
+        """Record on-duty minutes worked today"""
+        if minutes > 0:
+            self._totals[self._today % (self.cycle_days + 1)] += minutes
+            self._last_work_day = self._today
+    
+    def advance_day(self):
+        """Move to the next day (midnight)"""
+        total = self._total(self._today)
+        self._today += 1
+        self._totals[self._today % (self.cycle_days + 1)] = total
+    
+    def restart(self):
+        """Record a completed 34-hour restart"""
+        self._floor = self._total(self._today)
+    
+    def on_duty_today(self) -> int:
+        """On-duty minutes worked today"""
+        return self._total(self._today) - self._total(self._today - 1)
+    
+    def used(self, days: int = None) -> int:
+        """On-duty minutes counted in the last days days, including today"""
+        days = self.cycle_days if days is None else days
+        return self._total(self._today) - self._counted(self._today - days)
+    
+    def available(self) -> int:
+        """On-duty minutes still available today"""
+        return max(self.max_minutes - self.used(), 0)
+    
+    def available_tomorrow(self) -> int:
+        """On-duty minutes available tomorrow if no more work is done today"""
+        return max(self.max_minutes - self.used(self.cycle_days - 1), 0)
+    
+    def gained_tomorrow(self) -> int:
+        """On-duty minutes that roll off the cycle at the next midnight"""
+        oldest = self._today - self.cycle_days + 1
+        return self._counted(oldest) - self._counted(oldest - 1)
+    
+    def days_until_reset(self) -> int:
+        """
+        Days until every counted on-duty minute has rolled off, assuming
+        no more work (0 when nothing is counted)
+        """
+        if self.used() == 0 or self._last_work_day is None:
+            return 0
+        return self._last_work_day + self.cycle_days - self._today
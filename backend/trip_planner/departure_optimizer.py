@@ -0,0 +1,149 @@
+"""
+Departure Optimizer
+Finds the departure times that give the best HOS-compliant trips
+"""
+from datetime import datetime, timedelta
+from typing import Dict
+import numpy as np
+from .batch_planner import BatchTripPlanner
+from .hos_rules import HOSRuleSet
+
+
+# Ranking criteria, in order of priority, for each objective
+OBJECTIVES = {
+    'arrival': ('arrival', 'rest_breaks', 'duration'),
+    'rest_breaks': ('rest_breaks', 'arrival', 'duration'),
+    'duration': ('duration', 'arrival', 'rest_breaks')
+}
+
+
+def optimize_departure(distance_miles: float, cycle_hours_used: float = 0,
+                       earliest_departure: datetime = None, window_hours: float = 48,
+                       step_minutes: int = 15, objective: str = 'arrival',
+                       max_options: int = 10, cycle_history=None,
+                       rules: HOSRuleSet = None) -> Dict:
+    """
+    Sweep departure times and rank the ones worth considering
+    
+    Every departure from earliest_departure to window_hours later, every
+    step_minutes, is planned in one BatchTripPlanner call, each with
+    cycle_history shifted to its own departure date. Departures that
+    another departure beats on arrival, rest breaks and trip duration
+    alike are dropped; the rest are ranked by the objective.
+    
+    Args:
+        distance_miles: Total trip distance in miles
+        cycle_hours_used: Hours already used in the current cycle
+        earliest_departure: First candidate departure (defaults to now)
+        window_hours: Length of the departure window
+        step_minutes: Minutes between candidate departures
+        objective: 'arrival', 'rest_breaks' or 'duration'
+        max_options: Maximum number of options returned
+        cycle_history: On-duty hours of the days before earliest_departure,
+            oldest first (optional; replaces cycle_hours_used and lets later
+            departures gain the hours that roll off the cycle)
+        rules: HOS rule set (optional, defaults to ELDService.RULES)
+    
+    Returns:
+        Dictionary with the number of candidates evaluated and the ranked
+        options (departure, arrival, duration and stop counts)
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+    if not step_minutes >= 1 or not window_hours >= 0:
+        raise ValueError("step_minutes must be at least 1 and window_hours not negative")
+    if earliest_departure is None:
+        earliest_departure = datetime.now()
+    
+    offsets = np.arange(0, int(window_hours * 60) + 1, int(step_minutes))
+    departures = np.datetime64(earliest_departure, 'us') + offsets.astype('timedelta64[m]')
+    if cycle_history is not None:
+        cycle_history = _shift_history(cycle_history, departures, earliest_departure)
+    plans = BatchTripPlanner(rules=rules).plan_trips(
+        np.full(len(offsets), float(distance_miles)), cycle_hours_used, departures,
+        cycle_history=cycle_history)
+    if not plans['valid'].all():
+        raise ValueError("Trip distance must be greater than 0")
+    
+    criteria = {
+        'arrival': (plans['estimated_arrival'] - departures[0]).astype('timedelta64[s]').astype(np.int64),
+        'rest_breaks': plans['num_rest_breaks'],
+        'duration': np.round(plans['estimated_duration_hours'] * 60).astype(np.int64)
+    }
+    keep = ~_dominated(np.column_stack([criteria[name] for name in OBJECTIVES[objective]]))
+    
+    # Rank by the criteria in priority order (lexsort sorts by the last key first)
+    candidates = np.flatnonzero(keep)
+    order = np.lexsort([criteria[name][candidates] for name in reversed(OBJECTIVES[objective])])
+    ranked = candidates[order][:max_options]
+    
+    return {
+        'objective': objective,
+        'candidates_evaluated': len(offsets),
+        'options': [_option(plans, departures, i, earliest_departure) for i in ranked]
+    }
+
+
+def _shift_history(cycle_history, departures: np.ndarray, earliest_departure: datetime) -> np.ndarray:
+    """
+    One cycle history row per departure
+    
+    The history is given for the days before earliest_departure. A
+    departure on a later date also has the days spent waiting behind it,
+    off duty, so its row is the history followed by one zero per day.
+    """
+    hours = np.asarray(cycle_history, dtype=float)
+    if hours.ndim != 1:
+        raise ValueError("cycle_history must be a list of daily hours")
+    days_waited = (departures.astype('datetime64[D]')
+                   - np.datetime64(earliest_departure.date(), 'D')).astype(np.int64)
+    width = len(hours) + int(days_waited.max())
+    history = np.zeros((len(departures), width))
+    for i, days in enumerate(days_waited):
+        # Right-aligned: the zeros on the left are days before the history
+        history[i, width - days - len(hours):width - days] = hours
+    return history
+
+
+def _dominated(costs: np.ndarray) -> np.ndarray:
+    """
+    Rows that another row matches or beats on every column and beats on one
+    
+    Costs have three columns. Sorted lexicographically, a distinct row is
+    dominated exactly when an earlier one is no worse on the last two
+    columns; a Fenwick tree of the smallest third column per second-column
+    prefix answers that for each row in O(log n).
+    """
+    rows, inverse = np.unique(costs, axis=0, return_inverse=True)
+    ranks = np.unique(rows[:, 1], return_inverse=True)[1].reshape(-1) + 1
+    size = int(ranks.max())
+    tree = [np.inf] * (size + 1)
+    dominated = np.zeros(len(rows), dtype=bool)
+    for i, (rank, value) in enumerate(zip(ranks.tolist(), rows[:, 2].tolist())):
+        best = np.inf
+        j = rank
+        while j > 0:
+            best = min(best, tree[j])
+            j -= j & -j
+        dominated[i] = best <= value
+        j = rank
+        while j <= size:
+            tree[j] = min(tree[j], value)
+            j += j & -j
+    return dominated[inverse.reshape(-1)]
+
+
+def _option(plans: Dict, departures: np.ndarray, i: int, earliest_departure: datetime) -> Dict:
+    """API representation of one candidate departure"""
+    departure = departures[i].astype(datetime)
+    return {
+        'departure': departure.isoformat(),
+        'wait_hours': (departure - earliest_departure) / timedelta(hours=1),
+        'estimated_arrival': plans['estimated_arrival'][i].astype(datetime).isoformat(),
+        'estimated_duration_hours': float(plans['estimated_duration_hours'][i]),
+        'num_rest_breaks': int(plans['num_rest_breaks'][i]),
+        'num_restarts': int(plans['num_restarts'][i]),
+        'num_fuel_stops': int(plans['num_fuel_stops'][i]),
+        'num_days': int(plans['num_days'][i])
+    }
+
@@ -1,20 +1,29 @@
 """
 ELD Compliance Service
 Handles Hours of Service (HOS) calculations for property-carrying drivers
-Rules: 70 hours/8 days, 11-hour driving limit, 14-hour on-duty limit, 10-hour rest break
+Rules come from a HOSRuleSet; the default is 70 hours/8 days, 11-hour driving
+limit, 14-hour on-duty window, 30-minute break and 10-hour rest break
 """
-from datetime import datetime, timedelta, MINYEAR, MAXYEAR
+from datetime import datetime, timedelta
 from typing import List, Dict, Tuple
 import math
+from .cycle_ledger import CycleLedger
+from .hos_rules import (DEFAULT_RULE_SET, OFF_DUTY_ACTIVITY, OFF_DUTY_TYPES, RESTART_ACTIVITY,
+                        SLEEPER_ACTIVITY, SPLIT_ACTIVITY, SPLIT_NONE, HOSRuleSet, RuleTable)
+from .segments import Segment
+
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _minutes_after_midnight(start_time: datetime) -> int:
+    """Whole minutes from midnight to start_time"""
+    return start_time.hour * 60 + start_time.minute
 
 
 class ELDService:
-    # HOS Rules for property-carrying drivers
-    MAX_DRIVING_HOURS = 11  # Maximum driving time per day
-    MAX_ON_DUTY_HOURS = 14  # Maximum on-duty time per day
-    MIN_REST_HOURS = 10  # Minimum consecutive rest break
-    MAX_CYCLE_HOURS = 70  # Maximum hours in 8 days
-    CYCLE_DAYS = 8
+    # HOS rules for property-carrying drivers
+    RULES = DEFAULT_RULE_SET
     
     # Average speeds and times
     AVG_SPEED_MPH = 55  # Average highway speed
@@ -22,38 +31,32 @@ class ELDService:
     FUEL_INTERVAL_MILES = 1000  # Fuel every 1000 miles
     PICKUP_DROPOFF_DURATION = 1.0  # 1 hour for pickup/dropoff
     
-    def __init__(self, current_cycle_used: float):
+    def __init__(self, current_cycle_used: float, cycle_history: List[float] = None,
+                 average_speed_mph: float = None, rules: HOSRuleSet = None):
         """
         Initialize ELD service with current cycle hours used
         
         Args:
             current_cycle_used: Hours already used in current 8-day cycle
+            cycle_history: On-duty hours of each of the previous days, oldest
+                first (optional; when given it replaces current_cycle_used,
+                which only says how many hours were used, not when)
+            average_speed_mph: Driving speed of this trip (optional, defaults
+                to AVG_SPEED_MPH)
+            rules: HOS rule set (optional, defaults to RULES)
         """
+        self.rules = rules if rules is not None else self.RULES
+        self.table = self.rules.compile()
+        if cycle_history is not None:
+            cycle_history = [float(h) for h in cycle_history][-(self.rules.cycle_days - 1):]
+            current_cycle_used = sum(cycle_history)
+        self.cycle_history = cycle_history
         self.current_cycle_used = current_cycle_used
-        self.available_cycle_hours = self.MAX_CYCLE_HOURS - current_cycle_used
-    
-    def _safe_add_time(self, dt: datetime, hours: float) -> datetime:
-        """Safely add hours to datetime, preventing date overflow"""
-        try:
-            # Validate input datetime first
-            if dt.year < MINYEAR or dt.year > MAXYEAR:
-                dt = datetime.now()
-            
-            # Limit hours to prevent overflow (max 240 hours = 10 days)
-            hours = min(abs(hours), 240)
-            new_dt = dt + timedelta(hours=hours)
-            
-            # Validate result is in valid range
-            if new_dt.year < MINYEAR or new_dt.year > MAXYEAR:
-                # Return original time plus 1 hour as fallback
-                return dt + timedelta(hours=1)
-            return new_dt
-        except (OverflowError, ValueError, AttributeError):
-            # If any error, return current time plus small increment
-            try:
-                return datetime.now() + timedelta(hours=min(hours, 1))
-            except:
-                return datetime.now()
+        self.available_cycle_hours = self.rules.max_cycle_hours - current_cycle_used
+        if average_speed_mph is not None:
+            if not average_speed_mph > 0 or not math.isfinite(average_speed_mph):
+                raise ValueError("Average speed must be greater than 0")
+            self.AVG_SPEED_MPH = average_speed_mph
     
     def calculate_trip_plan(self, distance_miles: float, start_time: datetime = None) -> Dict:
         """
@@ -64,299 +67,474 @@ class ELDService:
             start_time: Trip start time (defaults to now)
             
         Returns:
-            Dictionary containing trip segments, rest stops, and ELD logs
+            Dictionary containing trip segments, rest stops, and ELD logs.
+            Segment and timeline times are whole minutes from start_time; use
+            segments.serialize_trip_plan for the JSON representation.
         """
         if start_time is None:
             start_time = datetime.now()
         
-        # Validate distance (max 5000 miles to prevent date overflow)
-        if distance_miles > 5000:
-            raise ValueError("Trip distance exceeds maximum of 5000 miles")
+        if not distance_miles > 0 or not math.isfinite(distance_miles):
+            raise ValueError("Trip distance must be greater than 0")
+        try:
+            start_time + timedelta(hours=distance_miles / self.AVG_SPEED_MPH)
+        except OverflowError:
+            raise ValueError("Trip is too long to schedule")
+        
+        # Calculate trip segments with rest breaks, with and without
+        # sleeper berth splits when the rules allow them
+        segments, ledger = min(
+            (self._calculate_segments(distance_miles, start_time, table=table)
+             for table in self.table.variants),
+            key=lambda plan: plan[0][-1].end)
         
-        if distance_miles <= 0:
+        # Generate daily logs
+        daily_logs = self._generate_daily_logs(segments, start_time)
+        
+        return self._summarize(distance_miles, start_time, segments, ledger, daily_logs)
+    
+    def replan_trip(self, segments: List[Segment], start_time: datetime, distance_miles: float,
+                    as_of: datetime, miles_driven: float, driving_hours: float = None,
+                    on_duty_hours: float = None) -> Dict:
+        """
+        Replan the rest of a trip under way from a progress update
+        
+        Planned segments are kept as they are up to as_of or to where the
+        truck is (miles_driven), whichever comes first: the driver finishes
+        a rest or stop in progress (with any off-duty periods directly
+        following it), and a driving segment is cut. Planned segments the
+        truck has not reached did not happen. When the truck is behind the
+        plan, the time from the end of what is kept to as_of is booked off
+        duty. Only the rest of the trip is planned again, from miles_driven
+        and no earlier than as_of, and only the daily logs from the first
+        changed day on are generated again.
+        
+        Args:
+            segments: Segments of the current plan
+            start_time: Start time of the current plan
+            distance_miles: Total trip distance in miles
+            as_of: Time of the progress update
+            miles_driven: Miles driven so far
+            driving_hours: Driving hours since the last 10-hour rest
+                (optional, derived from the plan)
+            on_duty_hours: On-duty hours since the last 10-hour rest
+                (optional, derived from the plan)
+        
+        Returns:
+            Trip plan like calculate_trip_plan, except that 'daily_logs'
+            only holds the logs from 'first_changed_day' (an index into the
+            plan's days) on; earlier logs are unchanged
+        """
+        if not distance_miles > 0 or not math.isfinite(distance_miles):
             raise ValueError("Trip distance must be greater than 0")
+        if not 0 <= miles_driven <= distance_miles:
+            raise ValueError("miles_driven must be between 0 and the trip distance")
         
-        # Calculate number of fuel stops needed
-        num_fuel_stops = math.floor(distance_miles / self.FUEL_INTERVAL_MILES)
+        now = max(int((as_of - start_time) / timedelta(minutes=1)), 0)
+        history = self._history_as_of(segments, now, miles_driven)
+        # The plan is unchanged up to here
+        changed = min(history[-1].end if history else 0, now)
+        if history and history[-1].end < now and history[-1].activity != 'Dropoff':
+            # Behind the plan: nothing is known about the time since
+            history.append(Segment('rest', OFF_DUTY_ACTIVITY, history[-1].end,
+                                   now - history[-1].end, 0, miles_driven))
         
-        # Calculate total driving time (hours)
-        base_driving_time = distance_miles / self.AVG_SPEED_MPH
+        clocks = None
+        if driving_hours is not None or on_duty_hours is not None:
+            driving = self._minutes(driving_hours or 0)
+            clocks = (driving, max(self._minutes(on_duty_hours or 0), driving))
         
-        # Add pickup and dropoff time
-        total_on_duty_time = base_driving_time + (2 * self.PICKUP_DROPOFF_DURATION)
+        # Go on with sleeper berth splits only if the plan takes them
+        table = self.table.variants[-1] if any(
+            s.activity in (SLEEPER_ACTIVITY, SPLIT_ACTIVITY) for s in segments
+        ) else self.table.variants[0]
+        if history:
+            new_segments, ledger = self._calculate_segments(
+                distance_miles, start_time, history, miles_driven, clocks, table)
+            cut = new_segments[len(history) - 1]
+            following = new_segments[len(history)] if len(new_segments) > len(history) else cut
+            if cut is not following and cut.type == following.type == 'driving':
+                # Driving on from the cut: keep one segment, as in the original plan
+                new_segments[len(history) - 1:len(history) + 1] = [Segment(
+                    'driving', cut.activity, cut.start, cut.duration + following.duration,
+                    cut.distance + following.distance, cut.mile_marker)]
+        else:
+            new_segments, ledger = self._calculate_segments(distance_miles, start_time, table=table)
         
-        # Add fuel stop time
-        total_on_duty_time += num_fuel_stops * self.FUEL_STOP_DURATION
+        first_day = (changed + _minutes_after_midnight(start_time)) // MINUTES_PER_DAY
+        daily_logs = self._generate_daily_logs(new_segments, start_time, first_day)
         
-        # Calculate trip segments with rest breaks
-        segments = self._calculate_segments(
-            distance_miles, 
-            base_driving_time, 
-            num_fuel_stops,
-            start_time
-        )
+        plan = self._summarize(distance_miles, start_time, new_segments, ledger, daily_logs)
+        plan['first_changed_day'] = first_day
+        return plan
+    
+    @staticmethod
+    def _history_as_of(segments: List[Segment], now: int, miles_driven: float) -> List[Segment]:
+        """
+        Planned segments that happened by minute now, with the truck at miles_driven
         
-        # Generate daily logs
-        daily_logs = self._generate_daily_logs(segments, start_time)
+        A driving segment in progress is cut at now, or earlier where it
+        reaches miles_driven, and ends where the truck is; a stop in
+        progress is kept whole, together with off-duty segments that
+        directly follow an off-duty one.
+        """
+        history = []
+        for segment in segments:
+            if segment.start >= now or segment.mile_marker > miles_driven:
+                break
+            if segment.type == 'driving':
+                end = min(segment.end, now)
+                if segment.mile_marker + segment.distance > miles_driven:
+                    share = (miles_driven - segment.mile_marker) / segment.distance
+                    minutes = int(round(segment.duration * share))
+                    if share > 0:
+                        # Any distance driven takes at least a minute
+                        minutes = max(minutes, 1)
+                    end = min(end, segment.start + minutes)
+                if end <= segment.start:
+                    break
+                if end < segment.end or segment.mile_marker + segment.distance > miles_driven:
+                    # The truck is at miles_driven when the segment is cut
+                    distance = min(miles_driven - segment.mile_marker, segment.distance)
+                    history.append(Segment(segment.type, segment.activity, segment.start,
+                                           end - segment.start, distance, segment.mile_marker))
+                    break
+            history.append(segment)
+        else:
+            return history
+        
+        if history and history[-1].type in OFF_DUTY_TYPES:
+            for segment in segments[len(history):]:
+                if segment.type not in OFF_DUTY_TYPES:
+                    break
+                history.append(segment)
+        return history
+    
+    def _summarize(self, distance_miles: float, start_time: datetime, segments: List[Segment],
+                   ledger: CycleLedger, daily_logs: List[Dict]) -> Dict:
+        """Trip plan dictionary from planned segments"""
+        num_fuel_stops = len([s for s in segments if s.activity == 'Fuel Stop'])
+        
+        # Driving plus pickup, dropoff and fuel stop time
+        driving_minutes = sum(s.duration for s in segments if s.type == 'driving')
+        on_duty_minutes = sum(s.duration for s in segments if s.type in ('driving', 'on_duty'))
         
         return {
+            'start_time': start_time,
             'total_distance': distance_miles,
-            'total_driving_time': base_driving_time,
-            'total_on_duty_time': total_on_duty_time,
+            'total_driving_time': driving_minutes / 60,
+            'total_on_duty_time': on_duty_minutes / 60,
             'estimated_duration_hours': self._calculate_total_duration(segments),
-            'num_rest_breaks': len([s for s in segments if s['type'] == 'rest']),
+            'num_rest_breaks': len([s for s in segments if s.type == 'rest']),
+            'num_restarts': len([s for s in segments if s.activity == RESTART_ACTIVITY]),
             'num_fuel_stops': num_fuel_stops,
             'segments': segments,
             'daily_logs': daily_logs,
+            'hos_rules': self.rules.name,
             'cycle_hours_used': self.current_cycle_used,
-            'cycle_hours_available': self.available_cycle_hours
+            'cycle_hours_available': ledger.available() / 60
         }
     
-    def _calculate_segments(self, total_distance: float, driving_time: float, 
-                           num_fuel_stops: int, start_time: datetime) -> List[Dict]:
+    @staticmethod
+    def _minutes(hours: float) -> int:
+        """Convert hours to whole minutes"""
+        return int(round(hours * 60))
+    
+    def _new_ledger(self) -> CycleLedger:
+        """Cycle ledger holding the driver's on-duty time before the trip"""
+        table = self.table
+        if self.cycle_history is not None:
+            return CycleLedger(table.max_cycle, table.cycle_days,
+                               [self._minutes(h) for h in self.cycle_history])
+        return CycleLedger.from_cycle_used(
+            self._minutes(self.current_cycle_used), table.max_cycle, table.cycle_days,
+            table.max_window
+        )
+    
+    def _calculate_segments(self, total_distance: float, start_time: datetime,
+                            history: List[Segment] = None, progress_miles: float = 0,
+                            clocks: Tuple[int, int] = None,
+                            table: RuleTable = None) -> Tuple[List[Segment], CycleLedger]:
         """
         Break trip into segments with driving, rest, and fuel stops
+        
+        All times are whole minutes, the resolution of the log grid, so
+        every limit check is an exact integer comparison. Driving time is
+        the trip distance at AVG_SPEED_MPH rounded to the minute; the last
+        driving segment absorbs the rounding.
+        
+        The HOS limits come from the compiled RuleTable: a list of clocks
+        (driving, on-duty window, time since the last break) with their
+        limits and, for each clock, the break that frees it. Each driving
+        segment runs until the first of four events: the end of the trip,
+        the next fuel stop (every FUEL_INTERVAL_MILES), a clock running out
+        or the end of the cycle. The length of a segment follows directly
+        from those distances, so the plan takes one step per segment however
+        long the trip is, and every step is the same table lookup whatever
+        the rules.
+        
+        On-duty time is booked day by day in a CycleLedger. When the cycle
+        runs out the driver takes a 34-hour restart, unless an ordinary
+        rest across midnight gives back a full driving day anyway.
+        
+        Every segment records its mile_marker, the miles driven before it
+        starts, so stops can be placed on the route geometry.
+        
+        To replan a trip under way, history holds the segments that already
+        happened (contiguous from the start). They are replayed to restore
+        the ledger and the clocks, and the plan continues from
+        progress_miles; clocks, when given, replaces the (driving, on-duty)
+        minutes since the last rest derived from the history.
+        
+        table is one of the rule table's variants (defaults to the table).
+        
+        Returns:
+            Tuple of (segments, ledger as of the end of the trip)
         """
+        table = table or self.table
+        fuel_stop = self._minutes(self.FUEL_STOP_DURATION)
+        pickup_dropoff = self._minutes(self.PICKUP_DROPOFF_DURATION)
+        fuel_transition = table.transition('on_duty', fuel_stop)
+        pickup_transition = table.transition('on_duty', pickup_dropoff)
+        total_driving = max(self._minutes(total_distance / self.AVG_SPEED_MPH), 1)
+        
+        ledger = self._new_ledger()
         segments = []
-        current_time = start_time
-        remaining_distance = total_distance
-        remaining_driving_time = driving_time
-        current_day_driving = 0
-        current_day_on_duty = 0
-        fuel_stops_remaining = num_fuel_stops
-        
-        # Add pickup activity
-        segments.append({
-            'type': 'on_duty',
-            'activity': 'Pickup',
-            'start_time': current_time.isoformat(),
-            'duration': self.PICKUP_DROPOFF_DURATION,
-            'distance': 0
-        })
-        current_time = self._safe_add_time(current_time, self.PICKUP_DROPOFF_DURATION)
-        current_day_on_duty += self.PICKUP_DROPOFF_DURATION
-        
-        # Safety counter to prevent infinite loops
-        max_iterations = 100  # Reduced from 1000 - a 1400 mile trip should not need 100 iterations
-        iteration_count = 0
-        
-        while remaining_distance > 0.5 and iteration_count < max_iterations:  # Changed from > 0 to > 0.5
-            iteration_count += 1
-            # Calculate how much we can drive before hitting limits
-            max_driving_today = min(
-                self.MAX_DRIVING_HOURS - current_day_driving,
-                remaining_driving_time
-            )
-            
-            # Check on-duty limit
-            max_on_duty_today = self.MAX_ON_DUTY_HOURS - current_day_on_duty
-            if max_on_duty_today <= 0:
-                # Need rest break
-                segments.append({
-                    'type': 'rest',
-                    'activity': 'Off Duty - Rest Break',
-                    'start_time': current_time.isoformat(),
-                    'duration': self.MIN_REST_HOURS,
-                    'distance': 0
-                })
-                current_time = self._safe_add_time(current_time, self.MIN_REST_HOURS)
-                current_day_driving = 0
-                current_day_on_duty = 0
-                continue
+        elapsed = 0  # Minutes since start_time
+        next_midnight = MINUTES_PER_DAY - _minutes_after_midnight(start_time)
+        driven = 0  # Driving minutes so far
+        # Minutes left on each HOS clock plus driven: every clock counts
+        # driving, so a driving segment changes none of them
+        due = list(table.limits)
+        soonest = min(due)
+        split = SPLIT_NONE  # Which sleeper berth split period would complete a pair
+        miles_driven = 0.0  # Mile marker along the route
+        fuel_stops = 0
+        next_fuel = self._minutes(self.FUEL_INTERVAL_MILES / self.AVG_SPEED_MPH)
+        
+        def add(segment_type: str, activity: str, duration: int, distance: float = 0):
+            nonlocal elapsed, next_midnight
+            segments.append(Segment(segment_type, activity, elapsed, duration, distance, miles_driven))
             
-            # Adjust for on-duty limit
-            max_driving_today = min(max_driving_today, max_on_duty_today)
+            # Book the time in the cycle ledger, day by day
+            on_duty = segment_type in ('driving', 'on_duty')
+            position = elapsed
+            end = elapsed + duration
+            while next_midnight <= end:
+                if on_duty:
+                    ledger.add(next_midnight - position)
+                ledger.advance_day()
+                position = next_midnight
+                next_midnight += MINUTES_PER_DAY
+            if on_duty:
+                ledger.add(end - position)
+            elapsed = end
+        
+        def apply(source: Tuple[int, ...], keep: Tuple[int, ...], refill: Tuple[int, ...]):
+            nonlocal due, soonest
+            due = [(due[i] - driven) * k + r + driven for i, k, r in zip(source, keep, refill)]
+            soonest = min(due)
+        
+        def take(action: Tuple):
+            nonlocal split
+            breaks, source, keep, refill, split = action
+            for segment_type, activity, duration in breaks:
+                add(segment_type, activity, duration)
+            apply(source, keep, refill)
+            if action is table.restart_action:
+                ledger.restart()
+        
+        def cycle_break():
+            # A rest across midnight may give back enough cycle hours
+            if (next_midnight - elapsed <= table.daily_rest_minutes
+                    and ledger.gained_tomorrow() >= table.max_driving):
+                take(table.daily_rest)
+            else:
+                take(table.restart_action)
+        
+        def on_duty(activity: str, duration: int, transition: Tuple):
+            if ledger.available() < duration:
+                cycle_break()
+            add('on_duty', activity, duration)
+            apply(*transition)
+        
+        if history:
+            # Replay what already happened; the plan continues from its end
+            for segment in history:
+                miles_driven = segment.mile_marker
+                add(segment.type, segment.activity, segment.duration, segment.distance)
+                if segment.activity == RESTART_ACTIVITY:
+                    ledger.restart()
+            hos_clocks, split = table.replay((s.type, s.duration) for s in history)
+            if clocks is not None:
+                # Also counted from here on by the split clocks, if any
+                for index, name in enumerate(table.names):
+                    if name in ('driving', 'driving_split'):
+                        hos_clocks[index] = clocks[0]
+                    elif name in ('window', 'window_split'):
+                        hos_clocks[index] = clocks[1]
+                split = SPLIT_NONE
             
-            if max_driving_today <= 0.1:  # Changed from <= 0 to <= 0.1 to avoid tiny segments
-                # Need rest break
-                segments.append({
-                    'type': 'rest',
-                    'activity': 'Off Duty - Rest Break',
-                    'start_time': current_time.isoformat(),
-                    'duration': self.MIN_REST_HOURS,
-                    'distance': 0
-                })
-                current_time = self._safe_add_time(current_time, self.MIN_REST_HOURS)
-                current_day_driving = 0
-                current_day_on_duty = 0
+            miles_driven = min(max(progress_miles, 0.0), total_distance)
+            driven = min(self._minutes(miles_driven / self.AVG_SPEED_MPH), total_driving)
+            if driven == total_driving and miles_driven < total_distance:
+                # The rest of the way still takes a minute
+                driven -= 1
+            # The next fuel stop is the next FUEL_INTERVAL_MILES mark ahead
+            fuel_stops = int(miles_driven // self.FUEL_INTERVAL_MILES)
+            next_fuel = self._minutes(
+                (fuel_stops + 1) * self.FUEL_INTERVAL_MILES / self.AVG_SPEED_MPH)
+            while next_fuel <= driven:
+                fuel_stops += 1
+                next_fuel = self._minutes(
+                    (fuel_stops + 1) * self.FUEL_INTERVAL_MILES / self.AVG_SPEED_MPH)
+            due = [m + driven for m in table.left(hos_clocks)]
+            soonest = min(due)
+        
+        # Add pickup activity, unless the history already has it
+        if not any(segment.activity == 'Pickup' for segment in segments):
+            on_duty('Pickup', pickup_dropoff, pickup_transition)
+        
+        while driven < total_driving:
+            # Driving allowed before a clock or the cycle runs out
+            limit = soonest - driven
+            cycle_limit = ledger.available()
+            if cycle_limit <= 0:
+                cycle_break()
+                continue
+            if limit <= 0:
+                actions = table.on_limit[split][due.index(soonest)]
+                action = actions[-1]
+                for candidate in actions[:-1]:
+                    _, source, keep, refill, _ = candidate
+                    if min((due[i] - driven) * k + r for i, k, r in zip(source, keep, refill)
+                           ) >= total_driving - driven:
+                        action = candidate
+                        break
+                take(action)
                 continue
             
-            # Calculate segment distance
-            segment_distance = min(
-                max_driving_today * self.AVG_SPEED_MPH,
-                remaining_distance
-            )
-            segment_time = segment_distance / self.AVG_SPEED_MPH
+            minutes = min(limit, cycle_limit, total_driving - driven, next_fuel - driven)
+            driven += minutes
+            if driven == total_driving:
+                distance = total_distance - miles_driven
+            else:
+                distance = driven * self.AVG_SPEED_MPH / 60 - miles_driven
             
-            # Skip if segment is too small (less than 0.1 hours = 6 minutes)
-            if segment_time < 0.1:
-                # Just finish the remaining distance
-                if remaining_distance > 0:
-                    remaining_distance = 0
-                break
+            add('driving', 'Driving', minutes, distance)
+            miles_driven += distance
             
-            # Check if we need a fuel stop in this segment
-            if fuel_stops_remaining > 0 and segment_distance >= self.FUEL_INTERVAL_MILES * 0.8:
-                # Split segment for fuel stop
-                fuel_distance = self.FUEL_INTERVAL_MILES
-                fuel_time = fuel_distance / self.AVG_SPEED_MPH
-                
-                # Driving to fuel stop
-                segments.append({
-                    'type': 'driving',
-                    'activity': 'Driving',
-                    'start_time': current_time.isoformat(),
-                    'duration': fuel_time,
-                    'distance': fuel_distance
-                })
-                current_time = self._safe_add_time(current_time, fuel_time)
-                current_day_driving += fuel_time
-                current_day_on_duty += fuel_time
-                
-                # Fuel stop
-                segments.append({
-                    'type': 'on_duty',
-                    'activity': 'Fuel Stop',
-                    'start_time': current_time.isoformat(),
-                    'duration': self.FUEL_STOP_DURATION,
-                    'distance': 0
-                })
-                current_time = self._safe_add_time(current_time, self.FUEL_STOP_DURATION)
-                current_day_on_duty += self.FUEL_STOP_DURATION
-                
-                remaining_distance -= fuel_distance
-                remaining_driving_time -= fuel_time
-                fuel_stops_remaining -= 1
-            else:
-                # Regular driving segment
-                segments.append({
-                    'type': 'driving',
-                    'activity': 'Driving',
-                    'start_time': current_time.isoformat(),
-                    'duration': segment_time,
-                    'distance': segment_distance
-                })
-                current_time = self._safe_add_time(current_time, segment_time)
-                current_day_driving += segment_time
-                current_day_on_duty += segment_time
-                
-                remaining_distance -= segment_distance
-                remaining_driving_time -= segment_time
-        
-        # Check if we hit iteration limit
-        if iteration_count >= max_iterations:
-            print(f"WARNING: Hit max iterations. Remaining distance: {remaining_distance:.1f} miles")
-        
-        # Add dropoff activity
-        segments.append({
-            'type': 'on_duty',
-            'activity': 'Dropoff',
-            'start_time': current_time.isoformat(),
-            'duration': self.PICKUP_DROPOFF_DURATION,
-            'distance': 0
-        })
-        
-        return segments
+            if driven == next_fuel and driven < total_driving:
+                on_duty('Fuel Stop', fuel_stop, fuel_transition)
+                fuel_stops += 1
+                next_fuel = self._minutes(
+                    (fuel_stops + 1) * self.FUEL_INTERVAL_MILES / self.AVG_SPEED_MPH)
+        
+        # Add dropoff activity, unless the history ends with it
+        miles_driven = total_distance
+        if not (segments and segments[-1].activity == 'Dropoff'):
+            on_duty('Dropoff', pickup_dropoff, pickup_transition)
+        
+        return segments, ledger
     
-    def _calculate_total_duration(self, segments: List[Dict]) -> float:
-        """Calculate total trip duration including all segments"""
-        return sum(s['duration'] for s in segments)
+    def _calculate_total_duration(self, segments: List[Segment]) -> float:
+        """Calculate total trip duration in hours including all segments"""
+        return sum(s.duration for s in segments) / 60
     
-    def _generate_daily_logs(self, segments: List[Dict], start_time: datetime) -> List[Dict]:
+    def _generate_daily_logs(self, segments: List[Segment], start_time: datetime,
+                             first_day: int = 0) -> List[Dict]:
         """
         Generate daily ELD logs from trip segments
         Each log represents a 24-hour period
+        
+        Segments that run past midnight are split, so every log covers
+        exactly its own day. Each log has its 'date', its 'day_start'
+        (midnight, in minutes from start_time), its segments as 'timeline'
+        and the 70-hour/8-day 'recap' as of the end of the day, with the
+        days until all of the cycle's hours have rolled off. Totals are
+        added up in whole minutes and reported in hours; time outside the
+        trip counts as off duty.
+        
+        Logs before first_day are not returned; their segments only update
+        the cycle ledger.
         """
+        try:
+            start_time + timedelta(minutes=segments[-1].end)
+        except OverflowError:
+            raise ValueError("Trip is too long to schedule")
+        
+        ledger = self._new_ledger()
+        first_midnight = -_minutes_after_midnight(start_time)
         daily_logs = []
-        current_log = None
-        current_date = start_time.date()
-        max_days = 30  # Limit to 30 days max
         
+        def new_log(day: int) -> Dict:
+            return {
+                'date': start_time.date() + timedelta(days=day),
+                'day_start': first_midnight + MINUTES_PER_DAY * day,
+                'total_miles': 0,
+                'driving_hours': 0,
+                'on_duty_hours': 0,
+                'off_duty_hours': 0,
+                'sleeper_hours': 0,
+                'timeline': []
+            }
+        
+        def close_log(log: Dict):
+            if log['day_start'] < first_midnight + MINUTES_PER_DAY * first_day:
+                return
+            log['off_duty_hours'] = MINUTES_PER_DAY - log['on_duty_hours'] - log['sleeper_hours']
+            for key in ('driving_hours', 'on_duty_hours', 'off_duty_hours', 'sleeper_hours'):
+                log[key] /= 60
+            log['recap'] = {
+                'cycle_hours': ledger.max_minutes / 60,
+                'cycle_days': ledger.cycle_days,
+                'on_duty_today': ledger.on_duty_today() / 60,
+                'on_duty_recent': ledger.used(ledger.cycle_days - 1) / 60,
+                'available_tomorrow': ledger.available_tomorrow() / 60,
+                'on_duty_cycle': ledger.used() / 60,
+                'days_until_reset': ledger.days_until_reset()
+            }
+            daily_logs.append(log)
+        
+        day = 0
+        current_log = new_log(day)
         for segment in segments:
-            try:
-                # Parse ISO format, handle timezone if present
-                segment_start_str = segment['start_time']
-                if 'T' in segment_start_str:
-                    segment_start = datetime.fromisoformat(segment_start_str.replace('Z', '+00:00'))
-                else:
-                    segment_start = datetime.fromisoformat(segment_start_str)
-                segment_date = segment_start.date()
-            except (ValueError, AttributeError) as e:
-                # If parsing fails, use current date
-                segment_date = current_date
-                segment_start = datetime.combine(current_date, datetime.min.time())
-            
-            # Create new log if date changed or first segment
-            if current_log is None or segment_date != current_date:
-                if current_log:
-                    daily_logs.append(current_log)
+            position = segment.start
+            while position < segment.end:
+                day_end = current_log['day_start'] + MINUTES_PER_DAY
+                if position >= day_end:
+                    close_log(current_log)
+                    ledger.advance_day()
+                    day += 1
+                    current_log = new_log(day)
+                    continue
                 
-                # Stop if we've reached max days
-                if len(daily_logs) >= max_days:
-                    break
-                
-                current_date = segment_date
-                # Validate date is in valid range
-                try:
-                    if current_date.year < MINYEAR or current_date.year > MAXYEAR:
-                        current_date = start_time.date()
-                    date_str = current_date.isoformat()
-                except (ValueError, AttributeError, OverflowError):
-                    current_date = start_time.date()
-                    date_str = current_date.isoformat()
+                # The part of the segment that falls on this day
+                piece_end = min(segment.end, day_end)
+                if position == segment.start and piece_end == segment.end:
+                    piece = segment
+                else:
+                    share = (piece_end - position) / segment.duration
+                    done = (position - segment.start) / segment.duration
+                    piece = Segment(segment.type, segment.activity, position, piece_end - position,
+                                    segment.distance * share,
+                                    segment.mile_marker + segment.distance * done)
                 
-                current_log = {
-                    'date': date_str,
-                    'total_miles': 0,
-                    'driving_hours': 0,
-                    'on_duty_hours': 0,
-                    'off_duty_hours': 0,
-                    'sleeper_hours': 0,
-                    'timeline': []
-                }
-            
-            # Add segment to timeline
-            timeline_entry = {
-                'start_time': segment['start_time'],
-                'duration': segment['duration'],
-                'status': self._map_segment_to_status(segment['type']),
-                'activity': segment['activity'],
-                'distance': segment.get('distance', 0)
-            }
-            current_log['timeline'].append(timeline_entry)
-            
-            # Update totals
-            current_log['total_miles'] += segment.get('distance', 0)
+                current_log['timeline'].append(piece)
+                current_log['total_miles'] += piece.distance
+                if piece.type == 'driving':
+                    current_log['driving_hours'] += piece.duration
+                    current_log['on_duty_hours'] += piece.duration
+                    ledger.add(piece.duration)
+                elif piece.type == 'on_duty':
+                    current_log['on_duty_hours'] += piece.duration
+                    ledger.add(piece.duration)
+                elif piece.type == 'sleeper':
+                    current_log['sleeper_hours'] += piece.duration
+                position = piece_end
             
-            if segment['type'] == 'driving':
-                current_log['driving_hours'] += segment['duration']
-                current_log['on_duty_hours'] += segment['duration']
-            elif segment['type'] == 'on_duty':
-                current_log['on_duty_hours'] += segment['duration']
-            elif segment['type'] == 'rest':
-                current_log['off_duty_hours'] += segment['duration']
-        
-        # Add final log
-        if current_log:
-            # Fill remaining hours as off duty
-            total_hours = (current_log['driving_hours'] + 
-                          current_log['on_duty_hours'] + 
-                          current_log['off_duty_hours'])
-            if total_hours < 24:
-                current_log['off_duty_hours'] += (24 - total_hours)
-            
-            daily_logs.append(current_log)
+            if segment.activity == RESTART_ACTIVITY:
+                ledger.restart()
         
+        close_log(current_log)
         return daily_logs
-    
-    def _map_segment_to_status(self, segment_type: str) -> int:
-        """
-        Map segment type to ELD status code
-        1: Off Duty, 2: Sleeper Berth, 3: Driving, 4: On Duty Not Driving
-        """
-        mapping = {
-            'rest': 1,  # Off Duty
-            'driving': 3,  # Driving
-            'on_duty': 4  # On Duty Not Driving
-        }
-        return mapping.get(segment_type, 1)
@@ -0,0 +1,189 @@
+"""
+Geocode Cache
+Persistent on-disk cache for geocoding results, shared by all worker processes
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / 'geocode_cache.sqlite3'
+
+
+class GeocodeCache:
+    """SQLite-backed geocode cache with TTL, LRU eviction and negative caching"""
+    
+    DEFAULT_TTL_SECONDS = 30 * 24 * 3600  # Successful lookups are kept for 30 days
+    DEFAULT_NEGATIVE_TTL_SECONDS = 6 * 3600  # Failed lookups are retried after 6 hours
+    DEFAULT_MAX_ENTRIES = 50000
+    
+    def __init__(self, path: str = None, ttl_seconds: int = None,
+                 negative_ttl_seconds: int = None, max_entries: int = None):
+        """
+        Initialize geocode cache
+        
+        Args:
+            path: SQLite database file (defaults to GEOCODE_CACHE_PATH env var)
+            ttl_seconds: Lifetime of successful lookups
+            negative_ttl_seconds: Lifetime of failed lookups
+            max_entries: Maximum number of cached addresses before LRU eviction
+        """
+        self.path = str(path or os.getenv('GEOCODE_CACHE_PATH', DEFAULT_CACHE_PATH))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.getenv('GEOCODE_CACHE_TTL', self.DEFAULT_TTL_SECONDS))
+        self.negative_ttl_seconds = negative_ttl_seconds if negative_ttl_seconds is not None else int(
+            os.getenv('GEOCODE_CACHE_NEGATIVE_TTL', self.DEFAULT_NEGATIVE_TTL_SECONDS))
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv('GEOCODE_CACHE_MAX_ENTRIES', self.DEFAULT_MAX_ENTRIES))
+        self._local = threading.local()
+        self._schema_ready = False
+    
+    @staticmethod
+    def normalize_address(address: str) -> str:
+        """
+        Build the cache key for an address
+        
+        Case, surrounding whitespace, repeated spaces and spacing around
+        commas do not change the geocoding result, so they are folded away.
+        """
+        key = address.strip().lower()
+        key = re.sub(r'\s+', ' ', key)
+        key = re.sub(r'\s*,\s*', ', ', key)
+        return key.strip(' ,.')
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Return a connection owned by the current thread and process"""
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not be shared across a fork (gunicorn workers)
+        if conn is not None and getattr(self._local, 'pid', None) == os.getpid():
+            return conn
+        
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if not self._schema_ready:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS geocode_cache ('
+                'key TEXT PRIMARY KEY, '
+                'lat REAL, '
+                'lon REAL, '
+                'expires_at REAL NOT NULL, '
+                'accessed_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS geocode_cache_accessed '
+                'ON geocode_cache (accessed_at)'
+            )
+            self._schema_ready = True
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+    
+    def lookup(self, address: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """
+        Look up an address
+        
+        Args:
+            address: Address string
+        
+        Returns:
+            Tuple of (found, coordinates). Coordinates are None for a cached
+            failure, so (True, None) means the address is known not to geocode.
+        """
+        key = self.normalize_address(address)
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT lat, lon, expires_at FROM geocode_cache WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is None:
+                return False, None
+            lat, lon, expires_at = row
+            if expires_at <= now:
+                conn.execute('DELETE FROM geocode_cache WHERE key = ?', (key,))
+                return False, None
+            conn.execute(
+                'UPDATE geocode_cache SET accessed_at = ? WHERE key = ?',
+                (now, key)
+            )
+        except sqlite3.Error as e:
+            # The cache is an optimization; never fail a lookup because of it
+            print(f"Geocode cache read failed: {str(e)}")
+            return False, None
+        
+        if lat is None or lon is None:
+            return True, None
+        return True, (lat, lon)
+    
+    def store(self, address: str, coordinates: Optional[Tuple[float, float]]):
+        """
+        Store a geocoding result
+        
+        Args:
+            address: Address string
+            coordinates: (latitude, longitude), or None to cache a failure
+        """
+        key = self.normalize_address(address)
+        now = time.time()
+        if coordinates is None:
+            lat = lon = None
+            expires_at = now + self.negative_ttl_seconds
+        else:
+            lat, lon = coordinates
+            expires_at = now + self.ttl_seconds
+        
+        try:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO geocode_cache (key, lat, lon, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, lat, lon, expires_at, now)
+            )
+            self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"Geocode cache write failed: {str(e)}")
+    
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones above the size bound"""
+        conn.execute('DELETE FROM geocode_cache WHERE expires_at <= ?', (now,))
+        count = conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                'DELETE FROM geocode_cache WHERE key IN ('
+                'SELECT key FROM geocode_cache ORDER BY accessed_at ASC LIMIT ?)',
+                (overflow,)
+            )
+    
+    def clear(self):
+        """Remove every cached entry"""
+        try:
+            self._connection().execute('DELETE FROM geocode_cache')
+        except sqlite3.Error as e:
+            print(f"Geocode cache clear failed: {str(e)}")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_geocode_cache() -> Optional[GeocodeCache]:
+    """
+    Return the process-wide geocode cache
+    
+    Returns None when caching is disabled with GEOCODE_CACHE_ENABLED=False.
+    """
+    global _default_cache
+    if os.getenv('GEOCODE_CACHE_ENABLED', 'True') != 'True':
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = GeocodeCache()
+    return _default_cache
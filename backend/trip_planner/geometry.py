@@ -0,0 +1,343 @@
+"""
+Route Geometry Helpers
+Conversions between the geometry formats returned by the routing providers
+"""
+import math
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_MILE = 1609.344
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[List[float]]:
+    """
+    Decode a Google encoded polyline (the ORS default geometry format)
+    
+    Args:
+        encoded: Encoded polyline string
+        precision: Number of decimal places encoded (5 for ORS)
+    
+    Returns:
+        List of [lon, lat] pairs, matching GeoJSON coordinate order
+    """
+    factor = 10 ** precision
+    coordinates = []
+    index = 0
+    lat = 0
+    lon = 0
+    length = len(encoded)
+    
+    while index < length:
+        values = []
+        for _ in range(2):
+            shift = 0
+            result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += values[0]
+        lon += values[1]
+        coordinates.append([lon / factor, lat / factor])
+    
+    return coordinates
+
+
+def encode_polyline(coordinates: List[List[float]], precision: int = 5) -> str:
+    """
+    Encode [lon, lat] pairs as a Google encoded polyline
+    
+    Args:
+        coordinates: List of [lon, lat] pairs
+        precision: Number of decimal places to keep
+    
+    Returns:
+        Encoded polyline string
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = 0
+    prev_lon = 0
+    
+    for lon, lat in coordinates:
+        lat_i = int(round(lat * factor))
+        lon_i = int(round(lon * factor))
+        for delta in (lat_i - prev_lat, lon_i - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat = lat_i
+        prev_lon = lon_i
+    
+    return ''.join(chunks)
+
+
+def geometry_coordinates(geometry: Union[str, Dict]) -> List[List[float]]:
+    """
+    Return the [lon, lat] vertices of a provider geometry
+    
+    Args:
+        geometry: GeoJSON LineString (OSRM) or encoded polyline (ORS)
+    
+    Returns:
+        List of [lon, lat] pairs
+    """
+    if not geometry:
+        return []
+    if isinstance(geometry, dict):
+        return geometry.get('coordinates', [])
+    return decode_polyline(geometry)
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters between two points given in degrees"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_m_array(lat1: np.ndarray, lon1: np.ndarray,
+                      lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Vectorized haversine_m over arrays of points given in degrees"""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lon2 - lon1)
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+class RouteGeometryIndex:
+    """
+    Cumulative-distance index over the vertices of a route polyline
+    
+    Built once per route; afterwards any distance along the route is turned
+    into a position with a binary search and a linear interpolation.
+    """
+    
+    def __init__(self, coordinates: List[List[float]]):
+        """
+        Initialize geometry index
+        
+        Args:
+            coordinates: Route vertices as [lon, lat] pairs
+        """
+        points = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.lons = points[:, 0]
+        self.lats = points[:, 1]
+        
+        # Cumulative miles at every vertex, starting at 0
+        self.cumulative_miles = np.zeros(len(points))
+        if len(points) > 1:
+            steps = haversine_m_array(self.lats[:-1], self.lons[:-1], self.lats[1:], self.lons[1:])
+            np.cumsum(steps / METERS_PER_MILE, out=self.cumulative_miles[1:])
+    
+    @classmethod
+    def from_geometries(cls, geometries: Sequence[Union[str, Dict]]) -> 'RouteGeometryIndex':
+        """
+        Build one index over consecutive route legs
+        
+        Args:
+            geometries: Provider geometries (GeoJSON or encoded polyline), in
+                driving order
+        """
+        coordinates = []
+        for geometry in geometries:
+            leg = geometry_coordinates(geometry)
+            if coordinates and leg and coordinates[-1] == leg[0]:
+                # Legs share their joining vertex
+                leg = leg[1:]
+            coordinates.extend(leg)
+        return cls(coordinates)
+    
+    @property
+    def length_miles(self) -> float:
+        """Length of the polyline in miles"""
+        return float(self.cumulative_miles[-1]) if len(self.cumulative_miles) else 0.0
+    
+    def locate_many(self, miles: Sequence[float], route_miles: float = None) -> np.ndarray:
+        """
+        Positions at many distances along the route
+        
+        Args:
+            miles: Distances from the start of the route
+            route_miles: Route length reported by the provider; distances are
+                scaled by the ratio to the polyline length, since a simplified
+                polyline is shorter than the road it follows
+        
+        Returns:
+            Array of (lat, lon) rows, one per distance; distances beyond
+            the ends of the route are clamped to the end points
+        """
+        if not len(self.lats):
+            raise ValueError("Route geometry is empty")
+        
+        miles = np.asarray(miles, dtype=float)
+        if route_miles:
+            miles = miles * (self.length_miles / route_miles)
+        miles = np.clip(miles, 0.0, self.length_miles)
+        
+        upper = np.searchsorted(self.cumulative_miles, miles, side='right')
+        upper = np.clip(upper, 1, max(len(self.lats) - 1, 1))
+        lower = upper - 1
+        if len(self.lats) == 1:
+            upper = lower
+        
+        span = self.cumulative_miles[upper] - self.cumulative_miles[lower]
+        fraction = np.divide(miles - self.cumulative_miles[lower], span,
+                             out=np.zeros_like(miles), where=span > 0)
+        lats = self.lats[lower] + (self.lats[upper] - self.lats[lower]) * fraction
+        lons = self.lons[lower] + (self.lons[upper] - self.lons[lower]) * fraction
+        return np.column_stack((lats, lons))
+    
+    def locate(self, mile: float, route_miles: float = None) -> Tuple[float, float]:
+        """
+        Position at one distance along the route
+        
+        Returns:
+            Tuple of (latitude, longitude)
+        """
+        lat, lon = self.locate_many([mile], route_miles)[0]
+        return float(lat), float(lon)
+
+    def project(self, latitude: float, longitude: float, route_miles: float = None) -> float:
+        """
+        Distance along the route of the route point nearest to a position
+        
+        Every polyline segment is checked at once in a local equirectangular
+        projection, which is accurate at the scale of one segment.
+        
+        Args:
+            latitude, longitude: Position, e.g. a truck's GPS fix
+            route_miles: Route length reported by the provider (see locate_many)
+        
+        Returns:
+            Miles from the start of the route
+        """
+        if not len(self.lats):
+            raise ValueError("Route geometry is empty")
+        if len(self.lats) == 1:
+            return 0.0
+        
+        scale = np.cos(np.radians(latitude))
+        x0, y0 = self.lons[:-1] * scale, self.lats[:-1]
+        dx, dy = self.lons[1:] * scale - x0, self.lats[1:] - y0
+        px, py = longitude * scale, latitude
+        
+        length_sq = dx * dx + dy * dy
+        t = np.divide((px - x0) * dx + (py - y0) * dy, length_sq,
+                      out=np.zeros_like(dx), where=length_sq > 0)
+        t = np.clip(t, 0.0, 1.0)
+        nearest = int(np.argmin((x0 + t * dx - px) ** 2 + (y0 + t * dy - py) ** 2))
+        
+        miles = self.cumulative_miles[nearest] + t[nearest] * (
+            self.cumulative_miles[nearest + 1] - self.cumulative_miles[nearest])
+        if route_miles and self.length_miles:
+            miles *= route_miles / self.length_miles
+        return float(miles)
+
+
+def tolerance_for_zoom(zoom: float, latitude: float) -> float:
+    """
+    Simplification tolerance that is invisible at a web map zoom level
+    
+    Args:
+        zoom: Web Mercator zoom level (0 = whole world in one 256 px tile)
+        latitude: Latitude the route is displayed around
+    
+    Returns:
+        Ground size of one screen pixel in meters
+    """
+    return 2 * math.pi * EARTH_RADIUS_M * math.cos(math.radians(latitude)) / (256 * 2 ** zoom)
+
+
+def simplify_coordinates(coordinates: List[List[float]], tolerance_m: float) -> List[List[float]]:
+    """
+    Douglas-Peucker simplification of a [lon, lat] polyline
+    
+    Distances are measured on a local equirectangular projection, which is
+    accurate to well under a percent over the extent of a single route.
+    
+    Args:
+        coordinates: List of [lon, lat] pairs
+        tolerance_m: Maximum distance in meters a dropped vertex may lie
+            from the simplified line
+    
+    Returns:
+        The kept [lon, lat] pairs; the first and last vertex are always kept
+    """
+    if tolerance_m <= 0 or len(coordinates) < 3:
+        return [list(c) for c in coordinates]
+    
+    points = np.asarray(coordinates, dtype=float)
+    lat0 = math.radians(float(points[:, 1].mean()))
+    x = np.radians(points[:, 0]) * math.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(points[:, 1]) * EARTH_RADIUS_M
+    
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        length_sq = dx * dx + dy * dy
+        if length_sq > 0:
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        else:
+            distances = np.hypot(px, py)
+        
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    
+    return points[keep].tolist()
+
+
+def format_geometry(geometry: Union[str, Dict], geometry_format: str = 'auto',
+                    tolerance_m: float = 0) -> Union[str, Dict]:
+    """
+    Simplify a provider geometry and convert it to the requested format
+    
+    Args:
+        geometry: GeoJSON LineString (OSRM) or encoded polyline (ORS)
+        geometry_format: 'geojson', 'polyline' (Google encoded polyline,
+            precision 5) or 'auto' to keep the provider's format
+        tolerance_m: Douglas-Peucker tolerance in meters (0 keeps every vertex)
+    
+    Returns:
+        New geometry; the input is never modified
+    """
+    if geometry_format not in ('auto', 'geojson', 'polyline'):
+        raise ValueError(f"Unknown geometry format: {geometry_format}")
+    if not geometry:
+        return geometry
+    if geometry_format == 'auto':
+        geometry_format = 'geojson' if isinstance(geometry, dict) else 'polyline'
+    
+    coordinates = simplify_coordinates(geometry_coordinates(geometry), tolerance_m)
+    if geometry_format == 'polyline':
+        return encode_polyline(coordinates)
+    return {'type': 'LineString', 'coordinates': coordinates}
@@ -0,0 +1,379 @@
+"""
+HOS Rules
+Hours of Service rule sets, compiled into the tables the trip planners run
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+REST_ACTIVITY = 'Off Duty - Rest Break'
+OFF_DUTY_ACTIVITY = 'Off Duty'
+BREAK_ACTIVITY = 'Off Duty - 30-Minute Break'
+RESTART_ACTIVITY = '34-Hour Restart'
+SLEEPER_ACTIVITY = 'Sleeper Berth'
+SPLIT_ACTIVITY = 'Off Duty - Split Rest'
+
+# Shortest periods of a sleeper berth split: one in the sleeper berth, the
+# other off duty or in the sleeper berth
+SPLIT_SLEEPER_HOURS = 7
+SPLIT_OTHER_HOURS = 2
+
+# Segment types that are off duty (line 1 and line 2 of the log)
+OFF_DUTY_TYPES = ('rest', 'sleeper')
+
+# Split states: which split period would complete a pair
+SPLIT_NONE = 0
+SPLIT_SLEEPER = 1
+SPLIT_EITHER = 2
+
+
+def _minutes(hours: float) -> int:
+    """Convert hours to whole minutes"""
+    return int(round(hours * 60))
+
+
+class HOSRuleSet:
+    """
+    One set of Hours of Service rules, described by its limits
+    
+    A rule set is only a description; compile() turns it into the
+    RuleTable the planners run.
+    
+    With sleeper_split_hours the rest may be split into two periods: at
+    least SPLIT_SLEEPER_HOURS in the sleeper berth and at least
+    SPLIT_OTHER_HOURS off duty, together min_rest_hours. Once the second
+    period of a pair ends, the driving and window limits are counted from
+    the end of the first one, without the second one. The planner takes
+    the off-duty period instead of the break after
+    break_after_driving_hours of driving, and the sleeper berth period
+    when a limit runs out. Splits are optional: a trip is also planned
+    without them, and the earlier arrival is kept.
+    """
+    
+    def __init__(self, name: str, max_driving_hours: float = 11, max_window_hours: float = 14,
+                 min_rest_hours: float = 10, max_cycle_hours: float = 70, cycle_days: int = 8,
+                 restart_hours: float = 34, break_after_driving_hours: float = 8,
+                 break_hours: float = 0.5, sleeper_split_hours: float = None):
+        """
+        Initialize rule set
+        
+        Args:
+            name: Identifier used by the API
+            max_driving_hours: Driving allowed between rests
+            max_window_hours: Hours after coming on duty after which the
+                driver may not drive until the next rest
+            min_rest_hours: Consecutive off-duty hours that reset the two
+                limits above
+            max_cycle_hours: On-duty hours allowed in any cycle_days days
+            cycle_days: Length of the rolling cycle in days
+            restart_hours: Consecutive off-duty hours that reset the cycle
+            break_after_driving_hours: Driving allowed without a break of
+                break_hours (None for no break rule)
+            break_hours: Length of that break; any time not driving counts
+            sleeper_split_hours: Sleeper berth period of a split rest, the
+                off-duty period being the rest of min_rest_hours (None for
+                no splits)
+        """
+        if not 0 < max_driving_hours <= max_window_hours or cycle_days < 2:
+            raise ValueError(f"Inconsistent limits in HOS rule set {name}")
+        if sleeper_split_hours is not None and not (
+                SPLIT_SLEEPER_HOURS <= sleeper_split_hours <= min_rest_hours - SPLIT_OTHER_HOURS):
+            raise ValueError(f"Invalid sleeper berth split in HOS rule set {name}")
+        
+        self.name = name
+        self.max_driving_hours = max_driving_hours
+        self.max_window_hours = max_window_hours
+        self.min_rest_hours = min_rest_hours
+        self.max_cycle_hours = max_cycle_hours
+        self.cycle_days = cycle_days
+        self.restart_hours = restart_hours
+        self.break_after_driving_hours = break_after_driving_hours
+        self.break_hours = break_hours
+        self.sleeper_split_hours = sleeper_split_hours
+        self._table = None
+    
+    def compile(self) -> 'RuleTable':
+        """Return the rule table of this rule set (compiled once)"""
+        if self._table is None:
+            self._table = RuleTable(self)
+        return self._table
+    
+    def __repr__(self) -> str:
+        return f"HOSRuleSet({self.name!r})"
+
+
+class RuleTable:
+    """
+    HOS rules compiled for the planners' hot loop
+    
+    Every limit that a rest resets is a clock: minutes counted since it was
+    last reset. A clock has a limit, the segment types it counts and the
+    break that resets it (a number of consecutive minutes in the segment
+    types the break may be made of). The planners keep each clock as the
+    minutes left before its limit, and a segment's effect on them is a
+    transition, three per-clock tuples (source, keep, refill) applied as
+        
+        left = left[source] * keep + refill
+    
+    Every clock counts driving, which never resets one, so a driving
+    minute takes one minute off each clock. Each clock is also compiled to
+    the action that frees it when it runs out: the break segments to add,
+    their combined transition and the split state after them. The planner
+    loop only takes minimums and looks up tables; it has no branch for any
+    rule, and another clock only makes the tuples longer.
+    
+    A sleeper berth split adds two clocks, driving and window counted from
+    the end of the last split period. When a period completes a pair, the
+    driving and window clocks take their values (source is the only
+    transition that moves minutes between clocks). The split state says
+    which of the planner's two periods would complete a pair: SPLIT_NONE,
+    SPLIT_SLEEPER (an off-duty period waits for its pair) or SPLIT_EITHER
+    (a sleeper berth period does); actions are compiled per split state.
+    
+    The cycle limit is counted per calendar day in a CycleLedger instead;
+    its action is the restart.
+    """
+    
+    def __init__(self, rules: HOSRuleSet, split: bool = True):
+        """
+        Compile rule table
+        
+        Args:
+            rules: Rule set to compile
+            split: Whether to compile the rule set's sleeper berth split
+        """
+        self.rules = rules
+        self.rest = _minutes(rules.min_rest_hours)
+        self.restart = _minutes(rules.restart_hours)
+        self.max_cycle = _minutes(rules.max_cycle_hours)
+        self.cycle_days = rules.cycle_days
+        self.split = split and rules.sleeper_split_hours is not None
+        # Tables a trip is planned with; the earliest arrival is kept
+        self.variants = (RuleTable(rules, split=False), self) if self.split else (self,)
+        self.split_sleeper = _minutes(SPLIT_SLEEPER_HOURS)
+        self.split_other = _minutes(SPLIT_OTHER_HOURS)
+        
+        # (name, limit, counted segment types, minutes of break that reset
+        # it, segment types the break may be made of)
+        clocks = [
+            ('driving', _minutes(rules.max_driving_hours), ('driving',),
+             self.rest, OFF_DUTY_TYPES),
+            ('window', _minutes(rules.max_window_hours), ('driving', 'on_duty') + OFF_DUTY_TYPES,
+             self.rest, OFF_DUTY_TYPES)
+        ]
+        if rules.break_after_driving_hours is not None:
+            clocks.append(('break', _minutes(rules.break_after_driving_hours), ('driving',),
+                           _minutes(rules.break_hours), ('on_duty',) + OFF_DUTY_TYPES))
+        if self.split:
+            # Driving and window since the end of the last split period
+            # (never shorter than the clocks they are copied to)
+            clocks += [(name + '_split', limit, counted, self.split_other, reset_by)
+                       for name, limit, counted, _, reset_by in clocks[:2]]
+        
+        self.names = tuple(clock[0] for clock in clocks)
+        self.limits = tuple(clock[1] for clock in clocks)
+        self._counted = tuple(clock[2] for clock in clocks)
+        self._reset_after = tuple(clock[3] for clock in clocks)
+        self._reset_by = tuple(clock[4] for clock in clocks)
+        self.max_driving = self.limits[0]
+        self.max_window = self.limits[1]
+        self._identity = tuple(range(len(clocks)))
+        self._paired = tuple((index, self.names.index(name + '_split'))
+                             for index, name in enumerate(self.names[:2])) if self.split else ()
+        self._transitions = {}
+        
+        self.daily_rest = self._action((('rest', REST_ACTIVITY, self.rest),))
+        self.daily_rest_minutes = self.rest
+        self.restart_action = self._action((('rest', RESTART_ACTIVITY, self.restart),))
+        
+        # Actions that may be taken when each clock runs out, per split
+        # state: the first one after which the rest of the trip can be
+        # driven without another stop, or else the last one
+        rest_break = (('rest', BREAK_ACTIVITY, _minutes(rules.break_hours)),)
+        if self.split:
+            sleeper = _minutes(rules.sleeper_split_hours)
+            self._split_periods = (sleeper, self.rest - sleeper)
+            sleeper_period = (('sleeper', SLEEPER_ACTIVITY, sleeper),)
+            other_period = (('rest', SPLIT_ACTIVITY, self.rest - sleeper),)
+            # (split state, rest when the driving or window clock runs out,
+            # rest when a break is due); a split starts with the off-duty
+            # period when a break is due
+            rests = (
+                (SPLIT_NONE, self.daily_rest, self._action(other_period)),
+                (SPLIT_SLEEPER,) + (self._action(sleeper_period, SPLIT_SLEEPER),) * 2,
+                (SPLIT_EITHER,) + (self._action(other_period, SPLIT_EITHER),) * 2
+            )
+            self.on_limit = tuple(
+                self._on_limit((rest,), (self._action(rest_break, split), rest_instead))
+                for split, rest, rest_instead in rests)
+        else:
+            self.on_limit = (self._on_limit((self.daily_rest,), (self._action(rest_break),)),)
+    
+    def _on_limit(self, rest: Tuple, rest_break: Tuple) -> Tuple:
+        """Candidate actions per clock: rest_break for the break clock, rest for the others"""
+        return tuple(rest_break if name == 'break' else rest for name in self.names)
+    
+    def transition(self, segment_type: str, minutes: int) -> Tuple[Tuple[int, ...], ...]:
+        """
+        Transition of an on-duty stop that follows driving
+        
+        Returns:
+            Tuple of (source, keep, refill) per-clock tuples
+        """
+        key = (segment_type, minutes)
+        if key not in self._transitions:
+            _, source, keep, refill, _ = self._action(((segment_type, None, minutes),))
+            self._transitions[key] = (source, keep, refill)
+        return self._transitions[key]
+    
+    def advance(self, clocks: List[int], runs: List[int], segment_type: str,
+                minutes: int) -> Tuple[List[int], List[int]]:
+        """
+        Clocks after any segment, for replaying segments that already happened
+        
+        Unlike the compiled transitions this follows breaks made of several
+        segments (e.g. a 30-minute break directly followed by a rest).
+        
+        Args:
+            clocks: Minutes on each clock
+            runs: Minutes of the break in progress, per clock
+            segment_type: Type of the segment
+            minutes: Length of the segment
+        
+        Returns:
+            Tuple of (clocks, runs) after the segment
+        """
+        new_clocks = []
+        new_runs = []
+        for clock, run, counted, after, reset_by in zip(
+                clocks, runs, self._counted, self._reset_after, self._reset_by):
+            run = run + minutes if segment_type in reset_by else 0
+            if run >= after:
+                clock = 0
+            elif segment_type in counted:
+                clock += minutes
+            new_clocks.append(clock)
+            new_runs.append(run)
+        return new_clocks, new_runs
+    
+    def replay(self, segments: Iterable[Tuple[str, int]]) -> Tuple[List[int], int]:
+        """
+        Clocks and split state after segments that already happened
+        
+        Unlike the compiled transitions this takes any segments, e.g. an
+        off-duty period of any length that pairs with a sleeper berth period.
+        
+        Args:
+            segments: (segment type, minutes) of each segment, in order
+        
+        Returns:
+            Tuple of (minutes on each clock, split state)
+        """
+        clocks = self.zero()
+        runs = self.zero()
+        waiting = None  # Split period waiting for its pair
+        for segment_type, minutes in segments:
+            before = clocks
+            clocks, runs = self.advance(clocks, runs, segment_type, minutes)
+            if segment_type in OFF_DUTY_TYPES and minutes >= self.rest:
+                waiting = None
+            period = self._period(segment_type, minutes)
+            if period is not None:
+                if self._pairs(waiting, period):
+                    for clock, since_split in self._paired:
+                        clocks[clock] = before[since_split]
+                waiting = period
+        return clocks, self._split_state(waiting)
+    
+    def _period(self, segment_type: str, minutes: int) -> Optional[Tuple[int, bool]]:
+        """(minutes, in the sleeper berth) of a segment that is a split period, else None"""
+        if not self.split or segment_type not in OFF_DUTY_TYPES or not (
+                self.split_other <= minutes < self.rest):
+            return None
+        return minutes, segment_type == 'sleeper' and minutes >= self.split_sleeper
+    
+    def _pairs(self, first: Optional[Tuple[int, bool]], second: Tuple[int, bool]) -> bool:
+        """Whether two split periods make a pair"""
+        return first is not None and (first[1] or second[1]) and first[0] + second[0] >= self.rest
+    
+    def _split_state(self, waiting: Optional[Tuple[int, bool]]) -> int:
+        """Split state with the given period waiting for its pair"""
+        if waiting is None:
+            return SPLIT_NONE
+        sleeper, other = self._split_periods
+        if self._pairs(waiting, (other, False)):
+            return SPLIT_EITHER
+        if self._pairs(waiting, (sleeper, True)):
+            return SPLIT_SLEEPER
+        return SPLIT_NONE
+    
+    def zero(self) -> List[int]:
+        """Clocks (or break runs) after a full rest"""
+        return [0] * len(self.names)
+    
+    def left(self, clocks: List[int]) -> List[int]:
+        """Minutes left before each limit"""
+        return [limit - clock for limit, clock in zip(self.limits, clocks)]
+    
+    def _action(self, segments: Tuple, split: int = SPLIT_NONE) -> Tuple:
+        """
+        Compile a break
+        
+        Args:
+            segments: (segment type, activity, minutes) of each segment; a
+                split period must be the only one
+            split: Split state before the break
+        
+        Returns:
+            Tuple of (segments, source, keep, refill, split state after)
+            with the transition of all the segments together
+        """
+        clocks = self.zero()
+        keep = [1] * len(self.names)
+        runs = self.zero()
+        for segment_type, _, minutes in segments:
+            clocks, runs = self.advance(clocks, runs, segment_type, minutes)
+            # A clock is kept unless one of the segments reset it
+            keep = [k if run < after else 0
+                    for k, run, after in zip(keep, runs, self._reset_after)]
+            if segment_type in OFF_DUTY_TYPES and minutes >= self.rest:
+                split = SPLIT_NONE
+        # clock * keep + clock_after  ->  left * keep + refill
+        refill = [limit * (1 - k) - clock
+                  for limit, k, clock in zip(self.limits, keep, clocks)]
+        source = list(self._identity)
+        
+        period = self._period(segments[0][0], segments[0][2])
+        if period is not None:
+            sleeper, other = self._split_periods
+            waiting = {SPLIT_SLEEPER: (other, False), SPLIT_EITHER: (sleeper, True)}.get(split)
+            if self._pairs(waiting, period):
+                # The period does not count: the clocks are counted from
+                # the end of the first period of the pair
+                for clock, since_split in self._paired:
+                    source[clock], keep[clock], refill[clock] = since_split, 1, 0
+            split = self._split_state(period)
+        return segments, tuple(source), tuple(keep), tuple(refill), split
+
+
+PROPERTY_70_8 = HOSRuleSet('property_70_8')
+PROPERTY_60_7 = HOSRuleSet('property_60_7', max_cycle_hours=60, cycle_days=7)
+PROPERTY_70_8_SLEEPER = HOSRuleSet('property_70_8_sleeper', sleeper_split_hours=8)
+
+RULE_SETS: Dict[str, HOSRuleSet] = {
+    rules.name: rules for rules in (PROPERTY_70_8, PROPERTY_60_7, PROPERTY_70_8_SLEEPER)
+}
+DEFAULT_RULE_SET = PROPERTY_70_8
+
+
+def get_rule_set(name: str = None) -> HOSRuleSet:
+    """
+    Look up a rule set by name
+    
+    Args:
+        name: Key of RULE_SETS (defaults to DEFAULT_RULE_SET)
+    """
+    if name is None:
+        return DEFAULT_RULE_SET
+    if name not in RULE_SETS:
+        raise ValueError(f"Unknown HOS rule set: {name} (expected one of {', '.join(RULE_SETS)})")
+    return RULE_SETS[name]
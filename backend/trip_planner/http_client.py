@@ -0,0 +1,215 @@
+"""
+HTTP Client
+Process-wide pooled sessions with retry and backoff for routing providers
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HTTPClient:
+    """Keep-alive HTTP sessions, one connection pool per provider host"""
+    
+    RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+    
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_MAX_RETRIES = 2
+    DEFAULT_BACKOFF_BASE = 0.5  # Seconds before the first retry
+    DEFAULT_BACKOFF_MAX = 8.0  # Upper bound for any single wait, including Retry-After
+    DEFAULT_CONNECT_TIMEOUT = 3.05
+    
+    def __init__(self, pool_size: int = None, max_retries: int = None,
+                 backoff_base: float = None, backoff_max: float = None,
+                 connect_timeout: float = None):
+        """
+        Initialize HTTP client
+        
+        Args:
+            pool_size: Keep-alive connections kept per provider host
+            max_retries: Retries after the first attempt for 429/5xx and connection errors
+                (including connect timeouts)
+            backoff_base: Initial backoff in seconds, doubled on each retry
+            backoff_max: Maximum wait between attempts in seconds
+            connect_timeout: TCP/TLS connect timeout in seconds
+        """
+        self.pool_size = pool_size if pool_size is not None else int(
+            os.getenv('HTTP_POOL_SIZE', self.DEFAULT_POOL_SIZE))
+        self.max_retries = max_retries if max_retries is not None else int(
+            os.getenv('HTTP_MAX_RETRIES', self.DEFAULT_MAX_RETRIES))
+        self.backoff_base = backoff_base if backoff_base is not None else float(
+            os.getenv('HTTP_BACKOFF_BASE', self.DEFAULT_BACKOFF_BASE))
+        self.backoff_max = backoff_max if backoff_max is not None else float(
+            os.getenv('HTTP_BACKOFF_MAX', self.DEFAULT_BACKOFF_MAX))
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(
+            os.getenv('HTTP_CONNECT_TIMEOUT', self.DEFAULT_CONNECT_TIMEOUT))
+        
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+    
+    def session_for(self, url: str) -> requests.Session:
+        """
+        Return the pooled session for the host of a URL
+        
+        Args:
+            url: Request URL
+        
+        Returns:
+            requests.Session whose adapter keeps up to pool_size connections alive
+        """
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sockets inherited through a fork must not be reused
+                self._sessions = {}
+                self._pid = os.getpid()
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    max_retries=0
+                )
+                session.mount(host, adapter)
+                self._sessions[host] = session
+        return session
+    
+    def request(self, method: str, url: str, read_timeout: float = 30,
+                connect_timeout: float = None, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying transient failures with jittered exponential backoff
+        
+        Connection errors, 429 and 5xx responses are retried up to max_retries
+        times. A Retry-After header on the response takes precedence over the
+        computed backoff. Read timeouts are not retried: the caller has
+        already waited read_timeout and is usually out of time itself.
+        
+        Args:
+            method: HTTP method
+            url: Request URL
+            read_timeout: Seconds to wait for the response once connected
+            connect_timeout: Seconds to wait for the connection (defaults to client setting)
+            **kwargs: Passed through to requests (params, json, headers, ...)
+        
+        Returns:
+            The final response. Its status is not checked, callers still call
+            raise_for_status().
+        """
+        session = self.session_for(url)
+        timeout = (connect_timeout or self.connect_timeout, read_timeout)
+        attempt = 0
+        
+        while True:
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except requests.ConnectionError:
+                # Includes connect timeouts, but not read timeouts
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                response.close()
+            
+            time.sleep(delay)
+            attempt += 1
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request (see request)"""
+        return self.request('GET', url, **kwargs)
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request (see request)"""
+        return self.request('POST', url, **kwargs)
+    
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Parse a Retry-After header (seconds or HTTP date), capped at backoff_max"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                retry_at = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            delay = retry_at.timestamp() - time.time()
+        return min(max(delay, 0.0), self.backoff_max)
+
+
+class RateLimiter:
+    """Thread-safe token bucket that spaces out requests to a provider"""
+    
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        """
+        Initialize rate limiter
+        
+        Args:
+            rate_per_second: Sustained request rate
+            burst: Requests that may be sent back to back after an idle period
+        """
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait_seconds)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """Return the process-wide HTTP client"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = HTTPClient()
+    return _default_client
+
+
+_rate_limiters: Dict[Tuple[str, float], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, rate_per_second: float) -> RateLimiter:
+    """Return the process-wide rate limiter for a provider at a given rate"""
+    key = (name, rate_per_second)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(rate_per_second)
+            _rate_limiters[key] = limiter
+    return limiter
@@ -0,0 +1,119 @@
+"""
+Provider Latency Tracking
+Rolling latency histograms used to decide when to hedge a provider request
+"""
+import bisect
+import math
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+MIN_LATENCY = 0.01
+BUCKETS_PER_DOUBLING = 4
+NUM_BUCKETS = 56  # 0.01 * 2 ** (56 / 4) ~= 164 seconds
+
+# Upper bound (seconds) of every histogram bucket
+BUCKET_BOUNDS = [MIN_LATENCY * 2 ** ((i + 1) / BUCKETS_PER_DOUBLING) for i in range(NUM_BUCKETS)]
+
+
+class LatencyHistogram:
+    """
+    Rolling histogram over the most recent samples of one provider
+    
+    Latencies are bucketed on a logarithmic scale from 10 ms to about two
+    minutes, so adding a sample and reading a percentile are both cheap and
+    independent of the window size.
+    """
+    
+    DEFAULT_WINDOW_SIZE = 500
+    
+    def __init__(self, name: str, window_size: int = None):
+        """
+        Initialize latency histogram
+        
+        Args:
+            name: Provider name
+            window_size: Number of most recent samples kept
+        """
+        self.name = name
+        self.window_size = window_size or self.DEFAULT_WINDOW_SIZE
+        self._counts = [0] * NUM_BUCKETS
+        self._samples = deque()
+        self._lock = threading.Lock()
+    
+    def _bucket(self, latency: float) -> int:
+        """Index of the bucket a latency falls into"""
+        index = bisect.bisect_left(BUCKET_BOUNDS, latency)
+        return min(index, NUM_BUCKETS - 1)
+    
+    def record(self, latency: float):
+        """Add a latency sample in seconds, dropping the oldest beyond the window"""
+        bucket = self._bucket(latency)
+        with self._lock:
+            self._samples.append(bucket)
+            self._counts[bucket] += 1
+            if len(self._samples) > self.window_size:
+                self._counts[self._samples.popleft()] -= 1
+    
+    def count(self) -> int:
+        """Number of samples in the window"""
+        with self._lock:
+            return len(self._samples)
+    
+    def percentile(self, q: float, default: Optional[float] = None,
+                   min_samples: int = 20) -> Optional[float]:
+        """
+        Return the latency below which a share q of the recent samples fall
+        
+        Args:
+            q: Percentile as a fraction (0.95 for p95)
+            default: Returned when fewer than min_samples have been recorded
+            min_samples: Samples needed before the histogram is trusted
+        
+        Returns:
+            Upper bound of the bucket holding the percentile, in seconds
+        """
+        with self._lock:
+            total = len(self._samples)
+            if total < max(min_samples, 1):
+                return default
+            rank = max(math.ceil(q * total), 1)
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return BUCKET_BOUNDS[index]
+        return BUCKET_BOUNDS[-1]
+    
+    def snapshot(self) -> Dict:
+        """Return percentile summary for monitoring"""
+        return {
+            'samples': self.count(),
+            'p50_seconds': self.percentile(0.5, min_samples=1),
+            'p90_seconds': self.percentile(0.9, min_samples=1),
+            'p99_seconds': self.percentile(0.99, min_samples=1)
+        }
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def get_latency_histogram(name: str) -> LatencyHistogram:
+    """Return the process-wide latency histogram for a provider"""
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.get(name)
+            if histogram is None:
+                histogram = LatencyHistogram(name)
+                _histograms[name] = histogram
+    return histogram
+
+
+def latency_snapshots() -> Dict[str, Dict]:
+    """Return the snapshot of every provider histogram created so far"""
+    with _histograms_lock:
+        histograms = list(_histograms.values())
+    return {histogram.name: histogram.snapshot() for histogram in histograms}
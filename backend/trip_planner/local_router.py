@@ -0,0 +1,504 @@
+"""
+Local Routing Engine
+Offline shortest-path routing on a road graph built from an OpenStreetMap extract
+"""
+import bz2
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from .circuit_breaker import NoResultError
+from .geometry import haversine_m
+
+
+# Default truck speeds (km/h) by OSM highway class, used when a way has no maxspeed
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 90,
+    'motorway_link': 50,
+    'trunk': 80,
+    'trunk_link': 45,
+    'primary': 65,
+    'primary_link': 40,
+    'secondary': 55,
+    'secondary_link': 35,
+    'tertiary': 45,
+    'tertiary_link': 30,
+    'unclassified': 40,
+    'residential': 30,
+    'living_street': 10,
+    'service': 15,
+    'road': 40,
+}
+
+MAX_TRUCK_SPEED_KMH = 90
+
+GRAPH_FORMAT_VERSION = 1
+
+
+def _open_osm(path: str):
+    """Open a plain, gzip or bzip2 compressed OSM XML file"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _parse_maxspeed(value: str) -> Optional[float]:
+    """Parse an OSM maxspeed tag into km/h ("65 mph", "100", ...)"""
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*(mph)?', value or '')
+    if not match:
+        return None
+    speed = float(match.group(1))
+    if match.group(2):
+        speed *= 1.609344
+    return speed
+
+
+class LocalRoadGraph:
+    """
+    Directed road graph in compressed sparse row (CSR) form
+    
+    Node i has outgoing edges offsets[i] .. offsets[i + 1] - 1. Every edge
+    stores its target node, length (meters), travel time (seconds) and the
+    index of its street name in names. All columns are typed arrays, so a
+    graph costs a few dozen bytes per edge.
+    """
+    
+    # Spatial grid cell size (degrees) for nearest-node lookups
+    GRID_CELL_DEGREES = 0.01
+    
+    def __init__(self, node_lat: array, node_lon: array, offsets: array, targets: array,
+                 lengths: array, durations: array, name_ids: array, names: List[str]):
+        self.node_lat = node_lat
+        self.node_lon = node_lon
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.durations = durations
+        self.name_ids = name_ids
+        self.names = names
+        self.max_speed_mps = max(
+            (lengths[e] / durations[e] for e in range(len(durations)) if durations[e] > 0),
+            default=MAX_TRUCK_SPEED_KMH / 3.6
+        )
+        self._grid = self._build_grid()
+    
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_lat)
+    
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+    
+    @classmethod
+    def from_osm(cls, path: str) -> 'LocalRoadGraph':
+        """
+        Build a graph from an OSM XML extract (.osm, .osm.gz or .osm.bz2)
+        
+        Only drivable highway ways are kept. Oneway tags (including implied
+        oneway on motorways and roundabouts) are honoured.
+        """
+        coords: Dict[int, Tuple[float, float]] = {}
+        raw_edges = []
+        names = ['']
+        name_index = {'': 0}
+        
+        with _open_osm(path) as f:
+            way_nodes = []
+            way_tags = {}
+            for event, elem in ET.iterparse(f, events=('end',)):
+                if elem.tag == 'node':
+                    coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+                    way_tags = {}
+                    elem.clear()
+                elif elem.tag == 'nd':
+                    way_nodes.append(int(elem.get('ref')))
+                elif elem.tag == 'tag':
+                    way_tags[elem.get('k')] = elem.get('v')
+                elif elem.tag == 'way':
+                    cls._add_way(way_nodes, way_tags, coords, raw_edges, names, name_index)
+                    way_nodes = []
+                    way_tags = {}
+                    elem.clear()
+                elif elem.tag == 'relation':
+                    way_nodes = []
+                    way_tags = {}
+                    elem.clear()
+        
+        return cls._from_edges(coords, raw_edges, names)
+    
+    @staticmethod
+    def _add_way(way_nodes: List[int], tags: Dict[str, str], coords: Dict[int, Tuple[float, float]],
+                 raw_edges: List, names: List[str], name_index: Dict[str, int]):
+        """Append the directed edges of one OSM way"""
+        highway = tags.get('highway')
+        if highway not in HIGHWAY_SPEEDS_KMH or tags.get('access') == 'no':
+            return
+        
+        speed_kmh = _parse_maxspeed(tags.get('maxspeed')) or HIGHWAY_SPEEDS_KMH[highway]
+        speed_mps = min(speed_kmh, MAX_TRUCK_SPEED_KMH) / 3.6
+        
+        oneway = tags.get('oneway')
+        implied_oneway = highway in ('motorway', 'motorway_link') or tags.get('junction') == 'roundabout'
+        forward = oneway != '-1'
+        backward = oneway == '-1' or (oneway not in ('yes', '1', 'true') and not implied_oneway)
+        
+        name = tags.get('name') or tags.get('ref') or ''
+        if name not in name_index:
+            name_index[name] = len(names)
+            names.append(name)
+        name_id = name_index[name]
+        
+        for a, b in zip(way_nodes, way_nodes[1:]):
+            if a not in coords or b not in coords:
+                continue
+            length = haversine_m(coords[a][0], coords[a][1], coords[b][0], coords[b][1])
+            duration = length / speed_mps
+            if forward:
+                raw_edges.append((a, b, length, duration, name_id))
+            if backward:
+                raw_edges.append((b, a, length, duration, name_id))
+    
+    @classmethod
+    def _from_edges(cls, coords: Dict[int, Tuple[float, float]], raw_edges: List,
+                    names: List[str]) -> 'LocalRoadGraph':
+        """Compact OSM node ids and sort edges into CSR arrays"""
+        node_ids = {}
+        node_lat = array('d')
+        node_lon = array('d')
+        for a, b, _, _, _ in raw_edges:
+            for osm_id in (a, b):
+                if osm_id not in node_ids:
+                    node_ids[osm_id] = len(node_lat)
+                    node_lat.append(coords[osm_id][0])
+                    node_lon.append(coords[osm_id][1])
+        
+        edges = sorted((node_ids[a], node_ids[b], length, duration, name_id)
+                       for a, b, length, duration, name_id in raw_edges)
+        
+        offsets = array('q', [0] * (len(node_lat) + 1))
+        targets = array('q')
+        lengths = array('f')
+        durations = array('f')
+        name_ids = array('i')
+        for u, v, length, duration, name_id in edges:
+            offsets[u + 1] += 1
+            targets.append(v)
+            lengths.append(length)
+            durations.append(duration)
+            name_ids.append(name_id)
+        for i in range(len(node_lat)):
+            offsets[i + 1] += offsets[i]
+        
+        return cls(node_lat, node_lon, offsets, targets, lengths, durations, name_ids, names)
+    
+    def save(self, path: str):
+        """
+        Write the graph in the compact binary format read by load()
+        
+        The file is one JSON header line followed by the raw array columns.
+        """
+        columns = ['node_lat', 'node_lon', 'offsets', 'targets', 'lengths', 'durations', 'name_ids']
+        header = {
+            'version': GRAPH_FORMAT_VERSION,
+            'names': self.names,
+            'columns': [[name, getattr(self, name).typecode, len(getattr(self, name))] for name in columns]
+        }
+        with open(path, 'wb') as f:
+            f.write(json.dumps(header).encode() + b'\n')
+            for name in columns:
+                getattr(self, name).tofile(f)
+    
+    @classmethod
+    def load(cls, path: str) -> 'LocalRoadGraph':
+        """Load a graph written by save()"""
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != GRAPH_FORMAT_VERSION:
+                raise ValueError(f"Unsupported road graph format: {header.get('version')}")
+            columns = {}
+            for name, typecode, length in header['columns']:
+                column = array(typecode)
+                column.fromfile(f, length)
+                columns[name] = column
+        return cls(names=header['names'], **columns)
+    
+    def _build_grid(self) -> Dict[Tuple[int, int], List[int]]:
+        """Bucket nodes into a lat/lon grid for nearest-node lookups"""
+        grid = {}
+        cell = self.GRID_CELL_DEGREES
+        for i in range(self.num_nodes):
+            key = (int(math.floor(self.node_lat[i] / cell)), int(math.floor(self.node_lon[i] / cell)))
+            grid.setdefault(key, []).append(i)
+        return grid
+    
+    def nearest_node(self, lat: float, lon: float, max_distance_m: float = 5000) -> int:
+        """
+        Return the graph node closest to a point
+        
+        Raises:
+            NoResultError: If no node lies within max_distance_m
+        """
+        cell = self.GRID_CELL_DEGREES
+        row = int(math.floor(lat / cell))
+        col = int(math.floor(lon / cell))
+        best = None
+        best_distance = max_distance_m
+        # A grid ring is narrowest east-west, cell * 111 km * cos(lat); enough
+        # rings to cover the radius that way cover it north-south too
+        ring_width = cell * 111000 * max(math.cos(math.radians(lat)), 0.01)
+        max_rings = int(max_distance_m / ring_width) + 1
+        
+        for ring in range(max_rings + 1):
+            for r in range(row - ring, row + ring + 1):
+                for c in range(col - ring, col + ring + 1):
+                    if max(abs(r - row), abs(c - col)) != ring:
+                        continue
+                    for node in self._grid.get((r, c), ()):
+                        distance = haversine_m(lat, lon, self.node_lat[node], self.node_lon[node])
+                        if distance < best_distance:
+                            best = node
+                            best_distance = distance
+            if best is not None and best_distance <= ring * ring_width:
+                # Nothing in an outer ring can beat a node this close
+                break
+        
+        if best is None:
+            raise NoResultError(f"No road within {max_distance_m:.0f} m of ({lat}, {lon})")
+        return best
+    
+    def shortest_path(self, source: int, target: int) -> List[int]:
+        """
+        Fastest path between two nodes using A* with a travel-time heuristic
+        
+        Returns:
+            Edge indices along the path (empty when source == target)
+        
+        Raises:
+            NoResultError: If target is unreachable from source
+        """
+        if source == target:
+            return []
+        
+        node_lat = self.node_lat
+        node_lon = self.node_lon
+        offsets = self.offsets
+        targets = self.targets
+        durations = self.durations
+        target_lat = node_lat[target]
+        target_lon = node_lon[target]
+        max_speed = self.max_speed_mps
+        
+        best = {source: 0.0}
+        parent = {}
+        settled = set()
+        heap = [(0.0, 0.0, source)]
+        
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if node in settled:
+                continue
+            settled.add(node)
+            
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = targets[edge]
+                new_cost = cost + durations[edge]
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    parent[neighbor] = (node, edge)
+                    heuristic = haversine_m(node_lat[neighbor], node_lon[neighbor],
+                                            target_lat, target_lon) / max_speed
+                    heapq.heappush(heap, (new_cost + heuristic, new_cost, neighbor))
+        else:
+            raise NoResultError("No route found in local road graph")
+        
+        path = []
+        node = target
+        while node != source:
+            node, edge = parent[node]
+            path.append(edge)
+        path.reverse()
+        return path
+
+    def one_to_many(self, source: int, targets: List[int]) -> Dict[int, Tuple[float, float]]:
+        """
+        Fastest travel time and its distance from one node to many nodes
+        
+        Runs a single Dijkstra search that stops once every target is settled.
+        
+        Returns:
+            Mapping of reachable target node to (duration_seconds, distance_meters)
+        """
+        offsets = self.offsets
+        edge_targets = self.targets
+        durations = self.durations
+        lengths = self.lengths
+        
+        remaining = set(targets)
+        found = {}
+        best = {source: 0.0}
+        settled = set()
+        heap = [(0.0, 0.0, source)]
+        
+        while heap and remaining:
+            cost, distance, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node in remaining:
+                remaining.discard(node)
+                found[node] = (cost, distance)
+            
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = edge_targets[edge]
+                new_cost = cost + durations[edge]
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    heapq.heappush(heap, (new_cost, distance + lengths[edge], neighbor))
+        
+        return found
+
+
+class LocalRoutingEngine:
+    """Answers route requests from a LocalRoadGraph in the OSRM result shape"""
+    
+    def __init__(self, graph: LocalRoadGraph):
+        self.graph = graph
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'LocalRoutingEngine':
+        """Load a graph from a compact graph file or an OSM XML extract"""
+        if re.search(r'\.osm(\.gz|\.bz2)?$', path):
+            return cls(LocalRoadGraph.from_osm(path))
+        return cls(LocalRoadGraph.load(path))
+    
+    def route(self, coordinates: List[List[float]]) -> Dict:
+        """
+        Calculate a route through [lon, lat] coordinates
+        
+        Returns:
+            Dictionary with distance_miles, duration_hours, GeoJSON geometry
+            and instructions, plus 'legs' when there are via points
+        """
+        graph = self.graph
+        nodes = [graph.nearest_node(lat, lon) for lon, lat in coordinates]
+        
+        legs = []
+        for source, target in zip(nodes, nodes[1:]):
+            path = graph.shortest_path(source, target)
+            legs.append(self._build_leg(source, path))
+        
+        geometry = []
+        instructions = []
+        for leg in legs:
+            leg_coordinates = leg['geometry']['coordinates']
+            geometry.extend(leg_coordinates[1:] if geometry else leg_coordinates)
+            instructions.extend(leg['instructions'])
+        
+        result = {
+            'distance_miles': sum(leg['distance_miles'] for leg in legs),
+            'duration_hours': sum(leg['duration_hours'] for leg in legs),
+            'geometry': {'type': 'LineString', 'coordinates': geometry},
+            'instructions': instructions
+        }
+        if len(coordinates) > 2:
+            result['legs'] = legs
+        return result
+    
+    def matrix(self, origins: List[List[float]], destinations: List[List[float]]) -> Tuple[List, List]:
+        """
+        Distance/duration table between [lon, lat] origins and destinations
+        
+        Returns:
+            Tuple of (distances_miles, durations_hours) row-major matrices,
+            with None for unreachable pairs
+        """
+        graph = self.graph
+        origin_nodes = [graph.nearest_node(lat, lon) for lon, lat in origins]
+        destination_nodes = [graph.nearest_node(lat, lon) for lon, lat in destinations]
+        
+        distances = []
+        durations = []
+        for source in origin_nodes:
+            reached = graph.one_to_many(source, destination_nodes)
+            distances.append([reached[t][1] * 0.000621371 if t in reached else None
+                              for t in destination_nodes])
+            durations.append([reached[t][0] / 3600 if t in reached else None
+                              for t in destination_nodes])
+        return distances, durations
+    
+    def _build_leg(self, source: int, path: List[int]) -> Dict:
+        """Turn an edge path into a route leg with one instruction per street"""
+        graph = self.graph
+        coordinates = [[graph.node_lon[source], graph.node_lat[source]]]
+        instructions = []
+        distance = 0.0
+        duration = 0.0
+        
+        for edge in path:
+            node = graph.targets[edge]
+            coordinates.append([graph.node_lon[node], graph.node_lat[node]])
+            distance += graph.lengths[edge]
+            duration += graph.durations[edge]
+            
+            name = graph.names[graph.name_ids[edge]]
+            if not instructions or instructions[-1]['name'] != name:
+                maneuver = 'Depart' if not instructions else 'Continue'
+                instructions.append({
+                    'name': name,
+                    'instruction': f"{maneuver} onto {name}" if name else maneuver,
+                    'distance_miles': 0.0,
+                    'duration_hours': 0.0
+                })
+            instructions[-1]['distance_miles'] += graph.lengths[edge] * 0.000621371
+            instructions[-1]['duration_hours'] += graph.durations[edge] / 3600
+        
+        for instruction in instructions:
+            del instruction['name']
+        instructions.append({'instruction': 'Arrive', 'distance_miles': 0.0, 'duration_hours': 0.0})
+        
+        return {
+            'distance_miles': distance * 0.000621371,  # meters to miles
+            'duration_hours': duration / 3600,  # seconds to hours
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'instructions': instructions
+        }
+
+
+_engine = None
+_engine_failed = False
+_engine_lock = threading.Lock()
+
+
+def get_local_engine() -> Optional[LocalRoutingEngine]:
+    """
+    Return the process-wide local routing engine
+    
+    The graph named by LOCAL_GRAPH_PATH is loaded on first use. Returns None
+    when no graph is configured or it failed to load; a failed load is
+    logged once and not retried.
+    """
+    global _engine, _engine_failed
+    path = os.getenv('LOCAL_GRAPH_PATH', '')
+    if not path:
+        return None
+    if _engine is None and not _engine_failed:
+        with _engine_lock:
+            if _engine is None and not _engine_failed:
+                try:
+                    _engine = LocalRoutingEngine.from_file(path)
+                except Exception as e:
+                    _engine_failed = True
+                    print(f"Local routing graph {path} failed to load: {str(e)}")
+    return _engine
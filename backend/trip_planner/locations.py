@@ -0,0 +1,105 @@
+"""
+Location Input Parsing
+Recognizes coordinate inputs so they can skip network geocoding
+"""
+import re
+from typing import Dict, Optional, Tuple, Union
+
+
+Location = Union[str, Dict, list, tuple]
+
+_NUMBER = r'[+-]?(?:\d+(?:\.\d*)?|\.\d+)'
+
+# "34.0522,-118.2437" / "34.0522, -118.2437"
+_PLAIN_PAIR = re.compile(rf'^\s*\(?\s*({_NUMBER})\s*,\s*({_NUMBER})\s*\)?\s*$')
+
+# "34.0522 N, 118.2437 W" / "34.0522°N 118.2437°W" / "N34.0522 W118.2437"
+_HEMISPHERE_PAIR = re.compile(
+    rf'^\s*(?:([NS])\s*({_NUMBER})|({_NUMBER})\s*°?\s*([NS]))'
+    rf'\s*[,;\s]\s*'
+    rf'(?:([EW])\s*({_NUMBER})|({_NUMBER})\s*°?\s*([EW]))\s*$',
+    re.IGNORECASE
+)
+
+_LAT_KEYS = ('lat', 'latitude')
+_LON_KEYS = ('lon', 'lng', 'long', 'longitude')
+
+
+def _valid(lat: float, lon: float) -> Optional[Tuple[float, float]]:
+    """Return (lat, lon) if both are within world bounds"""
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def _parse_string(value: str) -> Optional[Tuple[float, float]]:
+    match = _PLAIN_PAIR.match(value)
+    if match:
+        return _valid(float(match.group(1)), float(match.group(2)))
+    
+    match = _HEMISPHERE_PAIR.match(value)
+    if match:
+        lat_hemisphere = (match.group(1) or match.group(4)).upper()
+        lat = float(match.group(2) or match.group(3))
+        lon_hemisphere = (match.group(5) or match.group(8)).upper()
+        lon = float(match.group(6) or match.group(7))
+        if lat < 0 or lon < 0:
+            # A sign and a hemisphere letter together are ambiguous
+            return None
+        if lat_hemisphere == 'S':
+            lat = -lat
+        if lon_hemisphere == 'W':
+            lon = -lon
+        return _valid(lat, lon)
+    
+    return None
+
+
+def parse_coordinates(location: Location) -> Optional[Tuple[float, float]]:
+    """
+    Recognize a location given as coordinates
+    
+    Supported forms:
+        "34.0522,-118.2437"           plain "lat,lon" decimal degrees
+        "34.0522 N, 118.2437 W"       decimal degrees with hemisphere letters
+        {"lat": 34.05, "lon": -118.24}  object (lat/latitude, lon/lng/longitude)
+        [34.0522, -118.2437]          two-element list or tuple (lat, lon)
+    
+    Args:
+        location: Location as sent by the client
+    
+    Returns:
+        (latitude, longitude), or None if the location is not a coordinate
+        input (it should then be geocoded as an address)
+    """
+    try:
+        if isinstance(location, str):
+            return _parse_string(location)
+        
+        if isinstance(location, dict):
+            lat = next((location[k] for k in _LAT_KEYS if k in location), None)
+            lon = next((location[k] for k in _LON_KEYS if k in location), None)
+            if lat is None or lon is None:
+                return None
+            return _valid(float(lat), float(lon))
+        
+        if isinstance(location, (list, tuple)) and len(location) == 2:
+            return _valid(float(location[0]), float(location[1]))
+    except (TypeError, ValueError):
+        return None
+    
+    return None
+
+
+def location_label(location: Location) -> str:
+    """
+    Return a display string for a location
+    
+    Addresses are returned as given, coordinate inputs as "lat, lon".
+    """
+    if isinstance(location, str):
+        return location.strip()
+    coords = parse_coordinates(location)
+    if coords is not None:
+        return f"{coords[0]:.5f}, {coords[1]:.5f}"
+    return str(location)
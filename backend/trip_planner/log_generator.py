@@ -3,11 +3,14 @@ ELD Log Sheet Generator - Matches Official FMCSA Format
 Generates visual ELD log sheets matching the standard paper log format
 """
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import io
+import math
 import base64
+import threading
 from PIL import Image, ImageDraw, ImageFont
 import os
+from .segments import Segment
 
 
 class ELDLogGenerator:
@@ -17,6 +20,10 @@ class ELDLogGenerator:
     WIDTH = 1400
     HEIGHT = 1000
     
+    # Size of the returned image (sheets are drawn at WIDTH x HEIGHT and scaled down)
+    OUTPUT_WIDTH = 1200
+    OUTPUT_HEIGHT = 850
+    
     # Grid dimensions for 24-hour timeline
     GRID_START_X = 60
     GRID_START_Y = 350
@@ -31,6 +38,26 @@ class ELDLogGenerator:
         4: {'name': '4. On Duty', 'y_offset': 150}
     }
     
+    # Areas (left, top, right, bottom) holding the fields that change from
+    # sheet to sheet; everything outside them comes from the template, so
+    # text fields are cut to the width of their box (see _draw_field)
+    DYNAMIC_AREAS = (
+        (200, 30, 400, 56),      # Date
+        (70, 80, 791, 111),      # From / To
+        (20, 140, 345, 172),     # Miles
+        (700, 150, 1100, 172),   # Carrier
+        (20, 205, 345, 228),     # Truck and trailer numbers
+        (700, 195, 1100, 258),   # Main office and home terminal
+        (GRID_START_X - 2, GRID_START_Y - 2,
+         GRID_START_X + GRID_WIDTH + 3, GRID_START_Y + GRID_HEIGHT + 3),  # Timeline
+        (20, 895, 460, 940)      # Recap values and total on duty
+    )
+    
+    # Shared by all generators in the process
+    _fonts = None
+    _templates = {}
+    _templates_lock = threading.Lock()
+    
     def __init__(self):
         """Initialize log generator"""
         pass
@@ -39,8 +66,12 @@ class ELDLogGenerator:
         """
         Generate a single ELD log sheet matching official format
         
+        The static part of the sheet is rendered once per process (see
+        _get_template); each sheet is a copy of it with only the day's
+        fields and timeline drawn on top.
+        
         Args:
-            log_data: Daily log data with timeline
+            log_data: Daily log from ELDService (date, day_start and timeline segments)
             trip_details: Dictionary with driver_name, from_location, to_location, etc.
             
         Returns:
@@ -48,60 +79,107 @@ class ELDLogGenerator:
         """
         if trip_details is None:
             trip_details = {'driver_name': 'Driver'}
-        # Create blank image
-        img = Image.new('RGB', (self.WIDTH, self.HEIGHT), 'white')
+        title_font, header_font, label_font, small_font = self._load_fonts()
+        
+        recap = log_data.get('recap')
+        cycle_hours = recap.get('cycle_hours', 70) if recap else 70
+        cycle_days = recap['cycle_days'] if recap else 8
+        template, scaled_template = self._get_template(cycle_hours, cycle_days)
+        
+        # Draw the day's fields on a full size copy of the template
+        img = template.copy()
         draw = ImageDraw.Draw(img)
+        self._draw_header_fields(draw, log_data, trip_details, header_font, label_font)
+        self._draw_info_fields(draw, log_data, trip_details, label_font)
+        self._draw_timeline(draw, log_data['timeline'], log_data['day_start'])
+        self._draw_recap_values(draw, log_data, label_font, small_font)
         
-        # Try to use fonts
-        try:
-            title_font = ImageFont.truetype("arialbd.ttf", 20)
-            header_font = ImageFont.truetype("arial.ttf", 14)
-            label_font = ImageFont.truetype("arial.ttf", 11)
-            small_font = ImageFont.truetype("arial.ttf", 9)
-        except:
-            title_font = ImageFont.load_default()
-            header_font = ImageFont.load_default()
-            label_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-        
-        # Draw all sections
-        self._draw_header(draw, log_data, trip_details, title_font, header_font, label_font, small_font)
-        self._draw_info_boxes(draw, log_data, trip_details, label_font, small_font)
-        self._draw_grid(draw, label_font, small_font)
-        self._draw_timeline(draw, log_data['timeline'])
-        self._draw_remarks(draw, label_font)
-        self._draw_shipping_docs(draw, label_font, small_font)
-        self._draw_certification(draw, log_data, trip_details, label_font, small_font)
+        # Scale down only the areas those fields are in
+        sheet = scaled_template.copy()
+        for box, source in self._scaled_areas():
+            sheet.paste(img.resize((box[2] - box[0], box[3] - box[1]), Image.Resampling.LANCZOS,
+                                   box=source), box[:2])
         
         # Convert to base64
         buffer = io.BytesIO()
-        img = img.resize((1200, 850), Image.Resampling.LANCZOS)  # Scale down slightly
-        img.save(buffer, format='PNG')
+        sheet.save(buffer, format='PNG', compress_level=3)  # Faster than the default 6, no larger
         buffer.seek(0)
         img_base64 = base64.b64encode(buffer.getvalue()).decode()
         
         return img_base64
     
-    def _draw_header(self, draw, log_data: Dict, trip_details: Dict, 
-                     title_font, header_font, label_font, small_font):
+    @classmethod
+    def _load_fonts(cls) -> Tuple:
+        """Load the title, header, label and small fonts (once per process)"""
+        if cls._fonts is None:
+            try:
+                fonts = (ImageFont.truetype("arialbd.ttf", 20), ImageFont.truetype("arial.ttf", 14),
+                         ImageFont.truetype("arial.ttf", 11), ImageFont.truetype("arial.ttf", 9))
+            except:
+                fonts = (ImageFont.load_default(),) * 4
+            cls._fonts = fonts
+        return cls._fonts
+    
+    def _get_template(self, cycle_hours: float, cycle_days: int) -> Tuple[Image.Image, Image.Image]:
+        """
+        Static layer of the log sheet, rendered once per process and cycle
+        
+        Everything but the day's fields is the same on every sheet, except
+        the recap labels, which name the cycle of the HOS rule set.
+        
+        Args:
+            cycle_hours: On-duty hours allowed in the cycle
+            cycle_days: Length of the cycle in days
+        
+        Returns:
+            Tuple of (template at drawing size, template at output size)
+        """
+        key = (cycle_hours, cycle_days)
+        template = self._templates.get(key)
+        if template is None:
+            with self._templates_lock:
+                template = self._templates.get(key)
+                if template is None:
+                    title_font, header_font, label_font, small_font = self._load_fonts()
+                    img = Image.new('RGB', (self.WIDTH, self.HEIGHT), 'white')
+                    draw = ImageDraw.Draw(img)
+                    self._draw_header(draw, title_font, header_font, label_font, small_font)
+                    self._draw_info_boxes(draw, label_font, small_font)
+                    self._draw_grid(draw, label_font, small_font)
+                    self._draw_remarks(draw, label_font)
+                    self._draw_shipping_docs(draw, label_font, small_font)
+                    self._draw_certification(draw, cycle_hours, cycle_days, label_font, small_font)
+                    template = (img, img.resize((self.OUTPUT_WIDTH, self.OUTPUT_HEIGHT),
+                                                Image.Resampling.LANCZOS))
+                    self._templates[key] = template
+        return template
+    
+    def _scaled_areas(self) -> List[Tuple]:
+        """
+        DYNAMIC_AREAS on the output image
+        
+        Each area is widened to whole output pixels, so that scaling down
+        just that area gives the pixels scaling down the full sheet would,
+        up to rounding (the filter still reads the pixels around the area).
+        
+        Returns:
+            List of (output box, source box) tuples
+        """
+        scale_x = self.OUTPUT_WIDTH / self.WIDTH
+        scale_y = self.OUTPUT_HEIGHT / self.HEIGHT
+        areas = []
+        for left, top, right, bottom in self.DYNAMIC_AREAS:
+            box = (math.floor(left * scale_x), math.floor(top * scale_y),
+                   math.ceil(right * scale_x), math.ceil(bottom * scale_y))
+            source = (box[0] / scale_x, box[1] / scale_y, box[2] / scale_x, box[3] / scale_y)
+            areas.append((box, source))
+        return areas
+    
+    def _draw_header(self, draw, title_font, header_font, label_font, small_font):
         """Draw log sheet header - top section"""
-        driver_name = trip_details.get('driver_name', 'Driver')
-        from_location = trip_details.get('from_location', '')
-        to_location = trip_details.get('to_location', '')
         # Title
         draw.text((20, 10), "Drivers Daily Log", fill='black', font=title_font)
         
-        # Date boxes
-        try:
-            log_date = datetime.fromisoformat(log_data['date'])
-            month = log_date.strftime('%m')
-            day = log_date.strftime('%d')
-            year = log_date.strftime('%Y')
-        except:
-            month = datetime.now().strftime('%m')
-            day = datetime.now().strftime('%d')
-            year = datetime.now().strftime('%Y')
-        
         # Date fields
         x_start = 200
         draw.text((x_start, 15), "(month)", fill='black', font=small_font)
@@ -110,17 +188,10 @@ class ELDLogGenerator:
         
         # Date boxes
         draw.rectangle([(x_start, 30), (x_start + 50, 55)], outline='black', width=1)
-        draw.text((x_start + 15, 35), month, fill='black', font=header_font)
-        
         draw.text((x_start + 55, 40), "/", fill='black', font=header_font)
-        
         draw.rectangle([(x_start + 60, 30), (x_start + 110, 55)], outline='black', width=1)
-        draw.text((x_start + 75, 35), day, fill='black', font=header_font)
-        
         draw.text((x_start + 115, 40), "/", fill='black', font=header_font)
-        
         draw.rectangle([(x_start + 125, 30), (x_start + 200, 55)], outline='black', width=1)
-        draw.text((x_start + 145, 35), year, fill='black', font=header_font)
         
         # Right side - Original/Duplicate
         draw.text((900, 10), "Original - File at home terminal", fill='black', font=small_font)
@@ -132,56 +203,90 @@ class ELDLogGenerator:
         # From box
         draw.text((20, 85), "From:", fill='black', font=label_font)
         draw.rectangle([(70, 80), (400, 110)], outline='black', width=1)
-        draw.text((75, 88), from_location[:40], fill='black', font=label_font)
         
         # To box
         draw.text((420, 85), "To:", fill='black', font=label_font)
         draw.rectangle([(460, 80), (790, 110)], outline='black', width=1)
-        draw.text((465, 88), to_location[:40], fill='black', font=label_font)
     
-    def _draw_info_boxes(self, draw, log_data: Dict, trip_details: Dict, label_font, small_font):
-        """Draw information boxes below header"""
-        carrier_name = trip_details.get('carrier_name', '')
-        main_office = trip_details.get('main_office', '')
-        home_terminal = trip_details.get('home_terminal', '')
-        truck_number = trip_details.get('truck_number', '')
-        trailer_number = trip_details.get('trailer_number', '')
+    def _draw_header_fields(self, draw, log_data: Dict, trip_details: Dict, header_font, label_font):
+        """Fill in the date and the From/To boxes of the header"""
+        from_location = trip_details.get('from_location', '')
+        to_location = trip_details.get('to_location', '')
         
+        log_date = log_data.get('date') or datetime.now().date()
+        x_start = 200
+        draw.text((x_start + 15, 35), log_date.strftime('%m'), fill='black', font=header_font)
+        draw.text((x_start + 75, 35), log_date.strftime('%d'), fill='black', font=header_font)
+        draw.text((x_start + 145, 35), log_date.strftime('%Y'), fill='black', font=header_font)
+        
+        self._draw_field(draw, (75, 88), from_location[:40], label_font, 396)
+        self._draw_field(draw, (465, 88), to_location[:40], label_font, 786)
+    
+    @staticmethod
+    def _draw_field(draw, xy: Tuple[int, int], text: str, font, right: int):
+        """
+        Draw a text field, cut so that it ends before x = right
+        
+        Args:
+            draw: ImageDraw to draw with
+            xy: Position of the text
+            text: Field text
+            font: Font to draw the text in
+            right: Right edge of the field's box
+        """
+        while text and draw.textbbox(xy, text, font=font)[2] > right:
+            text = text[:-1]
+        draw.text(xy, text, fill='black', font=font)
+    
+    def _draw_info_boxes(self, draw, label_font, small_font):
+        """Draw information boxes below header"""
         y_start = 120
         
         # Row 1 - Miles boxes
         # Total Miles Driving Today
         draw.rectangle([(20, y_start), (180, y_start + 50)], outline='black', width=2)
         draw.text((25, y_start + 5), "Total Miles Driving Today", fill='black', font=small_font)
-        draw.text((60, y_start + 25), f"{log_data['total_miles']:.0f}", fill='black', font=label_font)
         
         # Total Mileage Today
         draw.rectangle([(185, y_start), (345, y_start + 50)], outline='black', width=2)
         draw.text((190, y_start + 5), "Total Mileage Today", fill='black', font=small_font)
-        draw.text((230, y_start + 25), f"{log_data['total_miles']:.0f}", fill='black', font=label_font)
         
         # Name of Carrier or Carriers
         draw.text((700, y_start + 5), "Name of Carrier or Carriers", fill='black', font=small_font)
         draw.line([(700, y_start + 30), (1100, y_start + 30)], fill='black', width=1)
-        draw.text((705, y_start + 35), carrier_name[:50], fill='black', font=label_font)
         
         # Row 2 - License info
         y_start2 = y_start + 55
         draw.rectangle([(20, y_start2), (345, y_start2 + 50)], outline='black', width=2)
         draw.text((25, y_start2 + 5), "Truck/Tractor and Trailer Numbers or", fill='black', font=small_font)
         draw.text((25, y_start2 + 20), "License Plate(s)/State (show each unit)", fill='black', font=small_font)
-        vehicle_info = f"{truck_number} / {trailer_number}" if truck_number or trailer_number else ""
-        draw.text((25, y_start2 + 35), vehicle_info[:40], fill='black', font=label_font)
         
         # Main Office Address
         draw.text((700, y_start2 + 5), "Main Office Address", fill='black', font=small_font)
         draw.line([(700, y_start2 + 20), (1100, y_start2 + 20)], fill='black', width=1)
-        draw.text((705, y_start2 + 25), main_office[:50], fill='black', font=label_font)
         
         # Home Terminal Address
         draw.text((700, y_start2 + 45), "Home Terminal Address", fill='black', font=small_font)
         draw.line([(700, y_start2 + 60), (1100, y_start2 + 60)], fill='black', width=1)
-        draw.text((705, y_start2 + 65), home_terminal[:50], fill='black', font=label_font)
+    
+    def _draw_info_fields(self, draw, log_data: Dict, trip_details: Dict, label_font):
+        """Fill in the miles, carrier and vehicle information boxes"""
+        carrier_name = trip_details.get('carrier_name', '')
+        main_office = trip_details.get('main_office', '')
+        home_terminal = trip_details.get('home_terminal', '')
+        truck_number = trip_details.get('truck_number', '')
+        trailer_number = trip_details.get('trailer_number', '')
+        
+        y_start = 120
+        draw.text((60, y_start + 25), f"{log_data['total_miles']:.0f}", fill='black', font=label_font)
+        draw.text((230, y_start + 25), f"{log_data['total_miles']:.0f}", fill='black', font=label_font)
+        self._draw_field(draw, (705, y_start + 35), carrier_name[:50], label_font, 1100)
+        
+        y_start2 = y_start + 55
+        vehicle_info = f"{truck_number} / {trailer_number}" if truck_number or trailer_number else ""
+        self._draw_field(draw, (25, y_start2 + 35), vehicle_info[:40], label_font, 341)
+        self._draw_field(draw, (705, y_start2 + 25), main_office[:50], label_font, 1100)
+        self._draw_field(draw, (705, y_start2 + 65), home_terminal[:50], label_font, 1100)
     
     def _draw_grid(self, draw, label_font, small_font):
         """Draw the 24-hour grid with status lines"""
@@ -241,21 +346,22 @@ class ELDLogGenerator:
         draw.text((self.GRID_START_X + self.GRID_WIDTH + 10, self.GRID_START_Y + 92), 
                  "Hours", fill='black', font=small_font)
     
-    def _draw_timeline(self, draw, timeline: List[Dict]):
-        """Draw the activity timeline on the grid"""
+    def _draw_timeline(self, draw, timeline: List[Segment], day_start: float):
+        """
+        Draw the activity timeline on the grid
+        
+        Args:
+            timeline: Segments of the day, timed in minutes from the plan start
+            day_start: Midnight of the log date, in minutes from the plan start
+        """
         hour_width = self.GRID_WIDTH / 24
         
         for entry in timeline:
-            try:
-                start_time = datetime.fromisoformat(entry['start_time'].replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                start_time = datetime.now()
-            
-            duration = entry['duration']
-            status = entry['status']
+            duration = entry.duration / 60
+            status = entry.status
             
             # Calculate start hour (decimal)
-            start_hour = start_time.hour + start_time.minute / 60.0
+            start_hour = (entry.start - day_start) / 60
             
             # Calculate pixel positions
             start_x = self.GRID_START_X + int(start_hour * hour_width)
@@ -303,14 +409,13 @@ class ELDLogGenerator:
         draw.text((25, y_start + 110), "Enter name of place you reported and where relieved from work and where each change of duty occurred.", 
                  fill='black', font=small_font)
     
-    def _draw_certification(self, draw, log_data: Dict, trip_details: Dict, label_font, small_font):
+    def _draw_certification(self, draw, cycle_hours: float, cycle_days: int, label_font, small_font):
         """Draw certification section at bottom"""
-        driver_name = trip_details.get('driver_name', 'Driver')
         y_start = self.GRID_START_Y + self.GRID_HEIGHT + 270
         
         # Recap section
         draw.text((20, y_start), "Recap:", fill='black', font=label_font)
-        draw.text((20, y_start + 15), "Off duty last 8", fill='black', font=small_font)
+        draw.text((20, y_start + 15), f"Off duty last {cycle_days}", fill='black', font=small_font)
         draw.text((20, y_start + 27), "days", fill='black', font=small_font)
         
         # Hours table
@@ -318,8 +423,8 @@ class ELDLogGenerator:
         col_width = 80
         
         # Header
-        draw.text((x_table, y_start), "70 Hour /", fill='black', font=small_font)
-        draw.text((x_table, y_start + 12), "8 Day", fill='black', font=small_font)
+        draw.text((x_table, y_start), f"{cycle_hours:g} Hour /", fill='black', font=small_font)
+        draw.text((x_table, y_start + 12), f"{cycle_days} Day", fill='black', font=small_font)
         
         # Columns
         for i, label in enumerate(['A. Total', 'B. Total', 'C. Total']):
@@ -328,10 +433,10 @@ class ELDLogGenerator:
         
         # Row labels
         rows = [
-            ('On duty', 'hours on', 'hours on'),
-            ('hours', 'duty', 'duty'),
-            ('today', 'yesterday', 'tomorrow'),
-            ('', '(minus A)', '(minus A)')
+            ('On duty', 'hours on', 'hours', 'hours on'),
+            ('hours', 'duty last', 'available', 'duty last'),
+            ('today', f'{cycle_days - 1} days', 'tomorrow', f'{cycle_days} days'),
+            ('', '(incl. today)', f'{cycle_hours:g} hr minus A*', '(incl. today)')
         ]
         
         for row_idx, row_labels in enumerate(rows):
@@ -340,18 +445,17 @@ class ELDLogGenerator:
                 x = x_table + col_idx * col_width
                 draw.text((x, y_row), text, fill='black', font=small_font)
         
-        # Totals with actual data
-        total_on_duty = log_data.get('on_duty_hours', 0) + log_data.get('driving_hours', 0)
-        draw.text((x_table + 20, y_start + 90), "Total", fill='black', font=small_font)
-        draw.text((x_table + 20, y_start + 102), "time", fill='black', font=small_font)
-        draw.text((x_table + 20, y_start + 114), "3 & 4", fill='black', font=small_font)
-        draw.text((x_table + 80, y_start + 102), f"{total_on_duty:.1f}", fill='black', font=small_font)
+        # Totals
+        draw.text((x_table - 100, y_start + 90), "Total", fill='black', font=small_font)
+        draw.text((x_table - 100, y_start + 102), "time", fill='black', font=small_font)
+        draw.text((x_table - 100, y_start + 114), "3 & 4", fill='black', font=small_font)
         
-        # Right side - 60 hour section
+        # Right side - restart note
         x_right = x_table + 350
-        draw.text((x_right, y_start), "*If you took", fill='black', font=small_font)
-        draw.text((x_right, y_start + 12), "consecutive", fill='black', font=small_font)
-        draw.text((x_right, y_start + 24), "hours off", fill='black', font=small_font)
+        draw.text((x_right, y_start), "*If you took 34", fill='black', font=small_font)
+        draw.text((x_right, y_start + 12), "consecutive hours off", fill='black', font=small_font)
+        draw.text((x_right, y_start + 24), f"duty you have {cycle_hours:g}", fill='black', font=small_font)
+        draw.text((x_right, y_start + 36), "hours available", fill='black', font=small_font)
         
         # Signature line
         y_sig = y_start + 100
@@ -361,6 +465,25 @@ class ELDLogGenerator:
         draw.text((700, y_sig + 25), "I certify that my record of duty status for this date is true and correct.", 
                  fill='black', font=small_font)
     
+    def _draw_recap_values(self, draw, log_data: Dict, label_font, small_font):
+        """Fill in the recap values and total on-duty time of the day"""
+        y_start = self.GRID_START_Y + self.GRID_HEIGHT + 270
+        x_table = 120
+        col_width = 80
+        
+        # Recap values as of the end of the day
+        recap = log_data.get('recap')
+        if recap:
+            values = [recap['on_duty_today'], recap['on_duty_recent'],
+                      recap['available_tomorrow'], recap['on_duty_cycle']]
+            for col_idx, value in enumerate(values):
+                x = x_table + col_idx * col_width
+                draw.text((x, y_start + 80), f"{value:.2f}", fill='black', font=label_font)
+        
+        # Totals with actual data (on duty hours include driving)
+        total_on_duty = log_data.get('on_duty_hours', 0)
+        draw.text((x_table - 60, y_start + 102), f"{total_on_duty:.2f}", fill='black', font=small_font)
+    
     def generate_all_logs(self, daily_logs: List[Dict], trip_details: Dict = None) -> List[str]:
         """
         Generate log sheets for all days
@@ -375,13 +498,3 @@ class ELDLogGenerator:
         if trip_details is None:
             trip_details = {'driver_name': 'Driver'}
         return [self.generate_log_sheet(log, trip_details) for log in daily_logs]
-    
-    def _map_segment_to_status(self, segment_type: str) -> int:
-        """Map segment type to status line number"""
-        mapping = {
-            'rest': 1,  # Off Duty
-            'sleeper': 2,  # Sleeper
-            'driving': 3,  # Driving
-            'on_duty': 4  # On Duty
-        }
-        return mapping.get(segment_type, 1)
@@ -0,0 +1,81 @@
+"""
+Compare the batch trip planner with planning trips one at a time, per HOS rule set,
+for speed and for every column of the batch plans
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from trip_planner.batch_planner import BatchTripPlanner
+from trip_planner.eld_service import ELDService
+from trip_planner.hos_rules import RULE_SETS
+
+
+class Command(BaseCommand):
+    help = ('Benchmark BatchTripPlanner against ELDService.calculate_trip_plan on random trips '
+            'under each HOS rule set')
+    
+    # Columns of BatchTripPlanner.plan_trips that calculate_trip_plan returns as is
+    PLAN_COLUMNS = ('estimated_duration_hours', 'total_driving_time', 'total_on_duty_time',
+                    'num_rest_breaks', 'num_restarts', 'num_fuel_stops', 'cycle_hours_available')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=10000, help='Number of random trips')
+        parser.add_argument('--max-miles', type=float, default=3000, help='Longest trip distance')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--rules', nargs='+', choices=list(RULE_SETS), default=list(RULE_SETS),
+                            help='HOS rule sets to compare (default: all)')
+    
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n = options['trips']
+        distances = rng.uniform(1, options['max_miles'], n)
+        cycles = rng.uniform(0, 70, n)
+        base = datetime.now().replace(second=0, microsecond=0)
+        starts = np.datetime64(base, 'us') + rng.integers(0, 7 * 24 * 60, n).astype('timedelta64[m]')
+        
+        for name in options['rules']:
+            rules = RULE_SETS[name]
+            planner = BatchTripPlanner(rules=rules)
+            started = time.perf_counter()
+            plans = planner.plan_trips(distances, cycles, starts)
+            batch_seconds = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            scalar_plans = [
+                ELDService(float(cycle), rules=rules).calculate_trip_plan(
+                    float(distance), start.astype(datetime))
+                for distance, cycle, start in zip(distances, cycles, starts)
+            ]
+            scalar_seconds = time.perf_counter() - started
+            
+            durations = np.array([plan['estimated_duration_hours'] for plan in scalar_plans])
+            scalar = {column: np.array([plan[column] for plan in scalar_plans])
+                      for column in self.PLAN_COLUMNS}
+            scalar['num_days'] = np.array([len(plan['daily_logs']) for plan in scalar_plans])
+            scalar['estimated_arrival'] = starts + np.round(durations * 60).astype('timedelta64[m]')
+            
+            mismatched = {}
+            for column, expected in scalar.items():
+                if np.issubdtype(expected.dtype, np.datetime64):
+                    count = int(np.sum(plans[column] != expected))
+                else:
+                    count = int(np.sum(~np.isclose(plans[column], expected)))
+                if count:
+                    mismatched[column] = count
+            mismatches = sum(mismatched.values())
+            self.stdout.write(f"{name} ({len(rules.compile().limits)} clocks, "
+                              f"mean trip {np.mean(durations):.1f}h)")
+            self.stdout.write(f"  Scalar: {n} trips in {scalar_seconds:.3f}s "
+                              f"({scalar_seconds / n * 1e6:.1f} us/trip)")
+            self.stdout.write(f"  Batch:  {n} trips in {batch_seconds:.3f}s "
+                              f"({batch_seconds / n * 1e6:.1f} us/trip)")
+            style = self.style.SUCCESS if mismatches == 0 else self.style.ERROR
+            self.stdout.write(style(
+                f"  Speedup {scalar_seconds / batch_seconds:.1f}x, {mismatches} mismatched values "
+                f"in {len(scalar)} columns"
+            ))
+            for column, count in mismatched.items():
+                self.stdout.write(self.style.ERROR(f"    {column}: {count} trips"))
@@ -0,0 +1,25 @@
+"""
+Build a compact road graph for the local routing provider from an OSM extract
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from trip_planner.local_router import LocalRoadGraph
+
+
+class Command(BaseCommand):
+    help = 'Convert an OSM XML extract (.osm, .osm.gz, .osm.bz2) into a compact road graph file'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('osm_path', help='OpenStreetMap XML extract')
+        parser.add_argument('graph_path', help='Output graph file (use as LOCAL_GRAPH_PATH)')
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        graph = LocalRoadGraph.from_osm(options['osm_path'])
+        graph.save(options['graph_path'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {graph.num_nodes} nodes and {graph.num_edges} edges to "
+            f"{options['graph_path']} in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,165 @@
+"""
+Plan Cache
+In-memory LRU cache for trip plans
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from .eld_service import ELDService
+
+
+class PlanCache:
+    """
+    Bounded LRU cache of trip plans keyed by normalized planning inputs
+    
+    A plan only depends on the trip distance, the cycle hours (which the
+    planner uses in whole minutes) and the minute of the day the trip
+    starts: segment times are offsets from the start and day boundaries
+    follow from the time of day. The key holds exactly those, so a cached
+    plan is re-based onto another start date by replacing the start time
+    and the log dates, without replanning.
+    """
+    
+    DEFAULT_DISTANCE_PRECISION = 3  # Decimal places of miles kept in the key
+    DEFAULT_MAX_ENTRIES = 1000
+    
+    def __init__(self, distance_precision: int = None, max_entries: int = None):
+        """
+        Initialize plan cache
+        
+        Args:
+            distance_precision: Decimal places distances are rounded to
+            max_entries: Maximum number of cached plans
+        """
+        self.distance_precision = distance_precision if distance_precision is not None else int(
+            os.getenv('PLAN_CACHE_DISTANCE_PRECISION', self.DEFAULT_DISTANCE_PRECISION))
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv('PLAN_CACHE_MAX_ENTRIES', self.DEFAULT_MAX_ENTRIES))
+        
+        # key -> plan as first computed
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def make_key(self, eld_service: ELDService, distance_miles: float,
+                 start_time: datetime) -> Tuple:
+        """
+        Build the cache key for a planning request
+        
+        Returns:
+            Hashable key of the planner class, HOS rule set and speed,
+            rounded distance, cycle
+            hours in minutes (or the per-day history) and start minute of the day
+        """
+        if eld_service.cycle_history is not None:
+            cycle = tuple(eld_service._minutes(h) for h in eld_service.cycle_history)
+        else:
+            cycle = eld_service._minutes(eld_service.current_cycle_used)
+        return (
+            type(eld_service),
+            eld_service.rules,
+            eld_service.AVG_SPEED_MPH,
+            round(distance_miles, self.distance_precision),
+            cycle,
+            start_time.hour * 60 + start_time.minute
+        )
+    
+    def calculate_trip_plan(self, eld_service: ELDService, distance_miles: float,
+                            start_time: datetime = None) -> Dict:
+        """
+        ELDService.calculate_trip_plan through the cache
+        
+        The distance is rounded to the cache precision before planning, so
+        cached and fresh plans are identical. Segments and timelines are
+        shared between plans and must not be modified.
+        
+        Args:
+            eld_service: Service holding the driver's cycle hours
+            distance_miles: Total trip distance in miles
+            start_time: Trip start time (defaults to now)
+        
+        Returns:
+            Trip plan as returned by ELDService.calculate_trip_plan
+        """
+        if start_time is None:
+            start_time = datetime.now()
+        key = self.make_key(eld_service, distance_miles, start_time)
+        
+        with self._lock:
+            plan = self._entries.get(key)
+            if plan is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        
+        if plan is None:
+            plan = eld_service.calculate_trip_plan(key[3], start_time)
+            with self._lock:
+                self._entries[key] = plan
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        
+        return self._rebase(plan, eld_service, start_time)
+    
+    @staticmethod
+    def _rebase(plan: Dict, eld_service: ELDService, start_time: datetime) -> Dict:
+        """Copy of a cached plan for another start time with the same time of day"""
+        days = start_time.date() - plan['start_time'].date()
+        result = dict(plan)
+        result['start_time'] = start_time
+        result['cycle_hours_used'] = eld_service.current_cycle_used
+        result['daily_logs'] = [dict(log, date=log['date'] + days) for log in plan['daily_logs']]
+        return result
+    
+    def clear(self):
+        """Remove every cached plan"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Return cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_plan_cache() -> Optional[PlanCache]:
+    """
+    Return the process-wide plan cache
+    
+    Returns None when caching is disabled with PLAN_CACHE_ENABLED=False.
+    """
+    global _default_cache
+    if os.getenv('PLAN_CACHE_ENABLED', 'True') != 'True':
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = PlanCache()
+    return _default_cache
+
+
+def calculate_trip_plan(eld_service: ELDService, distance_miles: float,
+                        start_time: datetime = None) -> Dict:
+    """Plan a trip through the default plan cache, or directly when it is disabled"""
+    plan_cache = get_default_plan_cache()
+    if plan_cache is None:
+        return eld_service.calculate_trip_plan(distance_miles, start_time)
+    return plan_cache.calculate_trip_plan(eld_service, distance_miles, start_time)
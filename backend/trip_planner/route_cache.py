@@ -0,0 +1,151 @@
+"""
+Route Cache
+In-memory LRU cache for provider route results
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class RouteCache:
+    """Bounded LRU cache of route results keyed by quantized coordinates"""
+    
+    DEFAULT_PRECISION = 4  # Decimal places kept in the key (~11 m)
+    DEFAULT_MAX_ENTRIES = 2000
+    DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+    DEFAULT_TTL_SECONDS = 24 * 3600
+    
+    def __init__(self, precision: int = None, max_entries: int = None,
+                 max_bytes: int = None, ttl_seconds: int = None):
+        """
+        Initialize route cache
+        
+        Args:
+            precision: Decimal places coordinates are rounded to in the key
+            max_entries: Maximum number of cached routes
+            max_bytes: Maximum total size of the cached (serialized) routes
+            ttl_seconds: Lifetime of a cached route
+        """
+        self.precision = precision if precision is not None else int(
+            os.getenv('ROUTE_CACHE_PRECISION', self.DEFAULT_PRECISION))
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv('ROUTE_CACHE_MAX_ENTRIES', self.DEFAULT_MAX_ENTRIES))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('ROUTE_CACHE_MAX_BYTES', self.DEFAULT_MAX_BYTES))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.getenv('ROUTE_CACHE_TTL', self.DEFAULT_TTL_SECONDS))
+        
+        # key -> (expires_at, serialized route)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def make_key(self, provider: str, profile: str, coordinates: List[List[float]]) -> Tuple:
+        """
+        Build the cache key for a route request
+        
+        Args:
+            provider: Routing provider name ('ors', 'osrm', ...)
+            profile: Provider routing profile
+            coordinates: Route coordinates as [lon, lat] pairs
+        
+        Returns:
+            Hashable key with every coordinate rounded to the cache precision
+        """
+        return (provider, profile) + tuple(
+            (round(lon, self.precision), round(lat, self.precision))
+            for lon, lat in coordinates
+        )
+    
+    def get(self, key: Tuple) -> Optional[Dict]:
+        """
+        Return a fresh copy of a cached route, or None on a miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, payload = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        
+        # Routes are stored serialized so callers can never mutate the cached copy
+        return json.loads(payload)
+    
+    def set(self, key: Tuple, route: Dict):
+        """
+        Cache a route result, evicting least recently used routes to stay in bounds
+        """
+        payload = json.dumps(route)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, payload)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def _remove(self, key: Tuple):
+        """Remove an entry and release its size (caller holds the lock)"""
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+    
+    def clear(self):
+        """Remove every cached route"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict:
+        """Return cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_route_cache() -> Optional[RouteCache]:
+    """
+    Return the process-wide route cache
+    
+    Returns None when caching is disabled with ROUTE_CACHE_ENABLED=False.
+    """
+    global _default_cache
+    if os.getenv('ROUTE_CACHE_ENABLED', 'True') != 'True':
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = RouteCache()
+    return _default_cache
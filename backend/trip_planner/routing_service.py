@@ -2,9 +2,54 @@
 Routing Service
 Uses OpenRouteService API for route calculation
 """
-import requests
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterator, List, Tuple
 import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from .circuit_breaker import CircuitOpenError, NoResultError, get_breaker
+from .geocode_cache import GeocodeCache, get_default_geocode_cache
+from .geometry import RouteGeometryIndex, decode_polyline, encode_polyline, format_geometry, haversine_m
+from .http_client import HTTPClient, get_http_client, get_rate_limiter
+from .latency import get_latency_histogram
+from .local_router import get_local_engine
+from .locations import Location, location_label, parse_coordinates
+from .route_cache import RouteCache, get_default_route_cache
+from .singleflight import SingleFlight
+
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(name: str = 'routing') -> ThreadPoolExecutor:
+    """
+    Return a process-wide thread pool used for concurrent provider calls
+    
+    Work that waits on other pooled work (hedged requests) gets its own
+    pool so the two can never starve each other.
+    """
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('ROUTING_MAX_WORKERS', '16')),
+                    thread_name_prefix=name
+                )
+                _executors[name] = executor
+    return executor
+
+
+# Identical provider requests in flight at the same time are sent only once
+_inflight = SingleFlight()
+
+
+def inflight_stats() -> Dict:
+    """Return request coalescing counters for this process"""
+    return _inflight.stats()
 
 
 class RoutingService:
@@ -12,26 +57,108 @@ class RoutingService:
     
     # Using public demo server (rate limited) - users should get their own API key
     ORS_API_URL = "https://api.openrouteservice.org/v2/directions/driving-hgv"
+    ORS_MATRIX_URL = "https://api.openrouteservice.org/v2/matrix/driving-hgv"
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, geocode_cache: GeocodeCache = None,
+                 concurrent: bool = None, deadline_seconds: float = None,
+                 single_request: bool = None, route_cache: RouteCache = None,
+                 http_client: HTTPClient = None, hedge: bool = None,
+                 provider: str = None):
         """
         Initialize routing service
         
         Args:
             api_key: OpenRouteService API key (optional, will use env var if not provided)
+            geocode_cache: Geocode cache (optional, defaults to the shared on-disk cache)
+            concurrent: Run independent geocoding/routing calls in parallel
+                (optional, will use ROUTING_CONCURRENT env var if not provided)
+            deadline_seconds: Time budget for get_route_with_stops
+                (optional, will use ROUTING_DEADLINE_SECONDS env var if not provided)
+            single_request: Route both legs of a trip with one via-point request
+                (optional, will use ROUTING_SINGLE_REQUEST env var if not provided)
+            route_cache: Route result cache (optional, defaults to the shared in-memory cache)
+            http_client: Pooled HTTP client (optional, defaults to the process-wide client)
+            hedge: Send a backup OSRM request when ORS is slower than usual
+                (optional, will use ROUTING_HEDGE env var if not provided)
+            provider: 'auto' (ORS when an API key is set, else OSRM), 'ors',
+                'osrm' or 'local' (offline graph from LOCAL_GRAPH_PATH)
+                (optional, will use ROUTING_PROVIDER env var if not provided)
         """
         self.api_key = api_key or os.getenv('ORS_API_KEY', '')
+        self.geocode_cache = geocode_cache or get_default_geocode_cache()
+        if concurrent is None:
+            concurrent = os.getenv('ROUTING_CONCURRENT', 'True') == 'True'
+        self.concurrent = concurrent
+        if deadline_seconds is None:
+            deadline_seconds = float(os.getenv('ROUTING_DEADLINE_SECONDS', '45'))
+        self.deadline_seconds = deadline_seconds
+        if single_request is None:
+            single_request = os.getenv('ROUTING_SINGLE_REQUEST', 'True') == 'True'
+        self.single_request = single_request
+        self.route_cache = route_cache or get_default_route_cache()
+        self.http = http_client or get_http_client()
+        if hedge is None:
+            hedge = os.getenv('ROUTING_HEDGE', 'False') == 'True'
+        self.hedge = hedge
+        self.hedge_percentile = float(os.getenv('ROUTING_HEDGE_PERCENTILE', '0.9'))
+        self.hedge_default_delay = float(os.getenv('ROUTING_HEDGE_DEFAULT_DELAY', '3'))
+        self.provider = provider or os.getenv('ROUTING_PROVIDER', 'auto')
+        self.nominatim_rate = float(os.getenv('NOMINATIM_RATE', '1'))
+        self.ors_alternatives_max_km = float(os.getenv('ORS_ALTERNATIVES_MAX_KM', '100'))
     
     def geocode_address(self, address: str) -> Tuple[float, float]:
         """
         Convert address to coordinates using Nominatim (OpenStreetMap)
         
+        Results, including addresses that could not be geocoded, are served
+        from the persistent geocode cache when available. Concurrent lookups
+        of the same normalized address share one Nominatim request, and
+        requests are spaced out to NOMINATIM_RATE per second process-wide.
+        
         Args:
             address: Address string
             
         Returns:
             Tuple of (latitude, longitude)
         """
+        if self.geocode_cache is not None:
+            found, coords = self.geocode_cache.lookup(address)
+            if found:
+                if coords is None:
+                    raise Exception(f"Geocoding error: Could not geocode address: {address}")
+                return coords
+        
+        try:
+            coords = _inflight.do(
+                ('nominatim', GeocodeCache.normalize_address(address)),
+                self._geocode_limited, address
+            )
+        except NoResultError as e:
+            # The address itself is bad - remember that so we don't ask again
+            if self.geocode_cache is not None:
+                self.geocode_cache.store(address, None)
+            raise Exception(f"Geocoding error: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Geocoding error: {str(e)}")
+        
+        if self.geocode_cache is not None:
+            self.geocode_cache.store(address, coords)
+        return coords
+    
+    def _geocode_limited(self, address: str) -> Tuple[float, float]:
+        """Geocode an address through the Nominatim rate limiter and circuit breaker"""
+        # Time spent waiting for the limiter is not provider latency, so it
+        # stays outside _call_provider
+        get_rate_limiter('nominatim', self.nominatim_rate).acquire()
+        return self._call_provider('nominatim', self._geocode_nominatim, address)
+    
+    def _geocode_nominatim(self, address: str) -> Tuple[float, float]:
+        """
+        Geocode an address with a live Nominatim request
+        
+        Raises:
+            NoResultError: If the address has no usable result
+        """
         url = "https://nominatim.openstreetmap.org/search"
         params = {
             'q': address,
@@ -42,22 +169,99 @@ class RoutingService:
             'User-Agent': 'ELD-Trip-Planner/1.0'
         }
         
-        try:
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+        response = self.http.get(url, params=params, headers=headers, read_timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data and len(data) > 0:
+            lat = float(data[0]['lat'])
+            lon = float(data[0]['lon'])
+            # Validate coordinates are reasonable (world bounds)
+            if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+                raise NoResultError(f"Invalid coordinates for address: {address}")
+            return lat, lon
+        else:
+            raise NoResultError(f"Could not geocode address: {address}")
+    
+    def geocode_batch(self, locations: List[Location], max_workers: int = None,
+                      rate_per_second: float = None) -> Iterator[Dict]:
+        """
+        Geocode many locations, yielding results in input order
+        
+        Duplicates (after address normalization) are resolved once, coordinate
+        inputs and cache hits are answered without a request, and the rest go
+        through geocode_address with at most max_workers requests in flight
+        and no more than rate_per_second requests started per second (on top
+        of the process-wide NOMINATIM_RATE limit).
+        
+        Args:
+            locations: Addresses or coordinates
+            max_workers: Concurrent geocoding requests (defaults to GEOCODE_BATCH_WORKERS env var)
+            rate_per_second: Request rate budget (defaults to GEOCODE_BATCH_RATE env var)
+        
+        Yields:
+            One dictionary per input: index, address and either latitude and
+            longitude or error
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('GEOCODE_BATCH_WORKERS', '4'))
+        if rate_per_second is None:
+            rate_per_second = float(os.getenv('GEOCODE_BATCH_RATE', '1'))
+        limiter = get_rate_limiter('geocode_batch', rate_per_second)
+        
+        def geocode_limited(address):
+            limiter.acquire()
+            return self.geocode_address(address)
+        
+        # Resolve every distinct location once; outcomes are (coords, error)
+        keys = []
+        outcomes = {}
+        pending = {}
+        for location in locations:
+            if isinstance(location, str):
+                key = GeocodeCache.normalize_address(location)
+            else:
+                key = location_label(location)
+            keys.append(key)
+            if key in outcomes or key in pending:
+                continue
             
-            if data and len(data) > 0:
-                lat = float(data[0]['lat'])
-                lon = float(data[0]['lon'])
-                # Validate coordinates are reasonable (world bounds)
-                if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-                    raise ValueError(f"Invalid coordinates for address: {address}")
-                return lat, lon
+            coords = parse_coordinates(location)
+            if coords is None and not isinstance(location, str):
+                outcomes[key] = (None, f"Invalid coordinates: {location}")
+                continue
+            if coords is None and self.geocode_cache is not None:
+                found, cached = self.geocode_cache.lookup(location)
+                if found:
+                    error = None if cached else f"Geocoding error: Could not geocode address: {location}"
+                    outcomes[key] = (cached, error)
+                    continue
+            if coords is not None:
+                outcomes[key] = (coords, None)
             else:
-                raise ValueError(f"Could not geocode address: {address}")
-        except Exception as e:
-            raise Exception(f"Geocoding error: {str(e)}")
+                pending[key] = location
+        
+        executor = ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix='geocode-batch')
+        try:
+            futures = {key: executor.submit(geocode_limited, address) for key, address in pending.items()}
+            for index, (location, key) in enumerate(zip(locations, keys)):
+                if key not in outcomes:
+                    try:
+                        outcomes[key] = (futures[key].result(), None)
+                    except Exception as e:
+                        outcomes[key] = (None, str(e))
+                
+                coords, error = outcomes[key]
+                item = {'index': index, 'address': location_label(location)}
+                if error is None:
+                    item['latitude'] = coords[0]
+                    item['longitude'] = coords[1]
+                else:
+                    item['error'] = error
+                yield item
+        finally:
+            # Stop queued lookups if the consumer goes away mid-stream
+            executor.shutdown(wait=False, cancel_futures=True)
     
     def calculate_route(self, start_coords: Tuple[float, float], 
                        end_coords: Tuple[float, float],
@@ -71,7 +275,8 @@ class RoutingService:
             waypoints: Optional list of waypoint coordinates
             
         Returns:
-            Dictionary with route information
+            Dictionary with route information. When waypoints are given it
+            also has a 'legs' list with one route dictionary per leg.
         """
         # Build coordinates list [lon, lat] format for ORS
         coordinates = [[start_coords[1], start_coords[0]]]
@@ -82,14 +287,111 @@ class RoutingService:
         
         coordinates.append([end_coords[1], end_coords[0]])
         
+        if self.provider == 'local':
+            return self._calculate_route_local(coordinates)
+        
         # Try with API key first, fall back to OSRM if no key
-        if self.api_key:
+        if self.api_key and self.provider != 'osrm':
+            if self.hedge:
+                return self._calculate_route_hedged(coordinates)
             return self._calculate_route_ors(coordinates)
         else:
             return self._calculate_route_osrm(coordinates)
     
-    def _calculate_route_ors(self, coordinates: List[List[float]]) -> Dict:
-        """Calculate route using OpenRouteService"""
+    def _calculate_route_local(self, coordinates: List[List[float]]) -> Dict:
+        """
+        Calculate route with the offline local routing engine
+        
+        Falls back to OSRM when no graph is configured or the graph does not
+        cover the requested points.
+        """
+        try:
+            engine = get_local_engine()
+            if engine is None:
+                raise Exception("No local routing graph is loaded")
+            return self._call_provider('local', engine.route, coordinates)
+        except Exception as e:
+            print(f"Local routing failed: {str(e)}, falling back to OSRM")
+            return self._calculate_route_osrm(coordinates)
+    
+    def _calculate_route_hedged(self, coordinates: List[List[float]]) -> Dict:
+        """
+        Calculate route with ORS, hedged by OSRM
+        
+        ORS gets a head start equal to the hedge percentile of its recent
+        latency. If it has not answered by then, the same route is requested
+        from OSRM as well and whichever valid response arrives first wins.
+        The slower request is left to finish in the background, where its
+        result still warms the route cache.
+        """
+        executor = _get_executor('hedge')
+        primary = executor.submit(self._calculate_route_ors, coordinates, False)
+        delay = get_latency_histogram('ors').percentile(
+            self.hedge_percentile, default=self.hedge_default_delay)
+        
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        except Exception as e:
+            print(f"ORS routing failed: {str(e)}, falling back to OSRM")
+            return self._calculate_route_osrm(coordinates)
+        
+        secondary = executor.submit(self._calculate_route_osrm, coordinates)
+        error = None
+        for future in as_completed([primary, secondary]):
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+        raise error
+    
+    def _calculate_route_ors(self, coordinates: List[List[float]], fallback: bool = True) -> Dict:
+        """
+        Calculate route using OpenRouteService
+        
+        Concurrent requests for the same coordinates share one provider call.
+        
+        Args:
+            coordinates: Route coordinates as [lon, lat] pairs
+            fallback: Retry with OSRM when ORS fails (otherwise the error is raised)
+        """
+        if self.route_cache is not None:
+            cache_key = self.route_cache.make_key('ors', 'driving-hgv', coordinates)
+            cached = self.route_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            route = _inflight.do(
+                ('ors',) + tuple(tuple(c) for c in coordinates),
+                self._call_provider, 'ors', self._request_ors, coordinates
+            )
+            
+            result = self._format_ors_route(route)
+            if len(coordinates) > 2:
+                result['legs'] = self._split_ors_legs(route)
+            if self.route_cache is not None:
+                self.route_cache.set(cache_key, result)
+            return result
+        except Exception as e:
+            if not fallback:
+                raise
+            # Fallback to OSRM if ORS fails (or its circuit is open)
+            print(f"ORS routing failed: {str(e)}, falling back to OSRM")
+            return self._calculate_route_osrm(coordinates)
+    
+    def _format_ors_route(self, route: Dict) -> Dict:
+        """Route dictionary for one ORS route"""
+        return {
+            'distance_miles': route['summary']['distance'] * 0.000621371,  # meters to miles
+            'duration_hours': route['summary']['duration'] / 3600,  # seconds to hours
+            'geometry': route['geometry'],
+            'instructions': self._format_instructions(route.get('segments', []))
+        }
+    
+    def _request_ors(self, coordinates: List[List[float]]) -> Dict:
+        """Send an ORS directions request and return the first route"""
         headers = {
             'Authorization': self.api_key,
             'Content-Type': 'application/json'
@@ -101,34 +403,56 @@ class RoutingService:
             'units': 'mi'
         }
         
-        try:
-            response = requests.post(
-                self.ORS_API_URL,
-                json=body,
-                headers=headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            route = data['routes'][0]
-            
-            return {
-                'distance_miles': route['summary']['distance'] * 0.000621371,  # meters to miles
-                'duration_hours': route['summary']['duration'] / 3600,  # seconds to hours
-                'geometry': route['geometry'],
-                'instructions': self._format_instructions(route.get('segments', []))
-            }
-        except Exception as e:
-            # Fallback to OSRM if ORS fails
-            print(f"ORS routing failed: {str(e)}, falling back to OSRM")
-            return self._calculate_route_osrm(coordinates)
+        response = self.http.post(
+            self.ORS_API_URL,
+            json=body,
+            headers=headers,
+            read_timeout=30
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return data['routes'][0]
     
     def _calculate_route_osrm(self, coordinates: List[List[float]]) -> Dict:
         """
         Calculate route using OSRM (free, no API key needed)
         Fallback option when ORS is not available
+        
+        Concurrent requests for the same coordinates share one provider call.
         """
+        if self.route_cache is not None:
+            cache_key = self.route_cache.make_key('osrm', 'driving', coordinates)
+            cached = self.route_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            route = _inflight.do(
+                ('osrm',) + tuple(tuple(c) for c in coordinates),
+                self._call_provider, 'osrm', self._request_osrm, coordinates
+            )
+            
+            result = self._format_osrm_route(route)
+            if len(coordinates) > 2:
+                result['legs'] = self._split_osrm_legs(route)
+            if self.route_cache is not None:
+                self.route_cache.set(cache_key, result)
+            return result
+        except Exception as e:
+            raise Exception(f"Routing error: {str(e)}")
+    
+    def _format_osrm_route(self, route: Dict) -> Dict:
+        """Route dictionary for one OSRM route"""
+        return {
+            'distance_miles': route['distance'] * 0.000621371,  # meters to miles
+            'duration_hours': route['duration'] / 3600,  # seconds to hours
+            'geometry': route['geometry'],
+            'instructions': self._format_osrm_instructions(route.get('legs', []))
+        }
+    
+    def _request_osrm(self, coordinates: List[List[float]]) -> Dict:
+        """Send an OSRM route request and return the first route"""
         # Format coordinates for OSRM: lon,lat;lon,lat
         coords_str = ';'.join([f"{lon},{lat}" for lon, lat in coordinates])
         
@@ -139,25 +463,365 @@ class RoutingService:
             'steps': 'true'
         }
         
+        response = self.http.get(url, params=params, read_timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data['code'] != 'Ok':
+            # OSRM answered, there is just no route (NoRoute, NoSegment, ...)
+            raise NoResultError(f"OSRM routing error: {data.get('message', 'Unknown error')}")
+        
+        return data['routes'][0]
+    
+    def calculate_route_alternatives(self, start_coords: Tuple[float, float],
+                                     end_coords: Tuple[float, float],
+                                     max_alternatives: int = None) -> List[Dict]:
+        """
+        Calculate up to max_alternatives different routes between two points
+        
+        Providers only offer alternatives for routes without via points.
+        The local engine has a single best route. ORS refuses alternatives
+        for routes longer than ORS_ALTERNATIVES_MAX_KM (100 km on the public
+        API), so longer trips go to OSRM directly.
+        
+        Args:
+            start_coords: Starting (lat, lon)
+            end_coords: Ending (lat, lon)
+            max_alternatives: Maximum number of routes
+                (optional, will use ROUTE_MAX_ALTERNATIVES env var if not provided)
+        
+        Returns:
+            List of route dictionaries as from calculate_route, the
+            provider's preferred route first
+        """
+        if max_alternatives is None:
+            max_alternatives = int(os.getenv('ROUTE_MAX_ALTERNATIVES', '3'))
+        if max_alternatives <= 1 or self.provider == 'local':
+            return [self.calculate_route(start_coords, end_coords)]
+        
+        coordinates = [[start_coords[1], start_coords[0]], [end_coords[1], end_coords[0]]]
+        straight_km = haversine_m(start_coords[0], start_coords[1], end_coords[0], end_coords[1]) / 1000
+        if self.api_key and self.provider != 'osrm' and straight_km <= self.ors_alternatives_max_km:
+            try:
+                # Own circuit breaker: a refused request (the road distance
+                # can still be over the limit) must not open the breaker
+                # that normal ORS routing uses
+                return self._fetch_alternatives(
+                    'ors_alternatives', self._request_ors_alternatives, coordinates, max_alternatives)
+            except Exception as e:
+                print(f"ORS alternatives failed: {str(e)}, falling back to OSRM")
+        
         try:
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data['code'] != 'Ok':
-                raise Exception(f"OSRM routing error: {data.get('message', 'Unknown error')}")
-            
-            route = data['routes'][0]
-            
-            return {
-                'distance_miles': route['distance'] * 0.000621371,  # meters to miles
-                'duration_hours': route['duration'] / 3600,  # seconds to hours
-                'geometry': route['geometry'],
-                'instructions': self._format_osrm_instructions(route.get('legs', []))
-            }
+            return self._fetch_alternatives(
+                'osrm', self._request_osrm_alternatives, coordinates, max_alternatives)
         except Exception as e:
             raise Exception(f"Routing error: {str(e)}")
     
+    def _fetch_alternatives(self, provider: str, request: Callable,
+                            coordinates: List[List[float]], count: int) -> List[Dict]:
+        """
+        Fetch alternative routes through the route cache and request coalescing
+        """
+        profile = f"alternatives-{count}"
+        if self.route_cache is not None:
+            cache_key = self.route_cache.make_key(provider, profile, coordinates)
+            cached = self.route_cache.get(cache_key)
+            if cached is not None:
+                return cached['routes']
+        
+        routes = _inflight.do(
+            (provider, profile) + tuple(tuple(c) for c in coordinates),
+            self._call_provider, provider, request, coordinates, count
+        )
+        if self.route_cache is not None:
+            self.route_cache.set(cache_key, {'routes': routes})
+        return routes
+    
+    def _request_ors_alternatives(self, coordinates: List[List[float]], count: int) -> List[Dict]:
+        """Send an ORS directions request for alternative routes"""
+        headers = {
+            'Authorization': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        body = {
+            'coordinates': coordinates,
+            'instructions': True,
+            'units': 'mi',
+            'alternative_routes': {
+                'target_count': count,
+                'share_factor': 0.6,
+                'weight_factor': 1.4
+            }
+        }
+        
+        response = self.http.post(
+            self.ORS_API_URL,
+            json=body,
+            headers=headers,
+            read_timeout=30
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return [self._format_ors_route(route) for route in data['routes'][:count]]
+    
+    def _request_osrm_alternatives(self, coordinates: List[List[float]], count: int) -> List[Dict]:
+        """Send an OSRM route request for alternative routes"""
+        coords_str = ';'.join([f"{lon},{lat}" for lon, lat in coordinates])
+        
+        url = f"https://router.project-osrm.org/route/v1/driving/{coords_str}"
+        params = {
+            'overview': 'full',
+            'geometries': 'geojson',
+            'steps': 'true',
+            'alternatives': str(count)
+        }
+        
+        response = self.http.get(url, params=params, read_timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data['code'] != 'Ok':
+            raise NoResultError(f"OSRM routing error: {data.get('message', 'Unknown error')}")
+        
+        return [self._format_osrm_route(route) for route in data['routes'][:count]]
+    
+    def calculate_matrix(self, origins: List[Tuple[float, float]],
+                         destinations: List[Tuple[float, float]]) -> Dict:
+        """
+        Calculate the distance/duration table between origins and destinations
+        
+        The table is requested in blocks of at most MATRIX_CHUNK_SIZE origins
+        by MATRIX_CHUNK_SIZE destinations; blocks are fetched in parallel and
+        served from the route cache when the same block was asked for before.
+        
+        Args:
+            origins: List of (lat, lon)
+            destinations: List of (lat, lon)
+        
+        Returns:
+            Dictionary with 'distances_miles' and 'durations_hours', each a
+            list with one row per origin and one column per destination.
+            Pairs with no route are None.
+        
+        Raises:
+            TimeoutError: If the table is not complete within the deadline
+        """
+        deadline = time.monotonic() + self.deadline_seconds
+        chunk_size = int(os.getenv('MATRIX_CHUNK_SIZE', '50'))
+        
+        # [lon, lat] format, as for routes
+        sources = [[lon, lat] for lat, lon in origins]
+        targets = [[lon, lat] for lat, lon in destinations]
+        
+        blocks = [
+            (row, col)
+            for row in range(0, len(sources), chunk_size)
+            for col in range(0, len(targets), chunk_size)
+        ]
+        results = self._run_calls([
+            (self._matrix_block, (sources[row:row + chunk_size], targets[col:col + chunk_size]))
+            for row, col in blocks
+        ], deadline)
+        
+        distances = [[None] * len(targets) for _ in sources]
+        durations = [[None] * len(targets) for _ in sources]
+        for (row, col), block in zip(blocks, results):
+            for i, (distance_row, duration_row) in enumerate(
+                    zip(block['distances_miles'], block['durations_hours'])):
+                distances[row + i][col:col + len(distance_row)] = distance_row
+                durations[row + i][col:col + len(duration_row)] = duration_row
+        
+        return {
+            'distances_miles': distances,
+            'durations_hours': durations
+        }
+    
+    def _matrix_block(self, sources: List[List[float]], targets: List[List[float]]) -> Dict:
+        """
+        Fetch one block of the table from the configured provider
+        
+        Mirrors calculate_route: the local engine or ORS are used when
+        configured, with OSRM as the fallback.
+        """
+        if self.provider == 'local':
+            try:
+                engine = get_local_engine()
+                if engine is None:
+                    raise Exception("No local routing graph is loaded")
+                distances, durations = self._call_provider('local', engine.matrix, sources, targets)
+                return {'distances_miles': distances, 'durations_hours': durations}
+            except Exception as e:
+                print(f"Local matrix failed: {str(e)}, falling back to OSRM")
+        elif self.api_key and self.provider != 'osrm':
+            try:
+                return self._fetch_matrix_block('ors', self._request_ors_matrix, sources, targets)
+            except Exception as e:
+                print(f"ORS matrix failed: {str(e)}, falling back to OSRM")
+        
+        try:
+            return self._fetch_matrix_block('osrm', self._request_osrm_table, sources, targets)
+        except Exception as e:
+            raise Exception(f"Matrix error: {str(e)}")
+    
+    def _fetch_matrix_block(self, provider: str, request: Callable,
+                            sources: List[List[float]], targets: List[List[float]]) -> Dict:
+        """
+        Fetch a matrix block through the route cache and request coalescing
+        """
+        # The source count in the profile keeps sources and targets apart
+        profile = f"matrix-{len(sources)}"
+        if self.route_cache is not None:
+            cache_key = self.route_cache.make_key(provider, profile, sources + targets)
+            cached = self.route_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        result = _inflight.do(
+            (provider, profile) + tuple(tuple(c) for c in sources + targets),
+            self._call_provider, provider, request, sources, targets
+        )
+        if self.route_cache is not None:
+            self.route_cache.set(cache_key, result)
+        return result
+    
+    def _request_ors_matrix(self, sources: List[List[float]], targets: List[List[float]]) -> Dict:
+        """Send an ORS matrix request"""
+        headers = {
+            'Authorization': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        body = {
+            'locations': sources + targets,
+            'sources': list(range(len(sources))),
+            'destinations': list(range(len(sources), len(sources) + len(targets))),
+            'metrics': ['distance', 'duration'],
+            'units': 'mi'
+        }
+        
+        response = self.http.post(
+            self.ORS_MATRIX_URL,
+            json=body,
+            headers=headers,
+            read_timeout=30
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            'distances_miles': data['distances'],
+            'durations_hours': [
+                [d / 3600 if d is not None else None for d in row]
+                for row in data['durations']
+            ]
+        }
+    
+    def _request_osrm_table(self, sources: List[List[float]], targets: List[List[float]]) -> Dict:
+        """Send an OSRM table request"""
+        coords_str = ';'.join([f"{lon},{lat}" for lon, lat in sources + targets])
+        
+        url = f"https://router.project-osrm.org/table/v1/driving/{coords_str}"
+        params = {
+            'sources': ';'.join(str(i) for i in range(len(sources))),
+            'destinations': ';'.join(str(i) for i in range(len(sources), len(sources) + len(targets))),
+            'annotations': 'duration,distance'
+        }
+        
+        response = self.http.get(url, params=params, read_timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data['code'] != 'Ok':
+            raise NoResultError(f"OSRM table error: {data.get('message', 'Unknown error')}")
+        
+        return {
+            'distances_miles': [
+                [d * 0.000621371 if d is not None else None for d in row]  # meters to miles
+                for row in data['distances']
+            ],
+            'durations_hours': [
+                [d / 3600 if d is not None else None for d in row]  # seconds to hours
+                for row in data['durations']
+            ]
+        }
+    
+    def _call_provider(self, provider: str, func: Callable, *args):
+        """
+        Run a provider request through the provider's circuit breaker
+        
+        The latency of every successful call is added to the provider's
+        rolling latency histogram.
+        
+        NoResultError means the provider answered but the input has no
+        result, so it is recorded as a healthy call. Any other error,
+        including a response that cannot be parsed, counts as a failure.
+        
+        Raises:
+            CircuitOpenError: If the provider's circuit is open
+        """
+        breaker = get_breaker(provider)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"{provider} circuit is open")
+        
+        started = time.monotonic()
+        try:
+            result = func(*args)
+        except NoResultError:
+            breaker.record_success(time.monotonic() - started)
+            raise
+        except Exception:
+            breaker.record_failure(time.monotonic() - started)
+            raise
+        latency = time.monotonic() - started
+        breaker.record_success(latency)
+        get_latency_histogram(provider).record(latency)
+        return result
+    
+    def _split_ors_legs(self, route: Dict) -> List[Dict]:
+        """
+        Split an ORS multi-waypoint route into one route dictionary per leg
+        
+        ORS returns one entry in 'segments' per leg, and 'way_points' holds
+        the index of every waypoint in the (encoded) route geometry.
+        """
+        coordinates = decode_polyline(route['geometry'])
+        way_points = route['way_points']
+        legs = []
+        for i, segment in enumerate(route.get('segments', [])):
+            leg_coordinates = coordinates[way_points[i]:way_points[i + 1] + 1]
+            legs.append({
+                'distance_miles': segment.get('distance', 0) * 0.000621371,
+                'duration_hours': segment.get('duration', 0) / 3600,
+                'geometry': encode_polyline(leg_coordinates),
+                'instructions': self._format_instructions([segment])
+            })
+        return legs
+    
+    def _split_osrm_legs(self, route: Dict) -> List[Dict]:
+        """
+        Split an OSRM multi-waypoint route into one route dictionary per leg
+        
+        Each leg's geometry is rebuilt from its step geometries, which OSRM
+        always returns at full resolution.
+        """
+        legs = []
+        for leg in route.get('legs', []):
+            leg_coordinates = []
+            for step in leg.get('steps', []):
+                step_coordinates = step.get('geometry', {}).get('coordinates', [])
+                if leg_coordinates and step_coordinates and leg_coordinates[-1] == step_coordinates[0]:
+                    step_coordinates = step_coordinates[1:]
+                leg_coordinates.extend(step_coordinates)
+            legs.append({
+                'distance_miles': leg['distance'] * 0.000621371,
+                'duration_hours': leg['duration'] / 3600,
+                'geometry': {'type': 'LineString', 'coordinates': leg_coordinates},
+                'instructions': self._format_osrm_instructions([leg])
+            })
+        return legs
+    
     def _format_instructions(self, segments: List[Dict]) -> List[Dict]:
         """Format ORS instructions"""
         instructions = []
@@ -187,30 +851,130 @@ class RoutingService:
                 })
         return instructions
     
-    def get_route_with_stops(self, current_location: str, pickup_location: str, 
-                            dropoff_location: str) -> Dict:
+    def resolve_location(self, location: Location) -> Tuple[float, float]:
+        """
+        Return coordinates for a location, geocoding only when needed
+        
+        Args:
+            location: Address string or coordinates (see locations.parse_coordinates)
+        
+        Returns:
+            Tuple of (latitude, longitude)
+        """
+        coords = parse_coordinates(location)
+        if coords is not None:
+            return coords
+        if not isinstance(location, str):
+            raise ValueError(f"Invalid coordinates: {location}")
+        return self.geocode_address(location)
+    
+    def get_route_with_stops(self, current_location: Location, pickup_location: Location, 
+                            dropoff_location: Location) -> Dict:
         """
         Calculate complete route with pickup and dropoff
         
         Args:
-            current_location: Current location address
-            pickup_location: Pickup location address
-            dropoff_location: Dropoff location address
+            current_location: Current location address or coordinates
+            pickup_location: Pickup location address or coordinates
+            dropoff_location: Dropoff location address or coordinates
             
         Returns:
             Dictionary with complete route information
         """
-        # Geocode all locations
-        current_coords = self.geocode_address(current_location)
-        pickup_coords = self.geocode_address(pickup_location)
-        dropoff_coords = self.geocode_address(dropoff_location)
+        deadline = time.monotonic() + self.deadline_seconds
+        locations = [current_location, pickup_location, dropoff_location]
+        current_coords, pickup_coords, dropoff_coords = coords = self._resolve_all(locations, deadline)
         
         # Calculate route segments
-        # Segment 1: Current to Pickup
-        route_to_pickup = self.calculate_route(current_coords, pickup_coords)
+        # Segment 1: Current to Pickup, Segment 2: Pickup to Dropoff
+        if self.single_request:
+            # One provider request with pickup as a via point, split per leg
+            route = self._run_calls([
+                (self.calculate_route, (current_coords, dropoff_coords, [pickup_coords]))
+            ], deadline)[0]
+            route_to_pickup, route_to_dropoff = route['legs']
+        else:
+            route_to_pickup, route_to_dropoff = self._run_calls([
+                (self.calculate_route, (current_coords, pickup_coords)),
+                (self.calculate_route, (pickup_coords, dropoff_coords))
+            ], deadline)
         
-        # Segment 2: Pickup to Dropoff
-        route_to_dropoff = self.calculate_route(pickup_coords, dropoff_coords)
+        return self._combine_legs(locations, coords, route_to_pickup, route_to_dropoff)
+    
+    def get_route_alternatives(self, current_location: Location, pickup_location: Location,
+                               dropoff_location: Location, max_alternatives: int = None) -> List[Dict]:
+        """
+        Calculate alternative complete routes with pickup and dropoff
+        
+        Both legs are requested separately with alternatives (providers do
+        not return alternatives for via-point routes), in parallel, and
+        every combination of a pickup leg and a dropoff leg is a candidate.
+        
+        Args:
+            current_location: Current location address or coordinates
+            pickup_location: Pickup location address or coordinates
+            dropoff_location: Dropoff location address or coordinates
+            max_alternatives: Maximum routes per leg (see calculate_route_alternatives)
+        
+        Returns:
+            List of route dictionaries as from get_route_with_stops, the
+            combination of the providers' preferred legs first
+        """
+        deadline = time.monotonic() + self.deadline_seconds
+        locations = [current_location, pickup_location, dropoff_location]
+        current_coords, pickup_coords, dropoff_coords = coords = self._resolve_all(locations, deadline)
+        
+        to_pickup, to_dropoff = self._run_calls([
+            (self.calculate_route_alternatives, (current_coords, pickup_coords, max_alternatives)),
+            (self.calculate_route_alternatives, (pickup_coords, dropoff_coords, max_alternatives))
+        ], deadline)
+        
+        return [
+            self._combine_legs(locations, coords, route_to_pickup, route_to_dropoff)
+            for route_to_pickup in to_pickup
+            for route_to_dropoff in to_dropoff
+        ]
+    
+    def choose_route(self, alternatives: List[Dict],
+                     plan: Callable[[Dict], Dict]) -> Tuple[int, List[Dict]]:
+        """
+        Plan every alternative route concurrently and pick the earliest arrival
+        
+        Args:
+            alternatives: Results of get_route_alternatives
+            plan: Function returning the HOS trip plan of one route
+        
+        Returns:
+            Tuple of (index of the chosen route, trip plan of every route).
+            Ties go to fewer rest breaks, then to the shorter route.
+        """
+        deadline = time.monotonic() + self.deadline_seconds
+        plans = self._run_calls([(plan, (route,)) for route in alternatives], deadline)
+        best = min(range(len(plans)), key=lambda i: (
+            plans[i]['estimated_duration_hours'],
+            plans[i]['num_rest_breaks'],
+            alternatives[i]['total_distance_miles']
+        ))
+        return best, plans
+    
+    def _resolve_all(self, locations: List[Location], deadline: float) -> List[Tuple[float, float]]:
+        """Coordinates of every location; only addresses are geocoded, in parallel"""
+        coords = [parse_coordinates(location) for location in locations]
+        pending = [i for i, c in enumerate(coords) if c is None]
+        if pending:
+            geocoded = self._run_calls(
+                [(self.resolve_location, (locations[i],)) for i in pending],
+                deadline
+            )
+            for i, c in zip(pending, geocoded):
+                coords[i] = c
+        return coords
+    
+    def _combine_legs(self, locations: List[Location], coords: List[Tuple[float, float]],
+                      route_to_pickup: Dict, route_to_dropoff: Dict) -> Dict:
+        """Complete route dictionary from its two legs"""
+        current_location, pickup_location, dropoff_location = locations
+        current_coords, pickup_coords, dropoff_coords = coords
         
         # Combine routes
         total_distance = route_to_pickup['distance_miles'] + route_to_dropoff['distance_miles']
@@ -218,15 +982,15 @@ class RoutingService:
         
         return {
             'current_location': {
-                'address': current_location,
+                'address': location_label(current_location),
                 'coordinates': current_coords
             },
             'pickup_location': {
-                'address': pickup_location,
+                'address': location_label(pickup_location),
                 'coordinates': pickup_coords
             },
             'dropoff_location': {
-                'address': dropoff_location,
+                'address': location_label(dropoff_location),
                 'coordinates': dropoff_coords
             },
             'route_to_pickup': route_to_pickup,
@@ -234,3 +998,109 @@ class RoutingService:
             'total_distance_miles': total_distance,
             'total_duration_hours': total_duration
         }
+    
+    @staticmethod
+    def locate_stops(route_data: Dict, segments: List[Dict]) -> List[Dict]:
+        """
+        Place the rest and fuel stops of a trip plan on the route
+        
+        Args:
+            route_data: Result of get_route_with_stops
+            segments: Trip plan segments with a mile_marker each
+        
+        Returns:
+            List of stop dictionaries with latitude and longitude, in driving order
+        """
+        index = RouteGeometryIndex.from_geometries([
+            route_data['route_to_pickup'].get('geometry'),
+            route_data['route_to_dropoff'].get('geometry')
+        ])
+        stops = [s for s in segments if s['type'] in ('rest', 'sleeper') or s['activity'] == 'Fuel Stop']
+        if not stops or not len(index.lats):
+            return []
+        
+        positions = index.locate_many(
+            [s['mile_marker'] for s in stops],
+            route_data['total_distance_miles']
+        )
+        return [
+            {
+                'type': stop['type'],
+                'activity': stop['activity'],
+                'start_time': stop['start_time'],
+                'duration': stop['duration'],
+                'mile_marker': stop['mile_marker'],
+                'latitude': float(lat),
+                'longitude': float(lon)
+            }
+            for stop, (lat, lon) in zip(stops, positions)
+        ]
+    
+    @staticmethod
+    def format_route_geometry(route_data: Dict, geometry_format: str = 'auto',
+                              tolerance_m: float = 0) -> Dict:
+        """
+        Simplify and re-encode the leg geometries of a trip route
+        
+        Args:
+            route_data: Result of get_route_with_stops
+            geometry_format: 'auto', 'geojson' or 'polyline' (see geometry.format_geometry)
+            tolerance_m: Douglas-Peucker tolerance in meters
+        
+        Returns:
+            Copy of route_data with new leg dictionaries; route_data itself
+            (which may share legs with cached routes) is left unchanged
+        """
+        result = dict(route_data)
+        for key in ('route_to_pickup', 'route_to_dropoff'):
+            leg = dict(route_data[key])
+            leg['geometry'] = format_geometry(leg.get('geometry'), geometry_format, tolerance_m)
+            result[key] = leg
+        return result
+    
+    def _run_calls(self, calls: List[Tuple[Callable, tuple]], deadline: float) -> List:
+        """
+        Run independent provider calls and return their results in order
+        
+        In concurrent mode the calls share the process-wide thread pool; the
+        first failure is re-raised as soon as it happens and the remaining
+        calls are abandoned.
+        
+        Args:
+            calls: List of (function, args) pairs
+            deadline: time.monotonic() value by which all calls must finish
+        
+        Returns:
+            List of call results, in the same order as calls
+        
+        Raises:
+            TimeoutError: If the deadline passes before every call finished
+        """
+        if not self.concurrent:
+            results = []
+            for func, args in calls:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Routing deadline of {self.deadline_seconds:g}s exceeded")
+                results.append(func(*args))
+            return results
+        
+        executor = _get_executor()
+        futures = [executor.submit(func, *args) for func, args in calls]
+        done, pending = wait(
+            futures,
+            timeout=max(deadline - time.monotonic(), 0),
+            return_when=FIRST_EXCEPTION
+        )
+        
+        for future in futures:
+            if future in done and future.exception() is not None:
+                for other in pending:
+                    other.cancel()
+                raise future.exception()
+        
+        if pending:
+            for other in pending:
+                other.cancel()
+            raise TimeoutError(f"Routing deadline of {self.deadline_seconds:g}s exceeded")
+        
+        return [future.result() for future in futures]
@@ -0,0 +1,134 @@
+"""
+Trip Plan Segments
+Compact duty status segments timed in minutes from the start of the plan
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+
+# ELD duty status codes
+# 1: Off Duty, 2: Sleeper Berth, 3: Driving, 4: On Duty Not Driving
+DUTY_STATUS = {
+    'rest': 1,
+    'sleeper': 2,
+    'driving': 3,
+    'on_duty': 4
+}
+
+
+class Segment:
+    """
+    One duty status period of a trip plan
+    
+    Times are whole minutes since the plan start, so planning and log
+    rendering never format or parse timestamps and HOS checks compare
+    integers; ISO strings and hours are only produced by serialize_trip_plan.
+    """
+    
+    __slots__ = ('type', 'activity', 'start', 'duration', 'distance', 'mile_marker')
+    
+    def __init__(self, segment_type: str, activity: str, start: int, duration: int,
+                 distance: float = 0, mile_marker: float = 0):
+        """
+        Initialize segment
+        
+        Args:
+            segment_type: 'driving', 'on_duty', 'rest' or 'sleeper'
+            activity: Display label ("Driving", "Fuel Stop", ...)
+            start: Minutes from the plan start
+            duration: Length in minutes
+            distance: Miles driven during the segment
+            mile_marker: Miles driven before the segment starts
+        """
+        self.type = segment_type
+        self.activity = activity
+        self.start = start
+        self.duration = duration
+        self.distance = distance
+        self.mile_marker = mile_marker
+    
+    @property
+    def end(self) -> int:
+        """Minutes from the plan start at which the segment ends"""
+        return self.start + self.duration
+    
+    @property
+    def status(self) -> int:
+        """ELD duty status code"""
+        return DUTY_STATUS.get(self.type, 1)
+    
+    def __repr__(self) -> str:
+        return (f"Segment({self.type!r}, {self.activity!r}, start={self.start}, "
+                f"duration={self.duration}, distance={self.distance:g})")
+
+
+def segment_to_dict(segment: Segment, start_time: datetime) -> Dict:
+    """API representation of a plan segment"""
+    return {
+        'type': segment.type,
+        'activity': segment.activity,
+        'start_time': (start_time + timedelta(minutes=segment.start)).isoformat(),
+        'duration': segment.duration / 60,
+        'distance': segment.distance,
+        'mile_marker': segment.mile_marker
+    }
+
+
+def segment_from_dict(data: Dict, start_time: datetime) -> Segment:
+    """Plan segment from its API representation (see segment_to_dict)"""
+    start = datetime.fromisoformat(data['start_time'])
+    return Segment(
+        data['type'],
+        data['activity'],
+        int(round((start - start_time) / timedelta(minutes=1))),
+        int(round(float(data['duration']) * 60)),
+        float(data.get('distance', 0)),
+        float(data.get('mile_marker', 0))
+    )
+
+
+def timeline_entry_to_dict(segment: Segment, start_time: datetime) -> Dict:
+    """API representation of a daily log timeline entry"""
+    return {
+        'start_time': (start_time + timedelta(minutes=segment.start)).isoformat(),
+        'duration': segment.duration / 60,
+        'status': segment.status,
+        'activity': segment.activity,
+        'distance': segment.distance
+    }
+
+
+def serialize_trip_plan(trip_plan: Dict) -> Dict:
+    """
+    Convert a trip plan from ELDService into its JSON representation
+    
+    Args:
+        trip_plan: Result of ELDService.calculate_trip_plan
+    
+    Returns:
+        New dictionary with ISO timestamps in place of plan offsets
+    """
+    start_time = trip_plan['start_time']
+    result = dict(trip_plan)
+    result['start_time'] = start_time.isoformat()
+    result['segments'] = serialize_segments(trip_plan['segments'], start_time)
+    result['daily_logs'] = [serialize_daily_log(log, start_time) for log in trip_plan['daily_logs']]
+    return result
+
+
+def serialize_daily_log(log: Dict, start_time: datetime) -> Dict:
+    """JSON representation of one daily log"""
+    result = {key: value for key, value in log.items() if key not in ('day_start', 'timeline')}
+    result['date'] = log['date'].isoformat()
+    result['timeline'] = [timeline_entry_to_dict(s, start_time) for s in log['timeline']]
+    return result
+
+
+def serialize_segments(segments: List[Segment], start_time: datetime) -> List[Dict]:
+    """JSON representation of a list of plan segments"""
+    return [segment_to_dict(s, start_time) for s in segments]
+
+
+def deserialize_segments(data: List[Dict], start_time: datetime) -> List[Segment]:
+    """Plan segments from their JSON representation"""
+    return [segment_from_dict(item, start_time) for item in data]
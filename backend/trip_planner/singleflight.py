@@ -0,0 +1,77 @@
+"""
+Single-Flight Request Coalescing
+Concurrent callers asking for the same key share one in-flight call
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """An in-flight call and the outcome its waiters will receive"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicate identical concurrent calls within this process"""
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+    
+    def do(self, key: Hashable, func: Callable, *args) -> Any:
+        """
+        Run func(*args), or wait for the identical call already in flight
+        
+        Args:
+            key: Identity of the call; callers with equal keys share one call
+            func: Function to run when no call for key is in flight
+            *args: Arguments for func
+        
+        Returns:
+            The result of the shared call. If it raised, every waiter
+            receives the same exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+                leader = True
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+    
+    def stats(self) -> Dict:
+        """Return coalescing counters"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'calls': self.calls,
+                'coalesced': self.coalesced
+            }
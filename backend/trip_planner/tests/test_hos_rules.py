@@ -0,0 +1,176 @@
+"""
+Tests for the HOS rule sets, planned one trip at a time (ELDService)
+"""
+from datetime import datetime
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from trip_planner.batch_planner import BatchTripPlanner
+from trip_planner.cycle_ledger import CycleLedger
+from trip_planner.eld_service import ELDService
+from trip_planner.hos_rules import (BREAK_ACTIVITY, PROPERTY_60_7, PROPERTY_70_8,
+                                    PROPERTY_70_8_SLEEPER, RESTART_ACTIVITY, RULE_SETS,
+                                    SLEEPER_ACTIVITY, SPLIT_ACTIVITY, SPLIT_EITHER, HOSRuleSet)
+
+
+START = datetime(2024, 5, 1, 6, 0)
+
+
+class HOSRuleSetTests(SimpleTestCase):
+    
+    def plan(self, rules, distance, cycle_used=0, cycle_history=None):
+        return ELDService(cycle_used, cycle_history, rules=rules).calculate_trip_plan(distance, START)
+    
+    def assertCompliant(self, plan, rules):
+        """Check the plan against the rules, independently of the planner's clocks"""
+        segments = plan['segments']
+        rest = rules.min_rest_hours * 60
+        
+        # Off-duty periods as [start, end, longest sleeper berth segment]
+        periods = []
+        for segment in segments:
+            if segment.type not in ('rest', 'sleeper'):
+                continue
+            if not periods or periods[-1][1] != segment.start:
+                periods.append([segment.start, segment.start, 0])
+            periods[-1][1] = segment.end
+            if segment.type == 'sleeper':
+                periods[-1][2] = max(periods[-1][2], segment.duration)
+        
+        since_break = not_driving_run = 0
+        for segment in segments:
+            if segment.type != 'driving':
+                not_driving_run += segment.duration
+                if not_driving_run >= rules.break_hours * 60:
+                    since_break = 0
+                continue
+            not_driving_run = 0
+            since_break += segment.duration
+            self.assertLessEqual(since_break, rules.break_after_driving_hours * 60)
+            
+            # Limits count from coming on duty after the last full rest or,
+            # once two split periods make a pair, from the end of the first
+            # one, without the second one
+            before = [p for p in periods if p[1] <= segment.start]
+            full_rests = [p for p in before if p[1] - p[0] >= rest]
+            reset = full_rests[-1][1] if full_rests else 0
+            count_from = min(s.start for s in segments if s.type not in ('rest', 'sleeper') and s.start >= reset)
+            excluded = 0
+            splits = [p for p in before if p[0] >= reset and p[1] - p[0] >= 120]
+            if rules.sleeper_split_hours is not None:
+                for first, second in zip(splits, splits[1:]):
+                    if (max(first[2], second[2]) >= 7 * 60
+                            and first[1] - first[0] + second[1] - second[0] >= rest):
+                        count_from, excluded = first[1], second[1] - second[0]
+            driving = sum(min(s.end, segment.end) - max(s.start, count_from) for s in segments
+                          if s.type == 'driving' and s.end > count_from and s.start < segment.end)
+            self.assertLessEqual(driving, rules.max_driving_hours * 60)
+            self.assertLessEqual(segment.end - count_from - excluded, rules.max_window_hours * 60)
+        
+        for log in plan['daily_logs']:
+            # Hours carried in over the limit are only allowed before a restart
+            if log['recap']['on_duty_today']:
+                self.assertLessEqual(log['recap']['on_duty_cycle'], rules.max_cycle_hours + 1e-9)
+    
+    def test_every_rule_set_plans_compliant_trips(self):
+        for rules in RULE_SETS.values():
+            for distance, cycle_used in ((150, 0), (700, 0), (1800, 30), (3000, 65)):
+                with self.subTest(rules=rules.name, distance=distance, cycle_used=cycle_used):
+                    plan = self.plan(rules, distance, cycle_used)
+                    self.assertCompliant(plan, rules)
+                    self.assertEqual(plan['hos_rules'], rules.name)
+    
+    def test_30_minute_break_after_8_hours_driving(self):
+        segments = self.plan(PROPERTY_70_8, 700)['segments']
+        self.assertEqual([(s.type, s.duration) for s in segments[:5]],
+                         [('on_duty', 60), ('driving', 480), ('rest', 30), ('driving', 180), ('rest', 600)])
+        self.assertEqual(segments[2].activity, BREAK_ACTIVITY)
+    
+    def test_short_trip_needs_no_break(self):
+        plan = self.plan(PROPERTY_70_8, 300)
+        self.assertEqual(plan['num_rest_breaks'], 0)
+    
+    def test_60_7_restart_when_the_cycle_is_used_up(self):
+        history = [10] * 6
+        plan = self.plan(PROPERTY_60_7, 300, cycle_history=history)
+        self.assertEqual(plan['num_restarts'], 1)
+        restart = plan['segments'][0]
+        self.assertEqual((restart.activity, restart.duration), (RESTART_ACTIVITY, 34 * 60))
+        self.assertEqual(plan['segments'][1].activity, 'Pickup')
+        self.assertEqual(plan['daily_logs'][0]['recap']['cycle_days'], 7)
+        
+        # The same hours leave 10 hours in a 70-hour/8-day cycle
+        self.assertEqual(self.plan(PROPERTY_70_8, 300, cycle_history=history)['num_restarts'], 0)
+    
+    def test_60_7_hours_roll_off(self):
+        # The hours worked more than 6 days ago are no longer in the cycle
+        plan = self.plan(PROPERTY_60_7, 300, cycle_history=[12, 12, 12, 0, 0, 0, 0])
+        self.assertEqual(plan['num_restarts'], 0)
+        self.assertEqual(plan['cycle_hours_used'], 24)
+    
+    def test_recap_days_until_reset(self):
+        # Worked today, so nothing rolls off for a whole cycle
+        plan = self.plan(PROPERTY_60_7, 300, cycle_history=[12, 12, 12, 0, 0, 0, 0])
+        self.assertEqual(plan['daily_logs'][-1]['recap']['days_until_reset'], 7)
+        # The hours of 3 days ago roll off 5 days from now
+        self.assertEqual(CycleLedger(70 * 60, 8, [12 * 60, 0, 0]).days_until_reset(), 5)
+        self.assertEqual(CycleLedger(70 * 60, 8, [0, 0, 0]).days_until_reset(), 0)
+    
+    def test_sleeper_berth_split(self):
+        plan = self.plan(PROPERTY_70_8_SLEEPER, 1500)
+        self.assertEqual([(s.activity, s.start, s.duration) for s in plan['segments'][:6]],
+                         [('Pickup', 0, 60), ('Driving', 60, 480), (SPLIT_ACTIVITY, 540, 120),
+                          ('Driving', 660, 180), (SLEEPER_ACTIVITY, 840, 480), ('Driving', 1320, 431)])
+        # 11 hours of driving in 19.5 hours between the off-duty periods:
+        # legal only because the sleeper berth period does not count
+        second_split = [s for s in plan['segments'] if s.activity == SPLIT_ACTIVITY][1]
+        self.assertEqual(second_split.start - 660, 1170)
+        self.assertEqual(sum(s.duration for s in plan['segments']
+                             if s.type == 'driving' and 660 <= s.start < second_split.start), 660)
+        self.assertLess(plan['estimated_duration_hours'],
+                        self.plan(PROPERTY_70_8, 1500)['estimated_duration_hours'])
+    
+    def test_split_pair_counts_from_the_end_of_the_first_period(self):
+        table = PROPERTY_70_8_SLEEPER.compile()
+        clocks, split = table.replay([('on_duty', 60), ('driving', 480), ('rest', 120),
+                                      ('driving', 180), ('sleeper', 480)])
+        clocks = dict(zip(table.names, clocks))
+        self.assertEqual((clocks['driving'], clocks['window'], clocks['break']), (180, 180, 0))
+        self.assertEqual(split, SPLIT_EITHER)
+    
+    def test_split_periods_that_do_not_pair(self):
+        table = PROPERTY_70_8_SLEEPER.compile()
+        for short, long in ((('rest', 120), ('rest', 480)),       # No sleeper berth period
+                            (('rest', 120), ('sleeper', 420)),    # Not 10 hours together
+                            (('rest', 60), ('sleeper', 540))):    # Off-duty period too short
+            with self.subTest(short=short, long=long):
+                clocks, _ = table.replay([('driving', 300), short, ('driving', 180), long])
+                self.assertEqual(clocks[table.names.index('driving')], 480)
+    
+    def test_sleeper_berth_split_is_optional(self):
+        # A split would end with a 2-hour period where a 30-minute break does
+        start = datetime(2024, 5, 1, 4, 57)
+        plan = ELDService(30, rules=PROPERTY_70_8_SLEEPER).calculate_trip_plan(1202.5, start)
+        self.assertFalse([s for s in plan['segments']
+                          if s.activity in (SPLIT_ACTIVITY, SLEEPER_ACTIVITY)])
+        self.assertEqual(plan['estimated_duration_hours'],
+                         ELDService(30).calculate_trip_plan(1202.5, start)['estimated_duration_hours'])
+    
+    def test_invalid_sleeper_berth_split(self):
+        for hours in (6, 9):
+            with self.assertRaises(ValueError):
+                HOSRuleSet('split', sleeper_split_hours=hours)
+    
+    def test_batch_planner_matches_scalar_planner(self):
+        distances = [150, 700, 1234.5, 2600]
+        cycles = [0, 20, 55, 69]
+        for rules in RULE_SETS.values():
+            with self.subTest(rules=rules.name):
+                batch = BatchTripPlanner(rules=rules).plan_trips(distances, cycles, START)
+                for i, (distance, cycle) in enumerate(zip(distances, cycles)):
+                    plan = self.plan(rules, distance, cycle)
+                    for column in ('estimated_duration_hours', 'total_on_duty_time',
+                                   'num_rest_breaks', 'num_restarts', 'num_fuel_stops',
+                                   'cycle_hours_available'):
+                        self.assertTrue(np.isclose(batch[column][i], plan[column]), column)
@@ -0,0 +1,126 @@
+"""
+Tests for replanning a trip under way (ELDService.replan_trip)
+"""
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from trip_planner.eld_service import ELDService
+from trip_planner.hos_rules import OFF_DUTY_ACTIVITY, PROPERTY_60_7, RESTART_ACTIVITY
+
+
+class ReplanTripTests(SimpleTestCase):
+    START = datetime(2024, 5, 1, 6, 0)
+    DISTANCE = 1200
+    
+    def setUp(self):
+        self.service = ELDService(0)
+        self.plan = self.service.calculate_trip_plan(self.DISTANCE, self.START)
+    
+    def replan(self, as_of: datetime, miles_driven: float):
+        return self.service.replan_trip(self.plan['segments'], self.START, self.DISTANCE,
+                                        as_of, miles_driven)
+    
+    def minute(self, when: datetime) -> int:
+        return int((when - self.START) / timedelta(minutes=1))
+    
+    def assertConsistent(self, segments):
+        """One contiguous trip, mile markers never going back, one dropoff at the end"""
+        for previous, segment in zip(segments, segments[1:]):
+            self.assertEqual(segment.start, previous.end)
+            self.assertGreaterEqual(segment.mile_marker, previous.mile_marker - 1e-6)
+        activities = [s.activity for s in segments]
+        self.assertEqual(activities.count('Pickup'), 1)
+        self.assertEqual(activities.count('Dropoff'), 1)
+        self.assertEqual(segments[-1].activity, 'Dropoff')
+        self.assertAlmostEqual(segments[-1].mile_marker, self.DISTANCE)
+        driven = sum(s.distance for s in segments if s.type == 'driving')
+        self.assertAlmostEqual(driven, self.DISTANCE, places=6)
+    
+    def assertResumesAt(self, segments, as_of: datetime, miles_driven: float):
+        """Nothing after as_of comes from the old plan, and driving goes on from miles_driven"""
+        now = self.minute(as_of)
+        gap = [s for s in segments if s.activity == OFF_DUTY_ACTIVITY]
+        self.assertEqual(len(gap), 1)
+        self.assertEqual(gap[0].end, now)
+        self.assertEqual(gap[0].mile_marker, miles_driven)
+        for segment in segments:
+            if segment.start < now:
+                self.assertLessEqual(segment.mile_marker, miles_driven)
+            else:
+                self.assertGreaterEqual(segment.mile_marker, miles_driven)
+        resumed = next(s for s in segments if s.type == 'driving' and s.start >= now)
+        self.assertEqual(resumed.mile_marker, miles_driven)
+    
+    def test_on_schedule_keeps_plan(self):
+        as_of = self.START + timedelta(minutes=self.plan['segments'][3].start + 30)
+        segment = self.plan['segments'][3]
+        miles = segment.mile_marker + segment.distance * 30 / segment.duration
+        replanned = self.replan(as_of, miles)
+        self.assertEqual([(s.type, s.start, s.duration) for s in replanned['segments']],
+                         [(s.type, s.start, s.duration) for s in self.plan['segments']])
+    
+    def test_behind_schedule(self):
+        as_of = datetime(2024, 5, 2, 22, 0)
+        replanned = self.replan(as_of, 900)
+        segments = replanned['segments']
+        self.assertConsistent(segments)
+        self.assertResumesAt(segments, as_of, 900)
+        # The planned fuel stop at mile 1000 was not reached yet
+        fuel_stops = [s for s in segments if s.activity == 'Fuel Stop']
+        self.assertEqual(len(fuel_stops), 1)
+        self.assertGreaterEqual(fuel_stops[0].start, self.minute(as_of))
+    
+    def test_behind_schedule_before_planned_rest(self):
+        # The planned rest at mile 605 is not reached; the off-duty time
+        # since the truck stopped is too short to reset the 14-hour window
+        as_of = datetime(2024, 5, 1, 20, 0)
+        segments = self.replan(as_of, 300)['segments']
+        self.assertConsistent(segments)
+        self.assertResumesAt(segments, as_of, 300)
+        after = [s for s in segments if s.start >= self.minute(as_of)]
+        self.assertEqual(after[0].type, 'rest')
+        self.assertEqual(after[0].duration, 600)
+    
+    def test_past_planned_arrival(self):
+        planned_end = self.START + timedelta(minutes=self.plan['segments'][-1].end)
+        as_of = planned_end + timedelta(hours=3)
+        replanned = self.replan(as_of, 1100)
+        segments = replanned['segments']
+        self.assertConsistent(segments)
+        self.assertResumesAt(segments, as_of, 1100)
+        self.assertEqual(replanned['num_fuel_stops'], 1)
+        self.assertGreater(segments[-1].end, self.minute(as_of))
+    
+    def test_arrived_after_planned_arrival(self):
+        planned_end = self.START + timedelta(minutes=self.plan['segments'][-1].end)
+        replanned = self.replan(planned_end + timedelta(hours=3), self.DISTANCE)
+        self.assertConsistent(replanned['segments'])
+        self.assertEqual([(s.type, s.start, s.duration) for s in replanned['segments']],
+                         [(s.type, s.start, s.duration) for s in self.plan['segments']])
+    
+    def test_just_short_of_the_destination(self):
+        # Less than a minute of driving left, after all planned driving time
+        as_of = self.START + timedelta(minutes=self.plan['segments'][-1].end + 60)
+        segments = self.replan(as_of, self.DISTANCE - 0.1)['segments']
+        self.assertConsistent(segments)
+        self.assertResumesAt(segments, as_of, self.DISTANCE - 0.1)
+    
+    def test_first_changed_day_goes_back_to_where_the_truck_stopped(self):
+        # Far behind: the truck stopped on the first day, the update comes on the second
+        replanned = self.replan(datetime(2024, 5, 2, 9, 0), 300)
+        self.assertConsistent(replanned['segments'])
+        self.assertEqual(replanned['first_changed_day'], 0)
+        self.assertEqual(replanned['daily_logs'][0]['date'], self.START.date())
+    
+    def test_during_restart_before_pickup(self):
+        # The cycle is used up, so the plan starts with a 34-hour restart
+        service = ELDService(0, [10] * 6, rules=PROPERTY_60_7)
+        plan = service.calculate_trip_plan(300, self.START)
+        self.assertEqual(plan['segments'][0].activity, RESTART_ACTIVITY)
+        
+        replanned = service.replan_trip(plan['segments'], self.START, 300,
+                                        self.START + timedelta(hours=5), 0)
+        self.assertEqual([s.activity for s in replanned['segments']],
+                         [s.activity for s in plan['segments']])
+        self.assertEqual([s.activity for s in replanned['segments'][:2]], [RESTART_ACTIVITY, 'Pickup'])
@@ -6,6 +6,11 @@ from . import views
 
 urlpatterns = [
     path('calculate-trip/', views.calculate_trip, name='calculate_trip'),
+    path('replan-trip/', views.replan_trip, name='replan_trip'),
     path('geocode/', views.geocode, name='geocode'),
+    path('geocode-batch/', views.geocode_batch, name='geocode_batch'),
+    path('matrix/', views.distance_matrix, name='distance_matrix'),
+    path('optimize-departure/', views.optimize_departure_time, name='optimize_departure'),
     path('health/', views.health_check, name='health_check'),
+    path('routing-status/', views.routing_status, name='routing_status'),
 ]
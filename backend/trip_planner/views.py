@@ -1,13 +1,33 @@
 """
 API Views for Trip Planner
 """
+from django.http import StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from .eld_service import ELDService
+from .batch_planner import BatchTripPlanner
+from .hos_rules import get_rule_set
+from .departure_optimizer import optimize_departure
+from .segments import deserialize_segments, serialize_daily_log, serialize_trip_plan
 from .routing_service import RoutingService
+from .locations import location_label, parse_coordinates
+from .geometry import RouteGeometryIndex, tolerance_for_zoom
 from .log_generator import ELDLogGenerator
-from datetime import datetime
+from .circuit_breaker import breaker_snapshots
+from .latency import latency_snapshots
+from .route_cache import get_default_route_cache
+from .plan_cache import calculate_trip_plan, get_default_plan_cache
+from .routing_service import inflight_stats
+from datetime import datetime, timedelta
+import json
+import math
+import os
+
+
+# Route alternatives are planned at their average speed rounded to this step,
+# so that alternatives and repeated trips share cached plans
+ROUTE_SPEED_STEP_MPH = 0.5
 
 
 @api_view(['POST'])
@@ -20,8 +40,36 @@ def calculate_trip(request):
         "current_location": "Address or coordinates",
         "pickup_location": "Address or coordinates",
         "dropoff_location": "Address or coordinates",
-        "current_cycle_used": 25.5
+        "current_cycle_used": 25.5,
+        "cycle_history": [8, 10.5, 0, 11, 9, 0, 12],
+        "hos_rules": "property_70_8",
+        "route_alternatives": false,
+        "geometry_format": "auto",
+        "simplify_tolerance": 25,
+        "map_zoom": 10
     }
+    
+    Coordinates may be sent as "lat,lon", as decimal degrees with
+    hemisphere letters ("34.05 N, 118.24 W") or as {"lat": .., "lon": ..};
+    they are used directly instead of being geocoded.
+    
+    The optional geometry fields shrink the route payload: geometry_format
+    is "geojson", "polyline" (encoded polyline) or "auto" (provider format),
+    and the leg geometries are simplified to simplify_tolerance meters, or
+    to one screen pixel at map_zoom when no tolerance is given.
+    
+    cycle_history (optional) lists the on-duty hours of the previous days,
+    oldest first, and replaces current_cycle_used; it tells the planner when
+    hours roll off the cycle.
+    
+    hos_rules (optional) names the HOS rule set: "property_70_8" (default),
+    "property_60_7" or "property_70_8_sleeper" (8/2 sleeper berth splits,
+    used only when the trip arrives earlier with them).
+    
+    With route_alternatives, the provider's alternative routes are planned
+    concurrently, each at its own average speed (rounded to
+    ROUTE_SPEED_STEP_MPH, at most the planner's AVG_SPEED_MPH), and the route with the earliest HOS-compliant arrival
+    is returned together with the comparison of all of them.
     """
     try:
         # Extract input data
@@ -29,6 +77,12 @@ def calculate_trip(request):
         pickup_location = request.data.get('pickup_location')
         dropoff_location = request.data.get('dropoff_location')
         current_cycle_used = float(request.data.get('current_cycle_used', 0))
+        geometry_format = request.data.get('geometry_format', 'auto')
+        simplify_tolerance = request.data.get('simplify_tolerance')
+        map_zoom = request.data.get('map_zoom')
+        cycle_history = request.data.get('cycle_history')
+        route_alternatives = bool(request.data.get('route_alternatives', False))
+        rules = get_rule_set(request.data.get('hos_rules'))
         
         # Validate inputs
         if not all([current_location, pickup_location, dropoff_location]):
@@ -36,33 +90,91 @@ def calculate_trip(request):
                 {'error': 'Missing required fields'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if geometry_format not in ('auto', 'geojson', 'polyline'):
+            return Response(
+                {'error': 'geometry_format must be auto, geojson or polyline'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if cycle_history is not None and not isinstance(cycle_history, list):
+            return Response(
+                {'error': 'cycle_history must be a list of daily on-duty hours'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Initialize services
         routing_service = RoutingService()
-        eld_service = ELDService(current_cycle_used)
+        eld_service = ELDService(current_cycle_used, cycle_history, rules=rules)
         log_generator = ELDLogGenerator()
         
-        # Calculate route
-        route_data = routing_service.get_route_with_stops(
-            current_location,
-            pickup_location,
-            dropoff_location
-        )
+        start_time = datetime.now()
+        alternatives_data = None
         
-        # Calculate ELD compliance and trip plan
-        trip_plan = eld_service.calculate_trip_plan(
-            route_data['total_distance_miles'],
-            datetime.now()
-        )
+        if route_alternatives:
+            # Plan every alternative and keep the earliest arrival
+            alternatives = routing_service.get_route_alternatives(
+                current_location,
+                pickup_location,
+                dropoff_location
+            )
+            
+            def plan_route(route):
+                speed = None
+                if route['total_duration_hours'] > 0:
+                    speed = min(route['total_distance_miles'] / route['total_duration_hours'],
+                                ELDService.AVG_SPEED_MPH)
+                    speed = max(round(speed / ROUTE_SPEED_STEP_MPH), 1) * ROUTE_SPEED_STEP_MPH
+                return calculate_trip_plan(
+                    ELDService(current_cycle_used, cycle_history, speed, rules),
+                    route['total_distance_miles'],
+                    start_time
+                )
+            
+            chosen, plans = routing_service.choose_route(alternatives, plan_route)
+            route_data, trip_plan = alternatives[chosen], plans[chosen]
+            alternatives_data = [
+                _alternative_summary(route, plan, i == chosen)
+                for i, (route, plan) in enumerate(zip(alternatives, plans))
+            ]
+        else:
+            # Calculate route
+            route_data = routing_service.get_route_with_stops(
+                current_location,
+                pickup_location,
+                dropoff_location
+            )
+            
+            # Calculate ELD compliance and trip plan
+            trip_plan = calculate_trip_plan(
+                eld_service,
+                route_data['total_distance_miles'],
+                start_time
+            )
+        
+        # Timestamps are formatted once, for the response
+        trip_plan_data = serialize_trip_plan(trip_plan)
+        
+        # Put rest and fuel stops on the map
+        route_data['stops'] = routing_service.locate_stops(route_data, trip_plan_data['segments'])
+        
+        # Stops are placed on the full geometry; only the response is simplified
+        if simplify_tolerance is not None:
+            tolerance = float(simplify_tolerance)
+        elif map_zoom is not None:
+            latitudes = [route_data[key]['coordinates'][0]
+                         for key in ('current_location', 'pickup_location', 'dropoff_location')]
+            tolerance = tolerance_for_zoom(float(map_zoom), sum(latitudes) / len(latitudes))
+        else:
+            tolerance = float(os.getenv('GEOMETRY_SIMPLIFY_TOLERANCE', '0'))
+        route_data = routing_service.format_route_geometry(route_data, geometry_format, tolerance)
         
         # Generate log sheets with trip details
         trip_details = {
             'driver_name': "Driver",
-            'from_location': current_location,
-            'to_location': dropoff_location,
+            'from_location': location_label(current_location),
+            'to_location': location_label(dropoff_location),
             'carrier_name': "Transport Company",
             'main_office': "123 Main St, City, State",
-            'home_terminal': current_location,
+            'home_terminal': location_label(current_location),
             'truck_number': "TRK-001",
             'trailer_number': "TRL-001"
         }
@@ -74,18 +186,23 @@ def calculate_trip(request):
         # Combine all data
         response_data = {
             'route': route_data,
-            'trip_plan': trip_plan,
+            'trip_plan': trip_plan_data,
             'log_sheets': log_sheets,
             'summary': {
                 'total_distance_miles': route_data['total_distance_miles'],
                 'estimated_duration_hours': trip_plan['estimated_duration_hours'],
                 'num_rest_breaks': trip_plan['num_rest_breaks'],
+                'num_restarts': trip_plan['num_restarts'],
                 'num_fuel_stops': trip_plan['num_fuel_stops'],
                 'num_days': len(trip_plan['daily_logs']),
-                'cycle_hours_remaining': trip_plan['cycle_hours_available']
+                'cycle_hours_remaining': trip_plan['cycle_hours_available'],
+                'hos_rules': rules.name
             }
         }
         
+        if alternatives_data is not None:
+            response_data['route_alternatives'] = alternatives_data
+        
         return Response(response_data, status=status.HTTP_200_OK)
         
     except ValueError as e:
@@ -93,6 +210,11 @@ def calculate_trip(request):
             {'error': f'Invalid input: {str(e)}'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    except TimeoutError as e:
+        return Response(
+            {'error': f'Routing timed out: {str(e)}'},
+            status=status.HTTP_504_GATEWAY_TIMEOUT
+        )
     except Exception as e:
         # Log the full error for debugging
         import traceback
@@ -104,6 +226,170 @@ def calculate_trip(request):
         )
 
 
+def _alternative_summary(route_data: dict, trip_plan: dict, selected: bool) -> dict:
+    """Comparison entry for one alternative route"""
+    duration = trip_plan['estimated_duration_hours']
+    return {
+        'selected': selected,
+        'total_distance_miles': route_data['total_distance_miles'],
+        'driving_duration_hours': route_data['total_duration_hours'],
+        'estimated_duration_hours': duration,
+        'estimated_arrival': (trip_plan['start_time'] + timedelta(hours=duration)).isoformat(),
+        'num_rest_breaks': trip_plan['num_rest_breaks'],
+        'num_restarts': trip_plan['num_restarts']
+    }
+
+
+@api_view(['POST'])
+def replan_trip(request):
+    """
+    Replan the rest of a trip from a progress update
+    
+    Expected input:
+    {
+        "trip_plan": {...},
+        "as_of": "2024-05-01T14:05:00",
+        "miles_driven": 412.5,
+        "current_position": "35.08,-106.65",
+        "route": {...},
+        "driving_hours": 6.5,
+        "on_duty_hours": 8,
+        "current_cycle_used": 25.5,
+        "cycle_history": [8, 10.5, 0, 11, 9, 0, 12],
+        "hos_rules": "property_70_8",
+        "trip_details": {...}
+    }
+    
+    trip_plan and route are the ones calculate_trip returned (or the last
+    replan). Progress is given as miles_driven, or as current_position,
+    which is projected onto the route geometry. as_of defaults to now; the
+    driving and on-duty hours since the last 10-hour rest default to what
+    the plan says. current_cycle_used, cycle_history and hos_rules must be
+    the values the trip was first planned with.
+    
+    Planned stops the truck has not reached are dropped, and when the truck
+    is behind the plan the time up to as_of is logged off duty.
+    
+    Nothing is geocoded or routed. Only the rest of the trip is replanned,
+    and log sheets are rendered only for the days whose log changed;
+    log_sheets maps those day indexes to images.
+    """
+    try:
+        plan_data = request.data.get('trip_plan')
+        route_data = request.data.get('route')
+        as_of = request.data.get('as_of')
+        miles_driven = request.data.get('miles_driven')
+        current_position = request.data.get('current_position')
+        driving_hours = request.data.get('driving_hours')
+        on_duty_hours = request.data.get('on_duty_hours')
+        current_cycle_used = float(request.data.get('current_cycle_used', 0))
+        cycle_history = request.data.get('cycle_history')
+        trip_details = request.data.get('trip_details') or {'driver_name': 'Driver'}
+        rules = get_rule_set(request.data.get('hos_rules'))
+        
+        if not isinstance(plan_data, dict) or 'segments' not in plan_data:
+            return Response(
+                {'error': 'trip_plan from calculate-trip is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if miles_driven is None and (current_position is None or not isinstance(route_data, dict)):
+            return Response(
+                {'error': 'Send miles_driven, or current_position with the route'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        start_time = datetime.fromisoformat(plan_data['start_time'])
+        as_of = datetime.fromisoformat(as_of) if as_of else datetime.now()
+        distance = float(plan_data['total_distance'])
+        
+        if miles_driven is None:
+            position = parse_coordinates(current_position)
+            if position is None:
+                raise ValueError(f"Invalid coordinates: {current_position}")
+            index = RouteGeometryIndex.from_geometries([
+                route_data['route_to_pickup'].get('geometry'),
+                route_data['route_to_dropoff'].get('geometry')
+            ])
+            miles_driven = index.project(position[0], position[1], route_data['total_distance_miles'])
+        miles_driven = min(float(miles_driven), distance)
+        
+        eld_service = ELDService(current_cycle_used, cycle_history, rules=rules)
+        trip_plan = eld_service.replan_trip(
+            deserialize_segments(plan_data['segments'], start_time),
+            start_time,
+            distance,
+            as_of,
+            miles_driven,
+            float(driving_hours) if driving_hours is not None else None,
+            float(on_duty_hours) if on_duty_hours is not None else None
+        )
+        
+        # Logs before the update are kept; later ones are compared with the old plan
+        first_day = trip_plan['first_changed_day']
+        old_logs = plan_data.get('daily_logs', [])
+        new_logs = [serialize_daily_log(log, start_time) for log in trip_plan['daily_logs']]
+        changed_days = [
+            first_day + i for i, log in enumerate(new_logs)
+            if first_day + i >= len(old_logs) or not _same_values(log, old_logs[first_day + i])
+        ]
+        
+        log_generator = ELDLogGenerator()
+        log_sheets = {
+            day: log_generator.generate_log_sheet(trip_plan['daily_logs'][day - first_day], trip_details)
+            for day in changed_days
+        }
+        
+        trip_plan_data = serialize_trip_plan(dict(trip_plan, daily_logs=[]))
+        trip_plan_data['daily_logs'] = old_logs[:first_day] + new_logs
+        response_data = {
+            'trip_plan': trip_plan_data,
+            'miles_driven': miles_driven,
+            'changed_days': changed_days,
+            'log_sheets': log_sheets,
+            'summary': {
+                'total_distance_miles': distance,
+                'estimated_duration_hours': trip_plan['estimated_duration_hours'],
+                'estimated_arrival': (start_time + timedelta(
+                    hours=trip_plan['estimated_duration_hours'])).isoformat(),
+                'num_rest_breaks': trip_plan['num_rest_breaks'],
+                'num_restarts': trip_plan['num_restarts'],
+                'num_fuel_stops': trip_plan['num_fuel_stops'],
+                'num_days': len(trip_plan_data['daily_logs']),
+                'cycle_hours_remaining': trip_plan['cycle_hours_available'],
+                'hos_rules': rules.name
+            }
+        }
+        if isinstance(route_data, dict):
+            response_data['stops'] = RoutingService.locate_stops(route_data, trip_plan_data['segments'])
+        
+        return Response(response_data, status=status.HTTP_200_OK)
+    
+    except (ValueError, KeyError, TypeError) as e:
+        return Response(
+            {'error': f'Invalid input: {str(e)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        import traceback
+        print(f"Error in replan_trip: {str(e)}")
+        print(traceback.format_exc())
+        return Response(
+            {'error': f'Server error: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _same_values(a, b) -> bool:
+    """Compare JSON values, allowing float rounding differences"""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same_values(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_same_values(x, y) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+
 @api_view(['POST'])
 def geocode(request):
     """
@@ -124,10 +410,10 @@ def geocode(request):
             )
         
         routing_service = RoutingService()
-        coords = routing_service.geocode_address(address)
+        coords = routing_service.resolve_location(address)
         
         return Response({
-            'address': address,
+            'address': location_label(address),
             'latitude': coords[0],
             'longitude': coords[1]
         }, status=status.HTTP_200_OK)
@@ -139,6 +425,267 @@ def geocode(request):
         )
 
 
+@api_view(['POST'])
+def geocode_batch(request):
+    """
+    Geocode many addresses in one request
+    
+    Expected input:
+    {
+        "addresses": ["123 Main St, City, State", "34.05,-118.24", ...]
+    }
+    
+    Streams newline-delimited JSON, one object per input address in input
+    order: {"index", "address", "latitude", "longitude"} on success or
+    {"index", "address", "error"} when that address failed.
+    """
+    addresses = request.data.get('addresses')
+    max_addresses = int(os.getenv('GEOCODE_BATCH_MAX', '1000'))
+    
+    if not isinstance(addresses, list) or not addresses:
+        return Response(
+            {'error': 'addresses must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(addresses) > max_addresses:
+        return Response(
+            {'error': f'At most {max_addresses} addresses per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    routing_service = RoutingService()
+    results = routing_service.geocode_batch(addresses)
+    return StreamingHttpResponse(
+        (json.dumps(item) + '\n' for item in results),
+        content_type='application/x-ndjson',
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['POST'])
+def distance_matrix(request):
+    """
+    Distance/duration matrix between many origins and destinations
+    
+    Expected input:
+    {
+        "origins": ["Address or coordinates", ...],
+        "destinations": ["Address or coordinates", ...],
+        "include_eld": false,
+        "current_cycle_used": 25.5,
+        "hos_rules": "property_70_8"
+    }
+    
+    current_cycle_used may also be a list with one value per origin (one
+    per driver). With include_eld, every cell also gets the HOS-compliant
+    trip duration and arrival time when leaving now, or null when the trip
+    cannot be planned, under the optional hos_rules rule set.
+    """
+    try:
+        origins = request.data.get('origins')
+        destinations = request.data.get('destinations')
+        include_eld = bool(request.data.get('include_eld', False))
+        current_cycle_used = request.data.get('current_cycle_used', 0)
+        rules = get_rule_set(request.data.get('hos_rules'))
+        max_cells = int(os.getenv('MATRIX_MAX_CELLS', '10000'))
+        
+        if not isinstance(origins, list) or not origins \
+                or not isinstance(destinations, list) or not destinations:
+            return Response(
+                {'error': 'origins and destinations must be non-empty lists'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(origins) * len(destinations) > max_cells:
+            return Response(
+                {'error': f'At most {max_cells} origin/destination pairs per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if isinstance(current_cycle_used, list):
+            if len(current_cycle_used) != len(origins):
+                return Response(
+                    {'error': 'current_cycle_used needs one value per origin'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            cycles = [float(c) for c in current_cycle_used]
+        else:
+            cycles = [float(current_cycle_used)] * len(origins)
+        
+        routing_service = RoutingService()
+        
+        # Geocode every distinct address once
+        resolved = list(routing_service.geocode_batch(origins + destinations))
+        failed = [item for item in resolved if 'error' in item]
+        if failed:
+            return Response(
+                {'error': f"Could not resolve {failed[0]['address']}: {failed[0]['error']}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        coords = [(item['latitude'], item['longitude']) for item in resolved]
+        
+        matrix = routing_service.calculate_matrix(coords[:len(origins)], coords[len(origins):])
+        response_data = {
+            'origins': [
+                {'address': location_label(o), 'coordinates': c}
+                for o, c in zip(origins, coords[:len(origins)])
+            ],
+            'destinations': [
+                {'address': location_label(d), 'coordinates': c}
+                for d, c in zip(destinations, coords[len(origins):])
+            ],
+            'distances_miles': matrix['distances_miles'],
+            'durations_hours': matrix['durations_hours']
+        }
+        
+        if include_eld:
+            response_data['eld'] = _eld_estimates(cycles, matrix['distances_miles'], datetime.now(), rules)
+        
+        return Response(response_data, status=status.HTTP_200_OK)
+    
+    except ValueError as e:
+        return Response(
+            {'error': f'Invalid input: {str(e)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except TimeoutError as e:
+        return Response(
+            {'error': f'Routing timed out: {str(e)}'},
+            status=status.HTTP_504_GATEWAY_TIMEOUT
+        )
+    except Exception as e:
+        import traceback
+        print(f"Error in distance_matrix: {str(e)}")
+        print(traceback.format_exc())
+        return Response(
+            {'error': f'Server error: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+def optimize_departure_time(request):
+    """
+    Rank departure times for a trip by arrival or rest breaks
+    
+    Expected input:
+    {
+        "current_location": "Address or coordinates",
+        "pickup_location": "Address or coordinates",
+        "dropoff_location": "Address or coordinates",
+        "current_cycle_used": 25.5,
+        "cycle_history": [8, 10.5, 0, 11, 9, 0, 12],
+        "earliest_departure": "2024-05-01T06:00:00",
+        "window_hours": 48,
+        "step_minutes": 15,
+        "objective": "arrival",
+        "max_options": 10,
+        "hos_rules": "property_70_8"
+    }
+    
+    The route is calculated once and every departure in the window is
+    planned with the batch planner. objective is "arrival" (earliest
+    arrival), "rest_breaks" (fewest rest breaks) or "duration" (shortest
+    trip); departures beaten on all three are left out. cycle_history and
+    hos_rules are optional, as for calculate_trip; with a cycle_history,
+    waiting for hours to roll off the cycle can pay off.
+    """
+    try:
+        current_location = request.data.get('current_location')
+        pickup_location = request.data.get('pickup_location')
+        dropoff_location = request.data.get('dropoff_location')
+        current_cycle_used = float(request.data.get('current_cycle_used', 0))
+        earliest_departure = request.data.get('earliest_departure')
+        window_hours = float(request.data.get('window_hours', 48))
+        step_minutes = int(request.data.get('step_minutes', 15))
+        objective = request.data.get('objective', 'arrival')
+        max_options = int(request.data.get('max_options', 10))
+        cycle_history = request.data.get('cycle_history')
+        rules = get_rule_set(request.data.get('hos_rules'))
+        max_window = float(os.getenv('DEPARTURE_MAX_WINDOW_HOURS', '168'))
+        
+        if not all([current_location, pickup_location, dropoff_location]):
+            return Response(
+                {'error': 'Missing required fields'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if window_hours > max_window:
+            return Response(
+                {'error': f'window_hours may be at most {max_window:g}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if cycle_history is not None and not isinstance(cycle_history, list):
+            return Response(
+                {'error': 'cycle_history must be a list of daily on-duty hours'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if earliest_departure:
+            earliest_departure = datetime.fromisoformat(earliest_departure)
+        else:
+            earliest_departure = datetime.now()
+        
+        routing_service = RoutingService()
+        route_data = routing_service.get_route_with_stops(
+            current_location,
+            pickup_location,
+            dropoff_location
+        )
+        
+        result = optimize_departure(
+            route_data['total_distance_miles'],
+            current_cycle_used,
+            earliest_departure,
+            window_hours=window_hours,
+            step_minutes=step_minutes,
+            objective=objective,
+            max_options=max_options,
+            cycle_history=cycle_history,
+            rules=rules
+        )
+        result['total_distance_miles'] = route_data['total_distance_miles']
+        result['earliest_departure'] = earliest_departure.isoformat()
+        
+        return Response(result, status=status.HTTP_200_OK)
+    
+    except ValueError as e:
+        return Response(
+            {'error': f'Invalid input: {str(e)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except TimeoutError as e:
+        return Response(
+            {'error': f'Routing timed out: {str(e)}'},
+            status=status.HTTP_504_GATEWAY_TIMEOUT
+        )
+    except Exception as e:
+        import traceback
+        print(f"Error in optimize_departure_time: {str(e)}")
+        print(traceback.format_exc())
+        return Response(
+            {'error': f'Server error: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _eld_estimates(cycles: list, distances: list, start_time: datetime, rules=None) -> list:
+    """HOS-compliant duration and arrival for every matrix cell (None when unplannable)"""
+    num_destinations = len(distances[0])
+    flat = [d if d is not None else float('nan') for row in distances for d in row]
+    plans = BatchTripPlanner(rules=rules).plan_trips(
+        flat, [c for c in cycles for _ in range(num_destinations)], start_time)
+    
+    estimates = []
+    for i in range(len(flat)):
+        if not plans['valid'][i]:
+            estimates.append(None)
+            continue
+        duration = float(plans['estimated_duration_hours'][i])
+        estimates.append({
+            'estimated_duration_hours': duration,
+            'estimated_arrival': (start_time + timedelta(hours=duration)).isoformat(),
+            'num_rest_breaks': int(plans['num_rest_breaks'][i])
+        })
+    return [estimates[i:i + num_destinations] for i in range(0, len(estimates), num_destinations)]
+
+
 @api_view(['GET'])
 def health_check(request):
     """Health check endpoint"""
@@ -146,3 +693,18 @@ def health_check(request):
         'status': 'healthy',
         'timestamp': datetime.now().isoformat()
     }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def routing_status(request):
+    """Routing provider circuit breaker states, latencies, route and plan cache counters"""
+    route_cache = get_default_route_cache()
+    plan_cache = get_default_plan_cache()
+    return Response({
+        'providers': breaker_snapshots(),
+        'latency': latency_snapshots(),
+        'route_cache': route_cache.stats() if route_cache is not None else None,
+        'coalescing': inflight_stats(),
+        'plan_cache': plan_cache.stats() if plan_cache is not None else None,
+        'timestamp': datetime.now().isoformat()
+    }, status=status.HTTP_200_OK)
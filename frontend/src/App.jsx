@@ -36,7 +36,10 @@ function App() {
         current_location: formData.current_location,
         pickup_location: formData.pickup_location,
         dropoff_location: formData.dropoff_location,
-        current_cycle_used: parseFloat(formData.current_cycle_used)
+        current_cycle_used: parseFloat(formData.current_cycle_used),
+        // Compact route geometry, simplified to what the map can show
+        geometry_format: 'polyline',
+        map_zoom: 12
       });
 
       setLoadingStep(4); // Generating logs
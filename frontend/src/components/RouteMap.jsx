@@ -43,6 +43,7 @@ const RouteMap = ({ routeData }) => {
   }
 
   const { current_location, pickup_location, dropoff_location, route_to_pickup, route_to_dropoff } = routeData;
+  const stops = routeData.stops || [];
 
   // Extract coordinates
   const currentCoords = current_location.coordinates;
@@ -142,6 +143,21 @@ const RouteMap = ({ routeData }) => {
           </Popup>
         </Marker>
 
+        {/* Rest and Fuel Stop Markers */}
+        {stops.map((stop, index) => (
+          <Marker
+            key={index}
+            position={[stop.latitude, stop.longitude]}
+            icon={createCustomIcon(stop.type === 'on_duty' ? '#f59e0b' : '#8b5cf6')}
+          >
+            <Popup>
+              <strong>{stop.activity}</strong><br />
+              Mile {Math.round(stop.mile_marker)} &middot; {stop.duration} hrs<br />
+              {new Date(stop.start_time).toLocaleString()}
+            </Popup>
+          </Marker>
+        ))}
+
         {/* Route to Pickup */}
         {routeToPickupCoords.length > 0 && (
           <Polyline